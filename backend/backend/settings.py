@@ -39,16 +39,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'drf_spectacular',
     'rest_framework_simplejwt',
     'rest_framework',
     'corsheaders',
+    'core',
     'users',
     'nutrients',
     'meals',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +85,11 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Each worker process keeps a pool of connections (psycopg_pool) that are
+# health-checked before reuse. With DB_POOL=False connections persist per
+# thread for DB_CONN_MAX_AGE seconds instead.
+
+DB_POOL = config('DB_POOL', default=True, cast=bool)
 
 DATABASES = {
     'default': {
@@ -90,9 +99,62 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+            },
+        } if DB_POOL else {},
+    }
+}
+
+# Optional read replica (core.routers): safe requests to the catalog views
+# below read from it; writes and the clients that just wrote stay on the
+# primary. Tests run the replica as a mirror of the test database.
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+DATABASE_REPLICA_ALIAS = 'replica' if DB_REPLICA_HOST else None
+if DATABASE_REPLICA_ALIAS:
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_VIEWS = {
+    'meal_list', 'meal_detail', 'meal_ingredient_list', 'meal_ingredient_detail',
+    'ingredient_list', 'ingredient_search', 'ingredient_detail',
+    'nutrient_list', 'nutrient_detail', 'ingredient_nutrient_list', 'ingredient_nutrient_detail',
+}
+DATABASE_PRIMARY_PIN_SECONDS = config('DB_PRIMARY_PIN_SECONDS', default=5, cast=int)
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; point CACHE_BACKEND at Redis or Memcached when
+# running several workers so they share cached responses. The 'auth' cache is
+# invalidated by deleting entries, which must reach every web and job worker
+# process, so it caches nothing unless AUTH_CACHE_BACKEND names a shared
+# backend (core.checks warns about a per-process one).
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='forkful'),
+    },
+    'auth': {
+        'BACKEND': config('AUTH_CACHE_BACKEND', default='django.core.cache.backends.dummy.DummyCache'),
+        'LOCATION': config('AUTH_CACHE_LOCATION', default=''),
+    },
 }
 
+# Web worker processes per container; the Dockerfile starts uvicorn with as many.
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=2, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,6 +191,17 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# User uploads. Processed profile pictures have content-hashed names, so the
+# web server can serve MEDIA_URL with a far-future Cache-Control.
+MEDIA_URL = 'media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
+# Profile pictures (users.pictures): square thumbnails per size, in pixels.
+PROFILE_PICTURE_SIZES = {'small': 64, 'medium': 160, 'large': 320}
+PROFILE_PICTURE_MAX_DIMENSION = 1024
+PROFILE_PICTURE_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+PROFILE_PICTURE_MAX_PIXELS = 40_000_000
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -139,17 +212,72 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8080",
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ['Link', 'ETag']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.AsyncJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=100, cast=int),
+}
+
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=1000, cast=int)
+BULK_MAX_ITEMS = config('BULK_MAX_ITEMS', default=500, cast=int)
+
+# Request metrics (core.metrics): Prometheus text on /internal/metrics, and a
+# warning log line whenever a request runs more SQL queries than its budget.
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=lambda v: [ip.strip() for ip in v.split(',')])
+METRICS_QUERY_BUDGET = config('METRICS_QUERY_BUDGET', default=50, cast=int)
+METRICS_ENDPOINT_QUERY_BUDGETS = {
+    'GET meal_list': 10,
+    'GET meal_detail': 10,
+    'GET daily_entry_list': 10,
+    'GET daily_entry_summary': 5,
+    'GET daily_entry_history': 5,
+    'GET goal_progress': 5,
+    'GET ingredient_search': 5,
 }
 
+# Goal progress (meals.progress): a day counts as on target when its calories
+# are within this fraction of the profile's target.
+GOAL_CALORIE_TOLERANCE = 0.1
+GOAL_PROGRESS_MAX_DAYS = 366
+
+# Meal plan suggestions (meals.planner): servings are multiples of the step up
+# to the maximum; the request limits keep the search within its latency budget.
+MEAL_PLAN_SERVING_STEP = 0.5
+MEAL_PLAN_MAX_SERVINGS = 3.0
+MEAL_PLAN_MAX_SUGGESTIONS = 10
+MEAL_PLAN_MAX_MEALS = 4
+
+# Background jobs (core.jobs), run by `manage.py run_worker`. With
+# JOBS_RUN_INLINE they run right away in the process that queues them.
+JOBS_RUN_INLINE = config('JOBS_RUN_INLINE', default=False, cast=bool)
+JOBS_WORKER_PROCESSES = config('JOBS_WORKER_PROCESSES', default=2, cast=int)
+JOBS_BATCH_SIZE = 10
+JOBS_POLL_INTERVAL = config('JOBS_POLL_INTERVAL', default=1.0, cast=float)
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10  # seconds, doubled after every failed attempt
+JOBS_LOCK_TIMEOUT = 15 * 60  # seconds before a running job counts as abandoned
+
+# Versioned response cache (core.cache) for the shared catalog reads.
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+RESPONSE_CACHE_WAIT = 2.0
+
+# Authenticated users (core.authentication) are cached with their profile,
+# as field values without the password hash, keyed by the token's user id and
+# dropped whenever either is saved. See CACHES['auth'] above.
+AUTH_USER_CACHE_ALIAS = 'auth'
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+AUTH_USER_SELECT_RELATED = ('profile',)
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Forkful API',
     'DESCRIPTION': 'Meal prep web app',
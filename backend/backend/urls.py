@@ -1,9 +1,12 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import (
     SpectacularAPIView, 
     SpectacularSwaggerView,
 )
+from core.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,4 +15,5 @@ urlpatterns = [
     path('api/', include('users.urls')),
     path('api/', include('nutrients.urls')),
     path('api/', include('meals.urls')),
-]
\ No newline at end of file
+    path('internal/metrics', metrics_view, name='metrics'),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,6 @@
+from django.contrib import admin
+from .models import Job, TableVersion
+
+
+admin.site.register(TableVersion)
+admin.site.register(Job)
@@ -0,0 +1,112 @@
+"""
+Async read endpoints.
+
+`AsyncReadView` answers GET and HEAD as a coroutine: the JWT user comes from
+the auth cache or the async ORM and the view awaits its queries, so under
+ASGI a worker keeps serving other clients while one waits on the database or
+on a slow network. Every other method is handed to `sync_view_class`, the DRF
+view that also documents the endpoint in the OpenAPI schema and whose
+permission and throttle classes guard the async GET too.
+"""
+from asgiref.sync import sync_to_async
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import ForcedAuthentication, Request
+from rest_framework.response import Response
+
+from .authentication import AsyncJWTAuthentication
+from .pagination import KeysetPagination
+
+
+async def aiterate(iterator):
+    """
+    Iterate a sync generator that queries the database from async code, one
+    item per hop to the request's thread-sensitive executor, so a streaming
+    response is not buffered whole as it is for sync iterators under ASGI.
+    """
+    done = object()
+    next_item = sync_to_async(next)
+    while (item := await next_item(iterator, done)) is not done:
+        yield item
+
+
+def json_response(data, status=200, headers=None):
+    """A DRF `Response` rendered as JSON up front, without content negotiation."""
+    response = Response(data, status=status, headers=headers)
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = JSONRenderer.media_type
+    response.renderer_context = {}
+    patch_vary_headers(response, ['Accept'])
+    return response.render()
+
+
+class AsyncReadView(View):
+    sync_view_class = None
+    # Relations the serializer reads from the user. Token users come from the
+    # auth cache with AUTH_USER_SELECT_RELATED loaded; forced test users are
+    # reloaded with these.
+    user_select_related = ()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # drf-spectacular builds the schema from the DRF view's methods.
+        view.cls = cls.sync_view_class
+        view.initkwargs = {}
+        return csrf_exempt(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            sync_view = self.sync_view_class.as_view()
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+        # The DRF view's permissions and throttles apply as they do to its own
+        # GET, and `self.sync_view` lends subclasses its queryset and
+        # serializer context.
+        view = self.sync_view = self.sync_view_class()
+        view.args, view.kwargs, view.format_kwarg = args, kwargs, None
+        try:
+            user, token = await self.authenticate(request)
+            # Without a user, the view's own authenticators find no
+            # credentials and leave the request anonymous.
+            authenticators = [ForcedAuthentication(user, token)] if user is not None else view.get_authenticators()
+            api_request = view.request = Request(request, authenticators=authenticators)
+            view.check_permissions(api_request)
+            view.check_throttles(api_request)
+        except exceptions.APIException as exc:
+            return self.error_response(exc)
+        return await self.get(api_request, *args, **kwargs)
+
+    async def authenticate(self, request):
+        """`(user, token)`, or `(None, None)` when the request has no credentials."""
+        forced_user = getattr(request, '_force_auth_user', None)
+        if forced_user is not None:
+            # APIClient.force_authenticate(); reload so the related rows are cached.
+            token = getattr(request, '_force_auth_token', None)
+            if not self.user_select_related:
+                return forced_user, token
+            users = type(forced_user).objects.select_related(*self.user_select_related)
+            return await users.aget(pk=forced_user.pk), token
+
+        return await AsyncJWTAuthentication().aauthenticate(request) or (None, None)
+
+    def error_response(self, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        headers = {}
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            headers['WWW-Authenticate'] = AsyncJWTAuthentication().authenticate_header(None)
+        if getattr(exc, 'wait', None):
+            headers['Retry-After'] = '%d' % exc.wait
+        return json_response(data, status=exc.status_code, headers=headers)
+
+    async def paginated_response(self, request, queryset, serializer_class, context):
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(queryset, request, view=self)
+        # Serializers may still query (e.g. to sync the nutrient matrix), so
+        # they run on the thread-sensitive executor like the page itself.
+        data = await sync_to_async(lambda: serializer_class(page, many=True, context=context).data)()
+        return json_response(data, headers=paginator.get_link_headers())
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}:fields'
+
+
+def invalidate_cached_user(user_id):
+    """
+    Drop the cached user now and again on commit, so no request re-caches the
+    old row meanwhile. Model signals call this on save and delete; writes
+    that bypass them (`QuerySet.update()`, bulk or raw SQL) must call it too.
+    """
+    user_cache().delete(user_cache_key(user_id))
+    transaction.on_commit(lambda: user_cache().delete(user_cache_key(user_id)))
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    simplejwt's JWTAuthentication plus `aauthenticate`, which loads the user
+    with the async ORM so async views never block the event loop on it.
+    Header parsing and signature checks are pure CPU and shared with the sync path.
+
+    Users are cached for AUTH_USER_CACHE_TIMEOUT seconds together with the
+    relations in AUTH_USER_SELECT_RELATED, keyed by the token's user id, so
+    steady-state authentication runs no queries. The cache holds field values
+    only, not model instances, and never the password hash: the user comes
+    back with `password` deferred, plus a digest of it when tokens are revoked
+    on password changes. Apps invalidate the entry with
+    `invalidate_cached_user` when the user or a cached relation changes; that
+    only reaches other processes (web workers, the job worker) through a
+    shared cache, so AUTH_USER_CACHE_ALIAS caches nothing unless one is
+    configured.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def users(self):
+        """A `values()` query with the user fields but the password, and those of AUTH_USER_SELECT_RELATED."""
+        paths = [field.name for field in self.user_model._meta.concrete_fields]
+        for name in settings.AUTH_USER_SELECT_RELATED:
+            related = self.user_model._meta.get_field(name).related_model
+            paths += [f'{name}__{field.name}' for field in related._meta.concrete_fields]
+        return self.user_model.objects.values(*paths)
+
+    def cache_entry(self, row):
+        password = row.pop('password')
+        fields = {
+            field.attname: row.pop(field.name) for field in self.user_model._meta.concrete_fields
+            if field.name != 'password'
+        }
+        related = {}
+        for name in settings.AUTH_USER_SELECT_RELATED:
+            model = self.user_model._meta.get_field(name).related_model
+            values = {field.attname: row.pop(f'{name}__{field.name}') for field in model._meta.concrete_fields}
+            related[name] = values if values[model._meta.pk.attname] is not None else None
+        password_hash = get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None
+        return {'fields': fields, 'related': related, 'password_hash': password_hash}
+
+    def user_from_entry(self, entry):
+        db = router.db_for_write(self.user_model)
+        fields = entry['fields']
+        user = self.user_model.from_db(db, list(fields), list(fields.values()))
+        for name, values in entry['related'].items():
+            field = self.user_model._meta.get_field(name)
+            instance = None
+            if values is not None:
+                instance = field.related_model.from_db(db, list(values), list(values.values()))
+                if field.one_to_one:
+                    field.remote_field.set_cached_value(instance, user)
+            field.set_cached_value(user, instance)
+        return user
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        key = user_cache_key(user_id)
+        entry = await user_cache().aget(key)
+        if entry is None:
+            try:
+                entry = self.cache_entry(await self.users().aget(**{api_settings.USER_ID_FIELD: user_id}))
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+            await user_cache().aset(key, entry, settings.AUTH_USER_CACHE_TIMEOUT)
+        return self.check_user(self.user_from_entry(entry), validated_token, entry['password_hash'])
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        key = user_cache_key(user_id)
+        entry = user_cache().get(key)
+        if entry is None:
+            try:
+                entry = self.cache_entry(self.users().get(**{api_settings.USER_ID_FIELD: user_id}))
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+            user_cache().set(key, entry, settings.AUTH_USER_CACHE_TIMEOUT)
+        return self.check_user(self.user_from_entry(entry), validated_token, entry['password_hash'])
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+    def check_user(self, user, validated_token, password_hash):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_hash:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+
+class AsyncJWTScheme(SimpleJWTScheme):
+    target_class = 'core.authentication.AsyncJWTAuthentication'
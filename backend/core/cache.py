@@ -0,0 +1,102 @@
+"""
+Versioned response cache for read endpoints that return the same data to
+every user.
+
+Cache keys embed the version counters of the tables a response is built from
+(see `core.versioning`), so a write never has to find and delete entries: it
+bumps a counter and the old keys simply stop being read and expire. After an
+invalidation only one worker rebuilds a given key; the others wait briefly for
+its result instead of all hitting the database at once.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from .versioning import request_table_versions, table_label
+
+
+CACHED_HEADERS = ('Link',)
+POLL_INTERVAL = 0.05
+
+
+def single_flight(cache, key, build, timeout, lock_timeout, wait):
+    """
+    Return the cached value for `key`, calling `build()` on a miss. Only the
+    caller that wins the `cache.add` lock builds and stores the value; the
+    others poll for up to `wait` seconds and then build for themselves rather
+    than fail.
+
+    `build` returns `(value, cacheable)`.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            value, cacheable = build()
+            if cacheable:
+                cache.set(key, value, timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return build()[0]
+
+
+def response_cache_key(request, view_name, models):
+    versions = request_table_versions(request, models)
+    # The timestamp keeps keys unique even if a counter row is ever recreated.
+    version_part = '.'.join(
+        f'{version}-{updated_at.timestamp() if updated_at else 0}'
+        for version, updated_at in (versions[table_label(model)] for model in models)
+    )
+    # Scheme and host too: cached Link headers hold absolute URLs.
+    path = hashlib.md5(request.build_absolute_uri().encode(), usedforsecurity=False).hexdigest()
+    return f'response:{view_name}:{version_part}:{path}'
+
+
+def cached_response(*models):
+    """
+    Cache the data of successful responses of a DRF handler, keyed by
+    absolute URL and by the versions of `models`. Apply to `get` with
+    `method_decorator`.
+    """
+    def decorator(view):
+        view_name = f'{view.__module__}.{view.__qualname__}'
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            built = []
+
+            def build():
+                response = view(request, *args, **kwargs)
+                built.append(response)
+                headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+                return (response.status_code, response.data, headers), response.status_code == 200
+
+            entry = single_flight(
+                caches[settings.RESPONSE_CACHE_ALIAS], response_cache_key(request, view_name, models), build,
+                settings.RESPONSE_CACHE_TIMEOUT, settings.RESPONSE_CACHE_LOCK_TIMEOUT, settings.RESPONSE_CACHE_WAIT,
+            )
+            if built:
+                response = built[0]
+                response['X-Cache'] = 'MISS'
+            else:
+                status_code, data, headers = entry
+                response = Response(data, status=status_code, headers=headers)
+                response['X-Cache'] = 'HIT'
+            return response
+        return wrapper
+    return decorator
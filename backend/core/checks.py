@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_auth_user_cache(app_configs, **kwargs):
+    """The auth cache is invalidated by deletes, which a per-process cache only sees from its own process."""
+    backend = settings.CACHES.get(settings.AUTH_USER_CACHE_ALIAS, {}).get('BACKEND')
+    several_processes = settings.WEB_CONCURRENCY > 1 or not settings.JOBS_RUN_INLINE
+    if backend == 'django.core.cache.backends.locmem.LocMemCache' and several_processes:
+        return [Warning(
+            'The auth user cache is local to each process, so a user or profile changed by one '
+            'web or job worker stays cached in the others for AUTH_USER_CACHE_TIMEOUT seconds.',
+            hint='Point AUTH_CACHE_BACKEND at Redis or Memcached, or leave it unset to disable the cache.',
+            obj=settings.AUTH_USER_CACHE_ALIAS,
+            id='core.W001',
+        )]
+    return []
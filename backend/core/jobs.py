@@ -0,0 +1,174 @@
+"""
+Background jobs without a broker.
+
+A function decorated with `@job` gets an `enqueue(**kwargs)` method that
+stores a `Job` row in the request's transaction, so the job exists exactly
+when the write that asked for it was committed. Identical pending jobs (same
+function, same kwargs) are stored once.
+
+`manage.py run_worker` claims due jobs with `SELECT ... FOR UPDATE SKIP
+LOCKED`, so any number of worker processes share the table without handing
+out a job twice. A failing job is retried with exponential backoff until
+JOBS_MAX_ATTEMPTS and then kept as failed; a job left running by a worker
+that died is picked up again after JOBS_LOCK_TIMEOUT, or kept as failed when
+that was its last attempt. Jobs therefore run at least once and must be
+idempotent.
+
+Job functions live in each app's `jobs` module, which is imported when the
+apps are ready. With JOBS_RUN_INLINE, `enqueue` runs the function right away.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def job(func=None, *, name=None, max_attempts=None):
+    """Register `func` as a job, named `<module>.<function>` unless `name` is given."""
+    if func is None:
+        return lambda func: job(func, name=name, max_attempts=max_attempts)
+
+    job_name = name or f'{func.__module__}.{func.__qualname__}'
+    if job_name in registry and registry[job_name] is not func:
+        raise ValueError(f'A job named {job_name!r} is already registered.')
+    registry[job_name] = func
+    func.job_name = job_name
+    func.enqueue = lambda delay=0, **kwargs: enqueue(job_name, kwargs, delay, max_attempts)
+    return func
+
+
+def job_key(name, kwargs):
+    payload = json.dumps([name, kwargs], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def enqueue(name, kwargs, delay=0, max_attempts=None):
+    """
+    Queue `name(**kwargs)` to run after `delay` seconds. `kwargs` must be JSON
+    serializable. Does nothing when an identical job is already pending.
+    """
+    if name not in registry:
+        raise LookupError(f'Unknown job {name!r}.')
+    if settings.JOBS_RUN_INLINE:
+        registry[name](**kwargs)
+        return
+    # ON CONFLICT DO NOTHING against the partial unique index on pending keys.
+    Job.objects.bulk_create([Job(
+        name=name, kwargs=kwargs, key=job_key(name, kwargs),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )], ignore_conflicts=True)
+
+
+def claim(worker_id, limit=1):
+    """Lock up to `limit` due jobs for `worker_id`, oldest first."""
+    now = timezone.now()
+    stale = Q(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT))
+    claimable = Q(status=Job.PENDING, run_after__lte=now) | (stale & Q(attempts__lt=F('max_attempts')))
+    with transaction.atomic():
+        # A job whose every attempt was cut short (e.g. it keeps crashing the
+        # worker) is not handed out once more.
+        Job.objects.filter(stale, attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, locked_by='', locked_at=None,
+            last_error='The worker stopped responding on the last attempt.',
+        )
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True).filter(claimable)
+            .order_by('run_after', 'pk').values_list('pk', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # The status condition is repeated for databases without row locks
+        # (SQLite), where another worker may have claimed a row in between.
+        Job.objects.filter(claimable, pk__in=ids).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        )
+        return list(Job.objects.filter(pk__in=ids, locked_by=worker_id, locked_at=now).order_by('run_after', 'pk'))
+
+
+def retry_delay(attempts):
+    return settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def run(queued):
+    """Run a claimed job; returns True when it succeeded (and was deleted)."""
+    mine = Job.objects.filter(pk=queued.pk, locked_by=queued.locked_by)
+    try:
+        func = registry.get(queued.name)
+        if func is None:
+            raise LookupError(f'Unknown job {queued.name!r}.')
+        func(**queued.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if queued.attempts >= queued.max_attempts:
+            logger.error('Job %s %s failed for good after %d attempts', queued.pk, queued.name, queued.attempts)
+            mine.update(status=Job.FAILED, locked_by='', locked_at=None, last_error=error)
+            return False
+        logger.warning('Job %s %s failed (attempt %d), retrying', queued.pk, queued.name, queued.attempts)
+        try:
+            with transaction.atomic():
+                mine.update(
+                    status=Job.PENDING, locked_by='', locked_at=None, last_error=error,
+                    run_after=timezone.now() + timedelta(seconds=retry_delay(queued.attempts)),
+                )
+        except IntegrityError:
+            # An identical job was queued meanwhile and will do the work.
+            mine.delete()
+        return False
+    mine.delete()
+    return True
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Worker:
+    """Runs due jobs until `stop` (a threading or multiprocessing Event) is set."""
+
+    def __init__(self, batch_size=None, poll_interval=None, stop=None):
+        self.id = worker_id()
+        self.batch_size = batch_size or settings.JOBS_BATCH_SIZE
+        self.poll_interval = settings.JOBS_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.stop = stop or threading.Event()
+
+    def run_pending(self):
+        """Run due jobs until there are none left; returns how many were run."""
+        count = 0
+        while not self.stop.is_set():
+            jobs = claim(self.id, self.batch_size)
+            if not jobs:
+                break
+            # Claimed jobs are run even when stopping, or they would sit until JOBS_LOCK_TIMEOUT.
+            for claimed in jobs:
+                run(claimed)
+                count += 1
+        return count
+
+    def run_forever(self):
+        while not self.stop.is_set():
+            close_old_connections()
+            try:
+                ran = self.run_pending()
+            except DatabaseError:
+                # E.g. the database restarting, or SQLite busy with another worker.
+                logger.exception('Claiming jobs failed')
+                ran = 0
+            if not ran:
+                self.stop.wait(self.poll_interval)
@@ -0,0 +1,77 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.jobs import Worker
+
+
+def _work(options, stop):
+    # Ctrl-C reaches the whole process group; the parent decides when to stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    Worker(batch_size=options['batch_size'], poll_interval=options['poll_interval'], stop=stop).run_forever()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (core.jobs) in a pool of worker processes until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOBS_WORKER_PROCESSES,
+                            help='Worker processes; 1 runs the jobs in this process')
+        parser.add_argument('--batch-size', type=int, default=settings.JOBS_BATCH_SIZE, help='Jobs claimed at once')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help='Seconds to wait when no job is due')
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due and exit')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1:
+            raise CommandError('--processes must be at least 1.')
+        if options['once']:
+            ran = Worker(batch_size=options['batch_size']).run_pending()
+            self.stdout.write(self.style.SUCCESS(f'Ran {ran} jobs'))
+        elif options['processes'] == 1:
+            self.run_single(options)
+        else:
+            self.run_pool(options)
+
+    def run_single(self, options):
+        worker = Worker(batch_size=options['batch_size'], poll_interval=options['poll_interval'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: worker.stop.set())
+        worker.run_forever()
+
+    def run_pool(self, options):
+        # Children are forked, so none of them may inherit an open connection.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+
+        def start():
+            process = context.Process(target=_work, args=(options, stop), daemon=True)
+            process.start()
+            return process
+
+        # Only a flag here: setting the shared event inside a signal handler
+        # can deadlock with the event's own lock.
+        stopping = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: stopping.append(signum))
+
+        processes = [start() for _ in range(options['processes'])]
+        self.stdout.write(f'Started {len(processes)} job workers')
+        while not stopping:
+            time.sleep(1)
+            for index, process in enumerate(processes):
+                if not process.is_alive() and not stopping:
+                    self.stderr.write(f'Job worker {process.pid} exited with {process.exitcode}; restarting')
+                    processes[index] = start()
+        stop.set()
+        # Workers finish the jobs they claimed before exiting.
+        for process in processes:
+            process.join()
+        self.stdout.write('Job workers stopped')
@@ -0,0 +1,225 @@
+"""
+In-process request metrics exposed in the Prometheus text format.
+
+Each worker process keeps its own registry; scrape every worker (or run a
+single worker per container) to get complete numbers.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import ListSerializer
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.db_queries = {}
+        self.db_seconds = {}
+        self.serializer_seconds = {}
+        self.budget_exceeded = {}
+
+    def observe(self, endpoint, method, status, seconds, stats):
+        key = (endpoint, method)
+        with self._lock:
+            self.requests[key + (str(status),)] = self.requests.get(key + (str(status),), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.db_queries.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(stats.queries)
+            self.db_seconds.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(stats.db_seconds)
+            self.serializer_seconds.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(stats.serializer_seconds)
+
+    def record_budget_exceeded(self, endpoint, method):
+        with self._lock:
+            key = (endpoint, method)
+            self.budget_exceeded[key] = self.budget_exceeded.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            for metric in (self.requests, self.latency, self.db_queries, self.db_seconds,
+                           self.serializer_seconds, self.budget_exceeded):
+                metric.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            _render_counter(lines, 'forkful_http_requests_total', 'Requests by endpoint, method and status.',
+                            ('endpoint', 'method', 'status'), self.requests)
+            _render_histograms(lines, 'forkful_http_request_duration_seconds', 'Request latency.', self.latency)
+            _render_histograms(lines, 'forkful_db_queries', 'Database queries per request.', self.db_queries)
+            _render_histograms(lines, 'forkful_db_query_duration_seconds', 'Database time per request.', self.db_seconds)
+            _render_histograms(lines, 'forkful_serializer_duration_seconds', 'Serializer time per request.',
+                               self.serializer_seconds)
+            _render_counter(lines, 'forkful_query_budget_exceeded_total', 'Requests over their query budget.',
+                            ('endpoint', 'method'), self.budget_exceeded)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _render_counter(lines, name, help_text, label_names, values):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{_labels(label_names, key)} {value}')
+
+
+def _render_histograms(lines, name, help_text, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    label_names = ('endpoint', 'method')
+    for key, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{_labels(label_names, key, le=bound)} {count}')
+        lines.append(f'{name}_bucket{_labels(label_names, key, le="+Inf")} {histogram.count}')
+        lines.append(f'{name}_sum{_labels(label_names, key)} {histogram.sum}')
+        lines.append(f'{name}_count{_labels(label_names, key)} {histogram.count}')
+
+
+registry = MetricsRegistry()
+
+
+class TimedDataMixin:
+    """
+    Times top-level `.data` evaluations into the current request's stats;
+    nested serializers and list items are part of their parent's time. The
+    project's serializers get it through SparseFieldsMixin, and lists through
+    TimedListSerializer (or a `list_serializer_class` that includes it).
+    """
+
+    @property
+    def data(self):
+        stats = _current.get()
+        if stats is None or stats.serializer_depth:
+            return super().data
+        stats.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            stats.serializer_seconds += time.perf_counter() - started
+            stats.serializer_depth -= 1
+
+
+class TimedListSerializer(TimedDataMixin, ListSerializer):
+    pass
+
+
+def query_budget(endpoint, method):
+    # Budgets are keyed by 'METHOD endpoint' or just 'endpoint'.
+    budgets = getattr(settings, 'METRICS_ENDPOINT_QUERY_BUDGETS', {})
+    default = getattr(settings, 'METRICS_QUERY_BUDGET', 50)
+    return budgets.get(f'{method} {endpoint}', budgets.get(endpoint, default))
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with self.wrap_connections(stats):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            # Connections are per thread: install the wrappers on the request's
+            # thread-sensitive executor, where sync_to_async runs its queries.
+            wrappers = await sync_to_async(self.wrap_connections)(stats)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(wrappers.close)()
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def wrap_connections(self, stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats.db_wrapper))
+        return stack
+
+    def record(self, request, response, stats, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.view_name if match else 'unmatched'
+        registry.observe(endpoint, request.method, response.status_code, elapsed, stats)
+
+        budget = query_budget(endpoint, request.method)
+        if stats.queries > budget:
+            registry.record_budget_exceeded(endpoint, request.method)
+            logger.warning(
+                '%s %s (%s) ran %d queries, over its budget of %d (%.1f ms in the database)',
+                request.method, request.path, endpoint, stats.queries, budget, stats.db_seconds * 1000,
+            )
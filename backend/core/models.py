@@ -0,0 +1,53 @@
+from django.db import models
+
+
+class TableVersion(models.Model):
+    """
+    A counter per model that is bumped on every write, so readers can tell
+    whether a table changed without scanning it (see `core.versioning`).
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name} v{self.version}'
+
+
+class Job(models.Model):
+    """
+    A queued call of a function registered with `core.jobs.job`. Only pending
+    and failed jobs are kept; a job that ran successfully is deleted.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    # Hash of name and kwargs; at most one pending job per key.
+    key = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status='pending'), name='core_job_unique_pending_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
@@ -0,0 +1,49 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+PAGINATION_PARAMETERS = [
+    OpenApiParameter(name='cursor', description='Opaque cursor taken from the `Link` response header', required=False, type=OpenApiTypes.STR),
+    OpenApiParameter(name='page_size', description='Number of results to return per page', required=False, type=OpenApiTypes.INT),
+]
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination over a unique, indexed ordering, so every page
+    costs O(page_size) no matter how deep the client has paged.
+
+    The response body stays a plain list; the cursors are returned in an
+    RFC 8288 `Link` header (`rel="next"` / `rel="prev"`).
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 1000)
+
+    def get_ordering(self, request, queryset, view):
+        return (getattr(view, 'cursor_ordering', self.ordering),)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # DRF evaluates the page with a sync slice; run it on the request's
+        # thread-sensitive executor, the same way Django's async ORM does.
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+    def get_link_headers(self):
+        links = []
+        next_link = self.get_next_link()
+        previous_link = self.get_previous_link()
+        if next_link:
+            links.append(f'<{next_link}>; rel="next"')
+        if previous_link:
+            links.append(f'<{previous_link}>; rel="prev"')
+        return {'Link': ', '.join(links)} if links else None
+
+    def get_paginated_response(self, data):
+        return Response(data, headers=self.get_link_headers())
+
+    def get_paginated_response_schema(self, schema):
+        return schema
@@ -0,0 +1,111 @@
+"""
+Primary / read-replica routing.
+
+`ReplicaRoutingMiddleware` marks safe requests to the catalog views listed in
+`DATABASE_REPLICA_VIEWS` as replica reads; `PrimaryReplicaRouter` then sends
+their queries to `DATABASE_REPLICA_ALIAS`. Everything else - writes, food-log
+and profile reads, management commands - stays on the primary.
+
+Clients read their own writes: once a request has written, its remaining
+queries go to the primary, and the response sets a short-lived cookie that
+keeps the client's next requests there until the replica has caught up
+(the SPA is served from another origin, so its API client sends credentials
+and CORS_ALLOW_CREDENTIALS must stay on).
+"""
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PRIMARY_PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current = contextvars.ContextVar('database_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self):
+        self.replica = False
+        self.wrote = False
+
+
+def replica_alias():
+    return getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        alias = replica_alias()
+        if alias is None or state is None or not state.replica or state.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction must see its writes.
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.pin_to_primary(request, response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.pin_to_primary(request, response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _current.get()
+        if state is None or replica_alias() is None:
+            return None
+        state.replica = (
+            request.method in SAFE_METHODS
+            and request.resolver_match.view_name in getattr(settings, 'DATABASE_REPLICA_VIEWS', ())
+            and PRIMARY_PIN_COOKIE not in request.COOKIES
+        )
+        return None
+
+    def pin_to_primary(self, request, response, state):
+        if replica_alias() is not None and state.wrote and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE, '1', max_age=getattr(settings, 'DATABASE_PRIMARY_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,111 @@
+"""
+Sparse fieldsets for read responses.
+
+Serializers using `SparseFieldsMixin` honour three query parameters on safe
+requests:
+
+  * `?fields=id,meal.name,meal.calories` - only these fields, nested ones
+    addressed with dots;
+  * `?view=compact` - each serializer's `Meta.compact_fields`;
+  * `?expand=meal.meal_ingredients` - add fields on top of the above.
+
+`optimize_queryset` walks the same field selection, so relations that are not
+rendered are not joined or prefetched either. Serializers whose method fields
+read other relations can add `Prefetch` objects for them by defining
+`related_prefetches(prefix)`.
+"""
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from .metrics import TimedDataMixin
+
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(name='fields', description='Comma separated fields to return; use dots for nested fields (meal.name)', required=False, type=OpenApiTypes.STR),
+    OpenApiParameter(name='expand', description='Comma separated fields to add to the selected view', required=False, type=OpenApiTypes.STR),
+    OpenApiParameter(name='view', description='Representation: full (default) or compact', required=False, type=OpenApiTypes.STR, enum=['full', 'compact']),
+]
+
+
+def parse_field_paths(value):
+    """Turn 'id,meal.name,meal.calories' into {'id': {}, 'meal': {'name': {}, 'calories': {}}}."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(part, {})
+    return tree
+
+
+class SparseFieldsMixin(TimedDataMixin):
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.sparse_spec()
+        if spec is None:
+            return fields
+
+        only, expand, view = spec
+        if only:
+            names = [name for name in fields if name in only]
+        elif view == 'compact':
+            compact = getattr(self.Meta, 'compact_fields', fields)
+            names = [name for name in fields if name in compact]
+        else:
+            names = list(fields)
+        names += [name for name in fields if name in expand and name not in names]
+
+        selected = {}
+        for name in names:
+            field = selected[name] = fields[name]
+            nested = field.child if isinstance(field, ListSerializer) else field
+            if isinstance(nested, SparseFieldsMixin):
+                # `expand=meal` asks for the full nested object, `expand=meal.x` only adds x to it.
+                nested_view = 'full' if name in expand and not expand[name] else view
+                nested._sparse_spec = ((only or {}).get(name) or None, expand.get(name, {}), nested_view)
+        return selected
+
+    def sparse_spec(self):
+        """`(fields tree or None, expand tree, view)`, or None when the full representation is wanted."""
+        if hasattr(self, '_sparse_spec'):
+            return self._sparse_spec
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        params = request.query_params
+        view = params.get('view', 'full')
+        if 'fields' not in params and 'expand' not in params and view == 'full':
+            return None
+        return parse_field_paths(params.get('fields', '')) or None, parse_field_paths(params.get('expand', '')), view
+
+
+def _collect_relations(serializer, prefix, in_prefetch, select, prefetch):
+    if hasattr(serializer, 'related_prefetches'):
+        prefetch.update(dict.fromkeys(serializer.related_prefetches(prefix)))
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        many = isinstance(field, ListSerializer)
+        nested = field.child if many else field
+        if not isinstance(nested, BaseSerializer):
+            continue
+        path = prefix + field.source.replace('.', '__')
+        (prefetch if many or in_prefetch else select)[path] = None
+        _collect_relations(nested, f'{path}__', in_prefetch or many, select, prefetch)
+
+
+def optimize_queryset(queryset, serializer):
+    """
+    Add `select_related` for the to-one relations and `prefetch_related` for
+    the to-many relations that `serializer` will actually render.
+    """
+    # Dicts as ordered sets: outer relations are prefetched before inner ones.
+    select, prefetch = {}, {}
+    _collect_relations(getattr(serializer, 'child', serializer), '', False, select, prefetch)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
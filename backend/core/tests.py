@@ -0,0 +1,409 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.test import APIClient
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from meals.models import Meal
+from meals.views import DailyEntryListView, MealListView
+from users.models import CustomUser
+from nutrients.models import Ingredient, Nutrient
+from .cache import single_flight
+from .checks import check_auth_user_cache
+from .jobs import Worker, claim, job
+from .metrics import registry
+from .models import Job, TableVersion
+from .routers import PRIMARY_PIN_COOKIE, PrimaryReplicaRouter, ReplicaRoutingMiddleware
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        registry.reset()
+        Nutrient.objects.create(name='Protein', unit='g')
+
+    def test_metrics_record_endpoint_queries_and_latency(self):
+        self.client.get('/api/nutrients/')
+        self.client.get('/api/nutrients/')
+
+        body = self.client.get('/internal/metrics').content.decode()
+
+        self.assertIn('forkful_http_requests_total{endpoint="nutrient_list",method="GET",status="200"} 2', body)
+        self.assertIn('forkful_http_request_duration_seconds_count{endpoint="nutrient_list",method="GET"} 2', body)
+        self.assertIn('forkful_db_queries_bucket{endpoint="nutrient_list",method="GET",le="2"} 2', body)
+        self.assertIn('forkful_serializer_duration_seconds_count{endpoint="nutrient_list",method="GET"} 2', body)
+        serializer_sum = body.split('forkful_serializer_duration_seconds_sum{endpoint="nutrient_list",method="GET"} ')[1]
+        self.assertGreater(float(serializer_sum.split()[0]), 0)
+
+    @override_settings(METRICS_ENDPOINT_QUERY_BUDGETS={'nutrient_list': 0})
+    def test_query_budget_warning(self):
+        with self.assertLogs('core.metrics', level='WARNING') as logs:
+            self.client.get('/api/nutrients/')
+
+        self.assertIn('over its budget of 0', logs.output[0])
+        body = registry.render()
+        self.assertIn('forkful_query_budget_exceeded_total{endpoint="nutrient_list",method="GET"} 1', body)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_endpoint_is_internal(self):
+        response = self.client.get('/internal/metrics')
+        self.assertEqual(response.status_code, 404)
+
+
+class SystemCheckTests(SimpleTestCase):
+
+    def auth_cache(self, backend):
+        return {**settings.CACHES, 'auth': {'BACKEND': f'django.core.cache.backends.{backend}'}}
+
+    def test_per_process_auth_cache_with_several_workers_warns(self):
+        with override_settings(CACHES=self.auth_cache('locmem.LocMemCache'), WEB_CONCURRENCY=2):
+            self.assertEqual([warning.id for warning in check_auth_user_cache(None)], ['core.W001'])
+        with override_settings(CACHES=self.auth_cache('locmem.LocMemCache'), WEB_CONCURRENCY=1, JOBS_RUN_INLINE=True):
+            self.assertEqual(check_auth_user_cache(None), [])
+        with override_settings(CACHES=self.auth_cache('dummy.DummyCache'), WEB_CONCURRENCY=2):
+            self.assertEqual(check_auth_user_cache(None), [])
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nutrient = Nutrient.objects.create(name='Protein', unit='g')
+            self.meal = Meal.objects.create(name='Porridge')
+
+    def test_unchanged_collection_returns_304(self):
+        response = self.client.get('/api/nutrients/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            cached = self.client.get('/api/nutrients/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+    def test_writes_change_the_validators(self):
+        etag = self.client.get('/api/nutrients/')['ETag']
+        version = TableVersion.objects.get(name='nutrients.Nutrient').version
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nutrient.unit = 'mg'
+            self.nutrient.save()
+            self.nutrient.save()
+            self.assertEqual(TableVersion.objects.get(name='nutrients.Nutrient').version, version)
+
+        # One bump for the whole transaction, after it committed.
+        self.assertEqual(TableVersion.objects.get(name='nutrients.Nutrient').version, version + 1)
+        response = self.client.get('/api/nutrients/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_meal_validators_follow_ingredient_changes(self):
+        etag = self.client.get(f'/api/meals/{self.meal.pk}/')['ETag']
+        self.assertEqual(self.client.get(f'/api/meals/{self.meal.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Oats')
+        self.assertEqual(self.client.get(f'/api/meals/{self.meal.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_validators_differ_per_page(self):
+        first = self.client.get('/api/nutrients/?page_size=1')['ETag']
+        second = self.client.get('/api/nutrients/?page_size=2')['ETag']
+        self.assertNotEqual(first, second)
+
+
+class DenyingThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        return False
+
+    def wait(self):
+        return 30
+
+
+class AsyncReadViewTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='async', password='password123')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        Meal.objects.create(name='Porridge')
+        Meal.objects.create(name='Omelette')
+
+    async def test_meal_list_pages_and_revalidates(self):
+        response = await self.async_client.get('/api/meals/?page_size=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([meal['name'] for meal in response.json()], ['Porridge'])
+        self.assertIn('rel="next"', response['Link'])
+
+        cached = await self.async_client.get('/api/meals/?page_size=1', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_jwt_header_authenticates(self):
+        response = await self.async_client.get('/api/auth/check/', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['username'], 'async')
+
+    async def test_invalid_token_is_rejected(self):
+        response = await self.async_client.get('/api/meals/', headers={'Authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+
+    async def test_missing_credentials(self):
+        response = await self.async_client.get('/api/daily-entries/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_sync_view_permissions_and_throttles_apply(self):
+        with mock.patch.object(DailyEntryListView, 'permission_classes', [IsAdminUser]):
+            response = await self.async_client.get('/api/daily-entries/', headers=self.auth)
+        self.assertEqual(response.status_code, 403)
+
+        with mock.patch.object(MealListView, 'throttle_classes', [DenyingThrottle]):
+            response = await self.async_client.get('/api/meals/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    async def test_writes_go_to_the_sync_view(self):
+        response = await self.async_client.post('/api/meals/', {'name': 'Soup'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.post(
+            '/api/meals/', {'name': 'Soup', 'meal_ingredients': []}, content_type='application/json', headers=self.auth
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await Meal.objects.acount(), 3)
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.nutrient = Nutrient.objects.create(name='Protein', unit='g')
+
+    def test_second_read_is_served_from_cache(self):
+        first = self.client.get('/api/nutrients/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/nutrients/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+
+    def test_write_invalidates_by_version(self):
+        self.client.get('/api/nutrients/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Nutrient.objects.create(name='Fat', unit='g')
+
+        response = self.client.get('/api/nutrients/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([n['name'] for n in response.json()], ['Protein', 'Fat'])
+
+    def test_pages_are_cached_separately_with_their_links(self):
+        Nutrient.objects.create(name='Fat', unit='g')
+        self.client.get('/api/nutrients/?page_size=1')
+        response = self.client.get('/api/nutrients/?page_size=1')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.json()), 1)
+        self.assertIn('rel="next"', response['Link'])
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_links_are_not_shared_across_hosts_and_schemes(self):
+        Nutrient.objects.create(name='Fat', unit='g')
+        self.client.get('/api/nutrients/?page_size=1')
+        response = self.client.get('/api/nutrients/?page_size=1', HTTP_HOST='api.example.com', secure=True)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('<https://api.example.com/api/nutrients/', response['Link'])
+
+    def test_errors_are_not_cached(self):
+        self.client.get('/api/meals/999/')
+        response = self.client.get('/api/meals/999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('X-Cache', response)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_only_one_caller_builds_a_missing_key(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value', True
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight(cache, 'hot', build, 60, 10, 2.0)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_waiters_build_themselves_when_the_lock_holder_is_slow(self):
+        cache.add('slow:lock', 1, 10)
+        self.assertEqual(single_flight(cache, 'slow', lambda: ('fresh', True), 60, 10, 0.1), 'fresh')
+        self.assertIsNone(cache.get('slow'))
+
+
+calls = []
+
+
+@job(name='core.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@job(name='core.tests.explode')
+def explode():
+    raise RuntimeError('boom')
+
+
+@override_settings(JOBS_RUN_INLINE=False, JOBS_MAX_ATTEMPTS=2, JOBS_RETRY_DELAY=60)
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_identical_pending_jobs_are_stored_once(self):
+        record.enqueue(value=1)
+        record.enqueue(value=1)
+        record.enqueue(value=2)
+        self.assertEqual(Job.objects.count(), 2)
+
+        self.assertEqual(Worker().run_pending(), 2)
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertFalse(Job.objects.exists())
+
+    def test_claimed_jobs_are_not_handed_out_twice(self):
+        record.enqueue(value=1)
+        record.enqueue(value=2, delay=60)
+        self.assertEqual(len(claim('first', limit=5)), 1)
+        self.assertEqual(claim('second', limit=5), [])
+        # Still running, so an identical job can be queued again.
+        record.enqueue(value=1)
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 2)
+
+    def test_failing_jobs_are_retried_with_backoff_then_kept(self):
+        explode.enqueue()
+        Worker().run_pending()
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (Job.PENDING, 1))
+        self.assertGreater(failed.run_after, timezone.now() + timedelta(seconds=50))
+        self.assertIn('boom', failed.last_error)
+
+        Job.objects.update(run_after=timezone.now())
+        Worker().run_pending()
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), (Job.FAILED, 2))
+        self.assertEqual(Worker().run_pending(), 0)
+
+    def test_abandoned_jobs_are_picked_up_again(self):
+        record.enqueue(value=1)
+        claim('crashed')
+        self.assertEqual(Worker().run_pending(), 0)
+
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT + 1))
+        self.assertEqual(Worker().run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    def test_abandoned_jobs_out_of_attempts_are_failed(self):
+        record.enqueue(value=1)
+        claim('crashed')
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT + 1))
+        claim('crashed again')
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT + 1))
+
+        self.assertEqual(Worker().run_pending(), 0)
+        self.assertEqual(calls, [])
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts, failed.locked_by), (Job.FAILED, 2, ''))
+        self.assertIn('stopped responding', failed.last_error)
+
+    @override_settings(JOBS_RUN_INLINE=True)
+    def test_inline_jobs_run_immediately(self):
+        record.enqueue(value=3)
+        self.assertEqual(calls, [3])
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class DatabaseRouterTests(SimpleTestCase):
+
+    def route(self, method, path, cookies=None, write=False):
+        """Run the middleware around a fake view and return the alias chosen for a read."""
+        router = PrimaryReplicaRouter()
+        request = RequestFactory().generic(method, path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        chosen = []
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            if write:
+                router.db_for_write(Nutrient)
+            chosen.append(router.db_for_read(Nutrient))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(request)
+        return chosen[0], response
+
+    def test_catalog_reads_use_the_replica(self):
+        self.assertEqual(self.route('GET', '/api/nutrients/')[0], 'replica')
+        self.assertEqual(self.route('GET', '/api/meals/1/')[0], 'replica')
+
+    def test_other_requests_use_the_primary(self):
+        self.assertIsNone(self.route('POST', '/api/nutrients/')[0])
+        self.assertIsNone(self.route('GET', '/api/daily-entries/')[0])
+        self.assertIsNone(PrimaryReplicaRouter().db_for_read(Nutrient))
+
+    def test_reads_after_a_write_use_the_primary(self):
+        alias, response = self.route('GET', '/api/nutrients/', write=True)
+        self.assertIsNone(alias)
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        self.assertIsNone(self.route('GET', '/api/nutrients/', cookies={PRIMARY_PIN_COOKIE: '1'})[0])
+
+    @override_settings(DATABASE_REPLICA_ALIAS=None)
+    def test_without_a_replica_everything_uses_the_primary(self):
+        alias, response = self.route('GET', '/api/nutrients/', write=True)
+        self.assertIsNone(alias)
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+
+REPLICA = getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+
+
+@skipUnless(REPLICA, 'no read replica configured (DB_REPLICA_HOST)')
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', REPLICA} if REPLICA else {'default'}
+
+    def test_catalog_reads_hit_the_replica_connection(self):
+        Nutrient.objects.create(name='Protein', unit='g')
+        client = APIClient()
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = client.get('/api/nutrients/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], 'Protein')
+        self.assertTrue(replica.captured_queries)
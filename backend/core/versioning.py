@@ -0,0 +1,189 @@
+"""
+Per-table version counters.
+
+Apps register the models whose rows feed a cached or conditional response with
+`track_table_versions`; every save or delete then bumps that model's counter
+when its transaction commits, once per transaction. Readers fetch all the
+counters they depend on with one indexed query and derive ETags,
+Last-Modified dates and cache keys from them. A reader may briefly see new
+rows under the old counters; the bump that follows retires whatever it
+cached under them.
+"""
+import hashlib
+import weakref
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .models import TableVersion
+
+
+def table_label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+class TransactionBatch:
+    """
+    Collects items over a transaction and passes them to `flush(items)` once
+    it commits; outside a transaction, right away.
+    """
+
+    def __init__(self, flush):
+        self.flush = flush
+        self._pending = weakref.WeakKeyDictionary()
+
+    def add(self, items, using=None):
+        connection = transaction.get_connection(using)
+        self._pending.setdefault(connection, set()).update(items)
+        # Registered on every call, as a rolled back transaction drops its
+        # callbacks: its items then go out with the next commit instead.
+        transaction.on_commit(lambda: self._flush(connection), using=using)
+
+    def _flush(self, connection):
+        items = self._pending.pop(connection, None)
+        if items:
+            self.flush(items)
+
+
+def _bump(labels):
+    now = timezone.now()
+    updated = TableVersion.objects.filter(name__in=labels).update(version=F('version') + 1, updated_at=now)
+    if updated < len(labels):
+        TableVersion.objects.bulk_create(
+            [TableVersion(name=label, version=1, updated_at=now) for label in labels], ignore_conflicts=True
+        )
+
+
+_pending_bumps = TransactionBatch(_bump)
+
+
+def bump_table_versions(*models, using=None):
+    """
+    Bump the counters of `models` once the current transaction commits, once
+    per table however many rows it wrote. Writers thus hold a counter row's
+    lock only for that one statement, not for the rest of their transaction.
+    """
+    _pending_bumps.add({table_label(model) for model in models}, using)
+
+
+def _versions_queryset(labels):
+    return TableVersion.objects.filter(name__in=labels).values_list('name', 'version', 'updated_at')
+
+
+def table_versions(*models):
+    """Return `{label: (version, updated_at)}`; untouched tables report `(0, None)`."""
+    labels = [table_label(model) for model in models]
+    found = {name: (version, updated_at) for name, version, updated_at in _versions_queryset(labels)}
+    return {label: found.get(label, (0, None)) for label in labels}
+
+
+async def atable_versions(*models):
+    labels = [table_label(model) for model in models]
+    found = {name: (version, updated_at) async for name, version, updated_at in _versions_queryset(labels)}
+    return {label: found.get(label, (0, None)) for label in labels}
+
+
+def _bump_sender(sender, using=None, **kwargs):
+    bump_table_versions(sender, using=using)
+
+
+def track_table_versions(*models):
+    for model in models:
+        uid = f'core.versioning:{table_label(model)}'
+        post_save.connect(_bump_sender, sender=model, dispatch_uid=uid, weak=False)
+        post_delete.connect(_bump_sender, sender=model, dispatch_uid=uid, weak=False)
+
+
+def _memoized_versions(request, models):
+    cache = request.META.setdefault('core.table_versions', {})
+    key = tuple(table_label(model) for model in models)
+    if key not in cache:
+        # Counters fetched earlier in the request for a superset of the tables will do.
+        for versions in cache.values():
+            if versions.keys() >= set(key):
+                cache[key] = {label: versions[label] for label in key}
+                break
+    return cache, key
+
+
+def request_table_versions(request, models):
+    """`table_versions` memoized on the request, so validators and caches share one query."""
+    cache, key = _memoized_versions(request, models)
+    if key not in cache:
+        cache[key] = table_versions(*models)
+    return cache[key]
+
+
+async def arequest_table_versions(request, models):
+    cache, key = _memoized_versions(request, models)
+    if key not in cache:
+        cache[key] = await atable_versions(*models)
+    return cache[key]
+
+
+def versions_etag(request, *models):
+    versions = request_table_versions(request, models)
+    # The body also depends on the URL (pagination cursor, filters) and the
+    # negotiated renderer, so both are part of the tag.
+    fingerprint = '|'.join(
+        [request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+        + [f'{label}:{version}' for label, (version, _) in sorted(versions.items())]
+    )
+    return quote_etag(hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest())
+
+
+def versions_last_modified(request, *models):
+    timestamps = [updated_at for _, updated_at in request_table_versions(request, models).values() if updated_at]
+    return max(timestamps) if timestamps else None
+
+
+def conditional_on(*models):
+    """
+    `condition` decorator whose validators come from the version counters of
+    `models`, so a matching If-None-Match / If-Modified-Since gets a 304
+    before the view queries or serializes anything.
+    """
+    validate = condition(
+        etag_func=lambda request, *args, **kwargs: versions_etag(request, *models),
+        last_modified_func=lambda request, *args, **kwargs: versions_last_modified(request, *models),
+    )
+
+    def decorator(view):
+        conditional_view = validate(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Let browsers keep the body but revalidate it on every use.
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+async def aconditional_response(request, models, get_response):
+    """
+    `conditional_on` for coroutine views: answer 304 from the version counters,
+    otherwise await `get_response()` and add the validators to it.
+    """
+    # Fill the per-request memo so the sync helpers below do not query.
+    await arequest_table_versions(request, models)
+    etag = versions_etag(request, *models)
+    last_modified = versions_last_modified(request, *models)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await get_response()
+        if request.method in ('GET', 'HEAD'):
+            if timestamp is not None and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(timestamp)
+            response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -1,6 +1,9 @@
 from django.contrib import admin
-from .models import Meal, MealIngredient
+from .models import Meal, MealIngredient, MealNutrientTotal, DailyNutrientRollup, DailyGoalProgress
 
 
 admin.site.register(Meal)
 admin.site.register(MealIngredient)
+admin.site.register(MealNutrientTotal)
+admin.site.register(DailyNutrientRollup)
+admin.site.register(DailyGoalProgress)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MealsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'meals'
+
+    def ready(self):
+        from core.versioning import track_table_versions
+        from . import signals  # noqa: F401
+        track_table_versions(self.get_model('Meal'), self.get_model('MealIngredient'))
@@ -0,0 +1,162 @@
+"""
+Batch inserts for the food log and meal ingredients.
+
+All items are validated together: field validation runs per item without
+touching the database, then every referenced meal / ingredient is resolved
+with one query per reference field. Valid items are written with a single
+`bulk_create` inside one transaction, after which the derived tables
+(`MealNutrientTotal`, `DailyNutrientRollup`) are refreshed once for the whole
+batch instead of once per row.
+
+In `atomic` mode nothing is written unless every item is valid; in `partial`
+mode the valid items are written and the invalid ones reported.
+"""
+from django.db import transaction
+from rest_framework import serializers
+
+from core.versioning import bump_table_versions
+from nutrients.models import Ingredient
+from .models import DailyEntry, Meal, MealIngredient
+from .rollups import refresh_daily_rollups
+from .totals import refresh_meal_totals
+
+
+BULK_MODES = ('atomic', 'partial')
+
+
+class DailyEntryBulkItemSerializer(serializers.ModelSerializer):
+    meal_id = serializers.IntegerField()
+
+    class Meta:
+        model = DailyEntry
+        fields = ['id', 'meal_id', 'date', 'servings']
+        read_only_fields = ['id']
+
+
+class MealIngredientBulkItemSerializer(serializers.ModelSerializer):
+    meal_id = serializers.IntegerField()
+    ingredient_id = serializers.IntegerField()
+
+    class Meta:
+        model = MealIngredient
+        fields = ['id', 'meal_id', 'ingredient_id', 'amount_in_grams']
+        read_only_fields = ['id']
+
+
+def _missing_pk_error(pk):
+    return [serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist'].format(pk_value=pk)]
+
+
+class BulkCreate:
+    item_serializer_class = None
+    model = None
+
+    def __init__(self, items, mode='atomic'):
+        self.items = items
+        self.mode = mode
+        self.errors = {}
+        self.created = {}
+
+    def validate(self):
+        valid = {}
+        for index, item in enumerate(self.items):
+            serializer = self.item_serializer_class(data=item)
+            if serializer.is_valid():
+                valid[index] = serializer.validated_data
+            else:
+                self.errors[index] = serializer.errors
+
+        for field, queryset in self.get_references().items():
+            ids = {data[field] for data in valid.values()}
+            existing = set(queryset.filter(pk__in=ids).values_list('pk', flat=True))
+            for index, data in list(valid.items()):
+                if data[field] not in existing:
+                    self.errors[index] = {field: _missing_pk_error(data[field])}
+                    del valid[index]
+
+        self.validate_batch(valid)
+        return valid
+
+    def get_references(self):
+        """Map each reference field to the queryset its ids must exist in."""
+        return {}
+
+    def validate_batch(self, valid):
+        """Cross-item checks; move offending items from `valid` into `self.errors`."""
+
+    def build(self, data):
+        return self.model(**data)
+
+    def after_create(self, objects):
+        """Refresh whatever bulk_create skipped the signals for."""
+
+    def save(self):
+        valid = self.validate()
+        if self.errors and self.mode == 'atomic':
+            return False
+        if valid:
+            with transaction.atomic():
+                objects = self.model.objects.bulk_create([self.build(data) for data in valid.values()])
+                self.after_create(objects)
+            self.created = dict(zip(valid, objects))
+        return True
+
+    def results(self):
+        results = []
+        for index in range(len(self.items)):
+            if index in self.errors:
+                results.append({'index': index, 'status': 400, 'errors': self.errors[index]})
+            elif index in self.created:
+                data = self.item_serializer_class(self.created[index]).data
+                results.append({'index': index, 'status': 201, 'data': data})
+            else:
+                # Valid, but not written because another item of an atomic batch failed.
+                results.append({'index': index, 'status': 424})
+        return results
+
+
+class DailyEntryBulkCreate(BulkCreate):
+    item_serializer_class = DailyEntryBulkItemSerializer
+    model = DailyEntry
+
+    def __init__(self, user, items, mode='atomic'):
+        super().__init__(items, mode)
+        self.user = user
+
+    def get_references(self):
+        return {'meal_id': Meal.objects.all()}
+
+    def build(self, data):
+        return DailyEntry(user=self.user, **data)
+
+    def after_create(self, entries):
+        refresh_daily_rollups({(self.user.pk, entry.date) for entry in entries})
+
+
+class MealIngredientBulkCreate(BulkCreate):
+    item_serializer_class = MealIngredientBulkItemSerializer
+    model = MealIngredient
+
+    def get_references(self):
+        return {'meal_id': Meal.objects.all(), 'ingredient_id': Ingredient.objects.all()}
+
+    def validate_batch(self, valid):
+        pairs = {(data['meal_id'], data['ingredient_id']) for data in valid.values()}
+        if not pairs:
+            return
+        existing = set(
+            MealIngredient.objects
+            .filter(meal_id__in={meal_id for meal_id, _ in pairs}, ingredient_id__in={pk for _, pk in pairs})
+            .values_list('meal_id', 'ingredient_id')
+        )
+        seen = set()
+        for index, data in list(valid.items()):
+            pair = (data['meal_id'], data['ingredient_id'])
+            if pair in existing or pair in seen:
+                self.errors[index] = {'non_field_errors': ['This ingredient is already part of the meal.']}
+                del valid[index]
+            seen.add(pair)
+
+    def after_create(self, meal_ingredients):
+        refresh_meal_totals({meal_ingredient.meal_id for meal_ingredient in meal_ingredients})
+        bump_table_versions(MealIngredient)
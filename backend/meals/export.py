@@ -0,0 +1,163 @@
+"""
+Streaming food log export.
+
+Entries are read with `QuerySet.iterator(chunk_size=...)`, so only one chunk
+of entries (and the ingredient rows of their meals, read per chunk) is in
+memory at a time; every writer turns a chunk into one block of bytes.
+
+Each row is one DailyEntry with its meal's nutrient vector, computed with the
+in-memory nutrient matrix (nutrients.matrix), scaled by the servings eaten;
+one column per vector position (see nutrients.vectors).
+"""
+import csv
+import io
+import json
+
+from core.versioning import table_versions
+from nutrients.matrix import MATRIX_TABLES
+from nutrients.models import Nutrient
+from nutrients.vectors import nutrient_registry
+from .models import DailyEntry, MealIngredient, ingredient_vectors
+
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+EXPORT_CHUNK_SIZE = 2000
+
+ENTRY_COLUMNS = ['id', 'user_id', 'username', 'date', 'meal_id', 'meal', 'servings']
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_queryset(user=None, date_from=None, date_to=None):
+    entries = DailyEntry.objects.select_related('user', 'meal')
+    if user is not None:
+        entries = entries.filter(user=user)
+    if date_from is not None:
+        entries = entries.filter(date__gte=date_from)
+    if date_to is not None:
+        entries = entries.filter(date__lte=date_to)
+    return entries.order_by('user_id', 'date', 'id')
+
+
+class FoodLogExport:
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson',
+        'parquet': 'application/vnd.apache.parquet',
+    }
+
+    def __init__(self, output, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+        self.output = output
+        self.queryset = queryset
+        self.chunk_size = chunk_size
+        # Vector positions of every nutrient; nutrients sharing a code share a column.
+        self.positions = sorted({
+            nutrient_registry.position(name, unit, code)
+            for name, unit, code in Nutrient.objects.values_list('name', 'unit', 'code')
+        })
+        labels = nutrient_registry.labels
+        self.columns = ENTRY_COLUMNS + [f'{labels[position][0]} ({labels[position][1]})' for position in self.positions]
+
+    @property
+    def content_type(self):
+        return self.content_types[self.output]
+
+    def chunks(self):
+        """Yield lists of rows, `chunk_size` entries at a time."""
+        # One snapshot of the matrix counters for the whole export.
+        versions = table_versions(*MATRIX_TABLES)
+        entries = []
+        for entry in self.queryset.iterator(chunk_size=self.chunk_size):
+            entries.append(entry)
+            if len(entries) == self.chunk_size:
+                yield self.rows(entries, versions)
+                entries = []
+        if entries:
+            yield self.rows(entries, versions)
+
+    def rows(self, entries, versions):
+        vectors = ingredient_vectors(
+            MealIngredient.objects.filter(meal_id__in={entry.meal_id for entry in entries}).order_by()
+            .values_list('meal_id', 'ingredient_id', 'amount_in_grams'),
+            versions,
+        )
+        zeros = nutrient_registry.zeros()
+        rows = []
+        for entry in entries:
+            scaled = entry.scaled_vector(nutrient_registry.resize(vectors.get(entry.meal_id, zeros)))[self.positions]
+            rows.append(
+                [entry.pk, entry.user_id, entry.user.username, entry.date, entry.meal_id, entry.meal.name, entry.servings]
+                + scaled.tolist()
+            )
+        return rows
+
+    def stream(self):
+        """Yield the export as blocks of bytes."""
+        return getattr(self, f'stream_{self.output}')()
+
+    def stream_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.columns)
+        for rows in self.chunks():
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    def stream_ndjson(self):
+        for rows in self.chunks():
+            lines = [json.dumps(dict(zip(self.columns, row)), default=str) for row in rows]
+            yield ('\n'.join(lines) + '\n').encode()
+
+    def stream_parquet(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema(
+            [('id', pa.int64()), ('user_id', pa.int64()), ('username', pa.string()), ('date', pa.date32()),
+             ('meal_id', pa.int64()), ('meal', pa.string()), ('servings', pa.float64())]
+            + [(column, pa.float64()) for column in self.columns[len(ENTRY_COLUMNS):]]
+        )
+        sink = _ChunkSink()
+        # One row group per chunk; the footer is written when the writer closes.
+        with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+            for rows in self.chunks():
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)], schema=schema
+                ))
+                yield sink.drain()
+        yield sink.drain()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only stream handing out what was written since the last `drain`."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
@@ -0,0 +1,8 @@
+from core.jobs import job
+from . import totals
+
+
+@job
+def refresh_ingredient_totals(ingredient_ids, nutrient_ids=None):
+    """Refresh every meal using the ingredients; one edit can touch thousands of meals and their rollups."""
+    totals.refresh_ingredient_totals(ingredient_ids, nutrient_ids)
@@ -0,0 +1,48 @@
+import sys
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meals.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, FoodLogExport, export_queryset, parquet_available
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Stream every user's (or one user's) food log with scaled nutrients to a CSV, NDJSON or Parquet file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to export (defaults to all users)')
+        parser.add_argument('--output-format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (defaults to stdout)')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help='First date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='Last date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Entries read per database round trip')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = CustomUser.objects.get(username=options['user'])
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist")
+        if options['output_format'] == 'parquet' and not parquet_available():
+            raise CommandError('Parquet export needs pyarrow')
+
+        export = FoodLogExport(
+            options['output_format'], export_queryset(user, options['date_from'], options['date_to']),
+            chunk_size=options['chunk_size'],
+        )
+        started = time.monotonic()
+        written = 0
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for block in export.stream():
+                output.write(block)
+                written += len(block)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']} in {elapsed:.1f}s"))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from meals.rollups import rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user per-day nutrient rollups from DailyEntry and the meal nutrient totals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of users recomputed per query')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuilt = rebuild_daily_rollups(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt daily rollups for {rebuilt} users in {elapsed:.1f}s'))
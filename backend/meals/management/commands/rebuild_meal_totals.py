@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from meals.totals import rebuild_meal_totals
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized per-meal nutrient totals table from MealIngredient and IngredientNutrient.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of meals recomputed per query')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuilt = rebuild_meal_totals(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt nutrient totals for {rebuilt} meals in {elapsed:.1f}s'))
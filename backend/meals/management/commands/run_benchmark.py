@@ -0,0 +1,167 @@
+import json
+import statistics
+import subprocess
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from meals.models import DailyEntry, Meal
+from meals.serializers import MealSerializer
+from nutrients.models import Ingredient
+from users.models import CustomUser
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _summarize(durations, queries, extra=None):
+    durations = sorted(durations)
+    result = {
+        'runs': len(durations),
+        'mean_ms': round(statistics.fmean(durations) * 1000, 3),
+        'p50_ms': round(durations[len(durations) // 2] * 1000, 3),
+        'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 3),
+        'max_ms': round(durations[-1] * 1000, 3),
+        'queries': max(queries),
+    }
+    result.update(extra or {})
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Time the main API endpoints and hot code paths and store the results as JSON for comparison.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per benchmark')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed runs per benchmark')
+        parser.add_argument('--user', help='Username to benchmark as (defaults to the first seeded user)')
+        parser.add_argument('--output', help='JSON file to write (defaults to benchmarks/<timestamp>-<commit>.json)')
+        parser.add_argument('--compare', help='Earlier results file to print the difference against')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        self.warmup = options['warmup']
+        user = self.benchmark_user(options['user'])
+        meal = Meal.objects.filter(meal_ingredients__isnull=False).order_by('pk').first()
+        if meal is None:
+            raise CommandError('No meals to benchmark; run `manage.py seed_benchmark` first')
+        ingredient = Ingredient.objects.exclude(search_name='').order_by('pk').first()
+        query = ingredient.search_name[:4] if ingredient else 'chi'
+
+        token = str(RefreshToken.for_user(user).access_token)
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+        self.client = Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f'Bearer {token}')
+        today = date.today()
+
+        results = {}
+        endpoints = [
+            ('GET meal_list', '/api/meals/'),
+            ('GET meal_detail', f'/api/meals/{meal.pk}/'),
+            ('GET daily_entry_list', '/api/daily-entries/'),
+            ('GET daily_entry_summary', f'/api/daily-entries/summary/?date={today}'),
+            ('GET daily_entry_history', f'/api/daily-entries/history/?from={today - timedelta(days=90)}&to={today}'),
+            ('GET ingredient_list', '/api/ingredients/'),
+            ('GET ingredient_search', f'/api/ingredients/search/?q={query}'),
+            ('GET nutrient_list', '/api/nutrients/'),
+            ('GET ingredient_nutrient_list', '/api/ingredient_nutrients/'),
+            ('GET profile', '/api/profile/'),
+        ]
+        for name, url in endpoints:
+            results[name] = self.time_request(url)
+            self.report(name, results[name])
+
+        meals = list(Meal.objects.filter(meal_ingredients__isnull=False).distinct().order_by('pk')[:100])
+        results['Meal.total_nutrients'] = self.time_callable(meal.total_nutrients)
+        results['MealSerializer(many=True) x100'] = self.time_callable(
+            lambda: MealSerializer(Meal.objects.filter(pk__in=[m.pk for m in meals]), many=True).data
+        )
+        for name in ('Meal.total_nutrients', 'MealSerializer(many=True) x100'):
+            self.report(name, results[name])
+
+        document = {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'database': connection.vendor,
+            'repeat': self.repeat,
+            'data': {
+                'users': CustomUser.objects.count(),
+                'meals': Meal.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+                'daily_entries': DailyEntry.objects.count(),
+            },
+            'results': results,
+        }
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' /
+                      f"{time.strftime('%Y%m%d-%H%M%S')}-{document['commit']}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(document, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), document)
+
+    def benchmark_user(self, username):
+        if username:
+            try:
+                return CustomUser.objects.get(username=username)
+            except CustomUser.DoesNotExist:
+                raise CommandError(f'User {username!r} does not exist')
+        users = CustomUser.objects.filter(username__startswith='bench_').order_by('pk')
+        user = users.first() or CustomUser.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError('No users to benchmark as; run `manage.py seed_benchmark` first')
+        return user
+
+    def measure(self, func):
+        for _ in range(self.warmup):
+            func()
+        durations, queries = [], []
+        for _ in range(self.repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                result = func()
+                durations.append(time.perf_counter() - started)
+            queries.append(len(captured))
+        return result, durations, queries
+
+    def time_request(self, url):
+        response, durations, queries = self.measure(lambda: self.client.get(url))
+        if response.status_code != 200:
+            self.stderr.write(f'GET {url} returned {response.status_code}')
+        return _summarize(durations, queries, {'url': url, 'status': response.status_code, 'bytes': len(response.content)})
+
+    def time_callable(self, func):
+        _, durations, queries = self.measure(func)
+        return _summarize(durations, queries)
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<34} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+            f"{result['queries']:>4} queries"
+        )
+
+    def compare(self, before, after):
+        self.stdout.write(f"\nCompared with {before.get('commit', '?')} (p50, queries):")
+        for name, result in after['results'].items():
+            previous = before.get('results', {}).get(name)
+            if previous is None:
+                continue
+            change = (result['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100 if previous['p50_ms'] else 0.0
+            self.stdout.write(
+                f"{name:<34} {previous['p50_ms']:>9.2f} -> {result['p50_ms']:>9.2f} ms ({change:+.1f}%)  "
+                f"{previous['queries']:>4} -> {result['queries']:>4} queries"
+            )
@@ -0,0 +1,192 @@
+import math
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.versioning import bump_table_versions
+
+from meals.models import DailyEntry, Meal, MealIngredient
+from meals.rollups import rebuild_daily_rollups
+from meals.totals import rebuild_meal_totals
+from nutrients.models import Ingredient, IngredientNutrient, Nutrient, normalize_search_text
+from users.models import CustomUser, UserProfile
+
+
+BENCH_PREFIX = 'bench'
+MACROS = [('Calories', 'kcal'), ('Protein', 'g'), ('Carbs', 'g'), ('Fat', 'g')]
+MICROS = [
+    ('Fiber', 'g'), ('Sugar', 'g'), ('Sodium', 'mg'), ('Potassium', 'mg'), ('Calcium', 'mg'),
+    ('Iron', 'mg'), ('Magnesium', 'mg'), ('Zinc', 'mg'), ('Vitamin A', 'ug'), ('Vitamin C', 'mg'),
+    ('Vitamin D', 'ug'), ('Vitamin B12', 'ug'), ('Cholesterol', 'mg'), ('Saturated Fat', 'g'),
+]
+CATEGORIES = [
+    'Vegetables', 'Fruits', 'Grains', 'Dairy', 'Poultry', 'Beef', 'Pork', 'Fish', 'Legumes',
+    'Nuts and Seeds', 'Oils', 'Sweets', 'Beverages', 'Spices', 'Baked Goods',
+]
+WORDS = [
+    'raw', 'cooked', 'boiled', 'roasted', 'fresh', 'frozen', 'canned', 'dried', 'organic', 'whole',
+    'sliced', 'ground', 'lean', 'smoked', 'low fat', 'sweetened', 'plain', 'green', 'red', 'wild',
+]
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic, production-sized data set for benchmarks (users, catalog, meals, food logs).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--ingredients', type=int, default=20000)
+        parser.add_argument('--nutrients', type=int, default=40, help='Total nutrients, including the four macros')
+        parser.add_argument('--meals', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=90, help='Days of food log history per user')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded benchmark data first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        if options['clear']:
+            self.clear()
+        with transaction.atomic():
+            nutrients = self.seed_nutrients(options['nutrients'])
+            ingredient_ids = self.seed_ingredients(options['ingredients'], nutrients)
+            meal_ids = self.seed_meals(options['meals'], ingredient_ids)
+            self.seed_users_and_entries(options['users'], options['days'], meal_ids)
+            bump_table_versions(Nutrient, Ingredient, IngredientNutrient, Meal, MealIngredient)
+        self.step('Rebuilding meal nutrient totals', rebuild_meal_totals)
+        self.step('Rebuilding daily rollups', rebuild_daily_rollups)
+        self.stdout.write(self.style.SUCCESS(f'Seeded benchmark data in {time.monotonic() - started:.1f}s'))
+
+    def step(self, label, func, *args):
+        started = time.monotonic()
+        result = func(*args)
+        self.stdout.write(f'{label}: done in {time.monotonic() - started:.1f}s')
+        return result
+
+    def clear(self):
+        CustomUser.objects.filter(username__startswith=f'{BENCH_PREFIX}_').delete()
+        Meal.objects.filter(name__startswith=f'{BENCH_PREFIX.title()} ').delete()
+        Ingredient.objects.filter(category__startswith=f'{BENCH_PREFIX.title()} ').delete()
+        Nutrient.objects.filter(name__startswith=f'{BENCH_PREFIX.title()} ').delete()
+        self.stdout.write('Cleared previous benchmark data')
+
+    def seed_nutrients(self, count):
+        nutrients = {}
+        for name, unit in MACROS + MICROS[:max(count - len(MACROS), 0)]:
+            nutrients[name] = Nutrient.objects.get_or_create(name=name, defaults={'unit': unit})[0]
+        extra = [
+            Nutrient(name=f'{BENCH_PREFIX.title()} nutrient {index}', unit='mg')
+            for index in range(max(count - len(nutrients), 0))
+        ]
+        for nutrient in Nutrient.objects.bulk_create(extra):
+            nutrients[nutrient.name] = nutrient
+        self.stdout.write(f'Nutrients: {len(nutrients)}')
+        return nutrients
+
+    def seed_ingredients(self, count, nutrients):
+        macro_ids = {name: nutrients[name].pk for name, _ in MACROS if name in nutrients}
+        other_ids = [nutrient.pk for name, nutrient in nutrients.items() if name not in macro_ids]
+        ingredient_ids = []
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for index in range(start, min(start + self.batch_size, count)):
+                category = f'{BENCH_PREFIX.title()} {self.rng.choice(CATEGORIES)}'
+                name = f'{self.rng.choice(WORDS).title()} {category.split(" ", 1)[1].lower()} {index}'
+                batch.append(Ingredient(
+                    name=name, category=category,
+                    search_name=normalize_search_text(name), search_category=normalize_search_text(category),
+                ))
+            created = Ingredient.objects.bulk_create(batch)
+            if created and created[0].pk is None:
+                created = list(Ingredient.objects.filter(category__startswith=f'{BENCH_PREFIX.title()} ')
+                               .order_by('-pk')[:len(batch)])
+            links = []
+            for ingredient in created:
+                ingredient_ids.append(ingredient.pk)
+                links.extend(self.ingredient_nutrients(ingredient.pk, macro_ids, other_ids))
+            IngredientNutrient.objects.bulk_create(links, batch_size=self.batch_size)
+            self.stdout.write(f'Ingredients: {len(ingredient_ids)}/{count}')
+        return ingredient_ids
+
+    def ingredient_nutrients(self, ingredient_id, macro_ids, other_ids):
+        # Macros add up to at most 100 g and calories follow the Atwater factors.
+        split = [self.rng.random() ** 2 for _ in range(3)]
+        scale = self.rng.uniform(5, 95) / sum(split)
+        protein, carbs, fat = (value * scale for value in split)
+        amounts = {'Protein': protein, 'Carbs': carbs, 'Fat': fat, 'Calories': 4 * protein + 4 * carbs + 9 * fat}
+        links = [
+            IngredientNutrient(ingredient_id=ingredient_id, nutrient_id=nutrient_id, amount_per_100g=round(amounts[name], 2))
+            for name, nutrient_id in macro_ids.items()
+        ]
+        for nutrient_id in self.rng.sample(other_ids, k=min(len(other_ids), self.rng.randint(0, 12))):
+            links.append(IngredientNutrient(
+                ingredient_id=ingredient_id, nutrient_id=nutrient_id,
+                amount_per_100g=round(self.rng.lognormvariate(1, 1.2), 3),
+            ))
+        return links
+
+    def seed_meals(self, count, ingredient_ids):
+        meal_ids = []
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            meals = Meal.objects.bulk_create(
+                [Meal(name=f'{BENCH_PREFIX.title()} meal {start + index}', description='Synthetic benchmark meal')
+                 for index in range(size)]
+            )
+            if meals and meals[0].pk is None:
+                meals = list(Meal.objects.filter(name__startswith=f'{BENCH_PREFIX.title()} ').order_by('-pk')[:size])
+            rows = []
+            for meal in meals:
+                meal_ids.append(meal.pk)
+                size_of_meal = max(1, min(len(ingredient_ids), round(self.rng.gauss(6, 3))))
+                for ingredient_id in self.rng.sample(ingredient_ids, k=size_of_meal):
+                    rows.append(MealIngredient(
+                        meal_id=meal.pk, ingredient_id=ingredient_id,
+                        amount_in_grams=round(min(self.rng.lognormvariate(4, 0.8), 1000), 1),
+                    ))
+            MealIngredient.objects.bulk_create(rows, batch_size=self.batch_size)
+            self.stdout.write(f'Meals: {len(meal_ids)}/{count}')
+        return meal_ids
+
+    def seed_users_and_entries(self, count, days, meal_ids):
+        password = make_password('benchmark-password')
+        # Meal popularity follows a Zipf-like curve: a few meals are logged constantly.
+        weights = [1 / math.pow(rank + 1, 1.1) for rank in range(len(meal_ids))]
+        today = date.today()
+        for start in range(0, count, self.batch_size):
+            users = CustomUser.objects.bulk_create([
+                CustomUser(username=f'{BENCH_PREFIX}_user_{index}', email=f'{BENCH_PREFIX}_user_{index}@example.com',
+                           password=password)
+                for index in range(start, min(start + self.batch_size, count))
+            ])
+            if users and users[0].pk is None:
+                users = list(CustomUser.objects.filter(username__startswith=f'{BENCH_PREFIX}_').order_by('-pk')[:len(users)])
+            UserProfile.objects.bulk_create([
+                UserProfile(
+                    user=user, height=self.rng.randint(150, 200), weight=self.rng.randint(50, 120), gender=self.rng.choice('MF'),
+                    target_weight=self.rng.randint(50, 110), target_calories=self.rng.randrange(1600, 3200, 50),
+                    target_protein=self.rng.randrange(80, 220, 5), target_carbs=self.rng.randrange(150, 350, 5),
+                    target_fat=self.rng.randrange(40, 110, 5),
+                )
+                for user in users
+            ])
+            entries = []
+            for user in users:
+                active_days = [today - timedelta(days=offset) for offset in range(days) if self.rng.random() < 0.85]
+                for day in active_days:
+                    for meal_id in self.rng.choices(meal_ids, weights=weights, k=self.rng.randint(2, 5)):
+                        entries.append(DailyEntry(
+                            user=user, meal_id=meal_id, date=day,
+                            servings=self.rng.choice((0.5, 1.0, 1.0, 1.0, 1.5, 2.0)),
+                        ))
+                if len(entries) >= self.batch_size:
+                    DailyEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+                    entries = []
+            DailyEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+            self.stdout.write(f'Users: {min(start + self.batch_size, count)}/{count}')
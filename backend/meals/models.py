@@ -1,28 +1,112 @@
 from django.db import models
+from django.db.models import F, Prefetch, Sum
 from users.models import CustomUser
-from nutrients.models import Ingredient, IngredientNutrient
+from nutrients.matrix import nutrient_matrix
+from nutrients.models import Ingredient, IngredientNutrient, Nutrient
+from nutrients.vectors import nutrient_registry
 from datetime import date
+from itertools import groupby
+from operator import itemgetter
+
+
+def totals_prefetch(lookup='totals'):
+    """
+    Prefetch a meal's MealNutrientTotal rows (with their nutrient) into
+    `meal.prefetched_totals`; `lookup` may go through other relations, e.g.
+    'meal__totals' from DailyEntry.
+    """
+    return Prefetch(
+        lookup,
+        queryset=MealNutrientTotal.objects.select_related('nutrient').order_by('nutrient_id'),
+        to_attr='prefetched_totals',
+    )
+
+
+def ingredient_vectors(rows, versions=None):
+    """
+    Nutrient vectors computed from `(meal_id, ingredient_id, amount_in_grams)`
+    MealIngredient rows with the in-memory ingredient x nutrient matrix
+    (nutrients.matrix), in one sparse product for all meals. `versions` are
+    the matrix tables' counters if the caller already has them. Returns
+    {meal_id: vector}; meals without rows are absent from the result.
+    """
+    rows = list(rows)
+    if not rows:
+        return {}
+    return nutrient_matrix.vector_map(*zip(*rows), versions=versions)
+
+
+class MealQuerySet(models.QuerySet):
+    def nutrient_vectors(self):
+        """
+        Nutrient totals for every meal in the queryset as vectors (see
+        nutrients.vectors), read from the denormalized MealNutrientTotal table
+        in a single indexed lookup. Returns {meal_id: vector}; meals without
+        any nutrient data are absent from the result.
+        """
+        rows = (
+            MealNutrientTotal.objects
+            .filter(meal__in=self.values('pk'))
+            .order_by('meal_id', 'nutrient_id')
+            .values_list('meal_id', 'nutrient__name', 'nutrient__unit', 'nutrient__code', 'amount')
+        )
+        return {
+            meal_id: nutrient_registry.vector(row[1:] for row in group)
+            for meal_id, group in groupby(rows, key=itemgetter(0))
+        }
+
+    def ingredient_vectors(self, versions=None):
+        """Like `nutrient_vectors`, but computed from the meals' ingredients (see `ingredient_vectors`)."""
+        return ingredient_vectors(
+            MealIngredient.objects.filter(meal__in=self.values('pk')).order_by()
+            .values_list('meal_id', 'ingredient_id', 'amount_in_grams'),
+            versions,
+        )
+
+    def nutrient_totals(self):
+        """`nutrient_vectors` as {meal_id: {nutrient_name: {'amount', 'unit', 'code'}}}."""
+        return {meal_id: nutrient_registry.as_dict(vector) for meal_id, vector in self.nutrient_vectors().items()}
+
+    def computed_nutrient_totals(self, nutrient_ids=None):
+        """
+        Aggregate (meal_id, nutrient_id, amount) rows straight from
+        MealIngredient x IngredientNutrient; used to (re)build MealNutrientTotal.
+        """
+        filters = {'meal__in': self.values('pk'), 'ingredient__nutrients__isnull': False}
+        if nutrient_ids is not None:
+            filters['ingredient__nutrients__nutrient_id__in'] = nutrient_ids
+        return (
+            MealIngredient.objects
+            .filter(**filters)
+            .values('meal_id', 'ingredient__nutrients__nutrient_id')
+            .annotate(amount=Sum(
+                F('ingredient__nutrients__amount_per_100g') / 100.0 * F('amount_in_grams')
+            ))
+            .order_by()
+            .values_list('meal_id', 'ingredient__nutrients__nutrient_id', 'amount')
+        )
 
 
 class Meal(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
 
+    objects = MealQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    def nutrient_vector(self):
+        if hasattr(self, 'prefetched_totals'):
+            return nutrient_registry.vector(
+                (total.nutrient.name, total.nutrient.unit, total.nutrient.code, total.amount)
+                for total in self.prefetched_totals
+            )
+        vector = Meal.objects.filter(pk=self.pk).nutrient_vectors().get(self.pk)
+        return nutrient_registry.zeros() if vector is None else vector
+
     def total_nutrients(self):
-        nutrients = {}
-        for meal_ingredient in self.meal_ingredients.select_related('ingredient').prefetch_related('ingredient__nutrients__nutrient'):
-            ingredient = meal_ingredient.ingredient
-            for ingredient_nutrient in ingredient.nutrients.select_related('nutrient'):
-                nutrient_name = ingredient_nutrient.nutrient.name
-                nutrient_amount = (ingredient_nutrient.amount_per_100g / 100.0) * meal_ingredient.amount_in_grams
-                nutrients[nutrient_name] = {
-                    'amount': nutrients.get(nutrient_name, {}).get('amount', 0) + nutrient_amount,
-                    'unit': ingredient_nutrient.nutrient.unit
-                }
-        return nutrients
+        return nutrient_registry.as_dict(self.nutrient_vector())
 
 
 class MealIngredient(models.Model):
@@ -37,6 +121,18 @@ class MealIngredient(models.Model):
         return f'{self.amount_in_grams}g of {self.ingredient.name} in {self.meal.name}'
 
 
+class MealNutrientTotal(models.Model):
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='totals')
+    nutrient = models.ForeignKey(Nutrient, on_delete=models.CASCADE, related_name='meal_totals')
+    amount = models.FloatField(help_text='Total amount of the nutrient in the whole meal')
+
+    class Meta:
+        unique_together = ('meal', 'nutrient')
+
+    def __str__(self):
+        return f'{self.amount} {self.nutrient.unit} of {self.nutrient.name} in {self.meal.name}'
+
+
 class DailyEntry(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='daily_entries')
     meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='daily_entries')
@@ -49,3 +145,46 @@ class DailyEntry(models.Model):
 
     def __str__(self):
         return f'{self.user.username} ate {self.servings}x {self.meal.name} on {self.date}'
+
+    def scaled_vector(self, meal_vector=None):
+        """The meal's nutrient vector multiplied by the servings eaten."""
+        return (self.meal.nutrient_vector() if meal_vector is None else meal_vector) * self.servings
+
+    def scaled_nutrients(self, meal_vector=None):
+        return nutrient_registry.as_dict(self.scaled_vector(meal_vector))
+
+
+class DailyNutrientRollup(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    nutrient = models.ForeignKey(Nutrient, on_delete=models.CASCADE, related_name='daily_rollups')
+    amount = models.FloatField(help_text='Total amount of the nutrient eaten by the user on this date')
+
+    class Meta:
+        unique_together = ('user', 'date', 'nutrient')
+        ordering = ['date']
+
+    def __str__(self):
+        return f'{self.user.username} ate {self.amount} {self.nutrient.unit} of {self.nutrient.name} on {self.date}'
+
+
+class DailyGoalProgress(models.Model):
+    """A user's macros for one day next to their profile targets, derived from DailyNutrientRollup."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='goal_progress')
+    date = models.DateField()
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fat = models.FloatField(default=0)
+    target_calories = models.PositiveIntegerField(null=True)
+    target_protein = models.PositiveIntegerField(null=True)
+    target_carbs = models.PositiveIntegerField(null=True)
+    target_fat = models.PositiveIntegerField(null=True)
+    on_target = models.BooleanField(default=False, help_text='Calories within GOAL_CALORIE_TOLERANCE of the target')
+
+    class Meta:
+        unique_together = ('user', 'date')
+        ordering = ['date']
+
+    def __str__(self):
+        return f'{self.user.username} ate {self.calories:.0f}/{self.target_calories} kcal on {self.date}'
@@ -0,0 +1,224 @@
+"""
+Meal plan suggestions.
+
+Given what is left of a user's daily macro targets, `plan_meals` picks a few
+combinations of catalog meals and servings that come closest to it. Each
+macro's shortfall or excess is measured relative to the user's daily target
+for it, so being 100 kcal and 10 g of protein off weigh alike, and the error
+of a plan is the sum of the squared relative deviations.
+
+The search is a beam search over the whole catalog at once: for a partial
+plan, the best servings of every meal follow in closed form (a least-squares
+projection, rounded to MEAL_PLAN_SERVING_STEP), so each step is a handful of
+array operations over the meals x plans matrix, and the `beam` best plans
+are extended by one more meal until `max_meals`.
+
+`meal_catalog` holds the macro vectors of all meals, computed from their
+ingredients with the in-memory nutrient matrix (nutrients.matrix) and rebuilt
+when the meal or nutrient tables change.
+"""
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from core.versioning import table_versions
+from nutrients.models import IngredientNutrient, Nutrient
+from nutrients.matrix import nutrient_matrix
+from nutrients.vectors import nutrient_registry
+from .models import Meal, MealIngredient
+from .summary import MACRO_CODES, daily_nutrient_vector, macro_totals, profile_targets
+
+
+MACROS = tuple(MACRO_CODES)
+CATALOG_TABLES = (Meal, MealIngredient, IngredientNutrient, Nutrient)
+
+# Plans within about 5% of the daily targets get no more meals.
+GOOD_FIT = 0.05 ** 2
+
+
+class MealCatalog:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fingerprint = None
+        self.meal_ids = np.empty(0, np.int64)
+        # One row per meal, MACROS columns.
+        self.macros = np.empty((0, len(MACROS)))
+
+    def sync(self, versions=None):
+        """Return `(meal_ids, macros)`, rebuilt first when a catalog table changed."""
+        versions = versions or table_versions(*CATALOG_TABLES)
+        fingerprint = tuple(sorted(versions.items()))
+        if fingerprint != self.fingerprint:
+            with self._lock:
+                if fingerprint != self.fingerprint:
+                    self._load(versions)
+                    self.fingerprint = fingerprint
+        return self.meal_ids, self.macros
+
+    def _load(self, versions):
+        rows = list(
+            MealIngredient.objects.order_by()
+            .values_list('meal_id', 'ingredient_id', 'amount_in_grams').iterator(chunk_size=10000)
+        )
+        if not rows:
+            self.meal_ids, self.macros = np.empty(0, np.int64), np.empty((0, len(MACROS)))
+            return
+        positions = [nutrient_registry.code_position(MACRO_CODES[macro]) for macro in MACROS]
+        meal_ids, macros = nutrient_matrix.vectors(*zip(*rows), versions=versions, positions=positions)
+        # Meals without any macros can't help fill a budget.
+        useful = macros.any(axis=1)
+        self.meal_ids, self.macros = meal_ids[useful], macros[useful]
+
+
+meal_catalog = MealCatalog()
+
+
+def _best_servings(weighted, norms, inverse_norms, residuals):
+    """
+    Best rounded servings of every meal (rows) for every residual (columns),
+    and the error each choice leaves. Works in place, as the arrays are
+    catalog-sized.
+    """
+    step = settings.MEAL_PLAN_SERVING_STEP
+    dots = weighted @ residuals.T
+    servings = dots * inverse_norms[:, None]
+    servings *= 1 / step
+    np.round(servings, out=servings)
+    servings *= step
+    np.clip(servings, step, settings.MEAL_PLAN_MAX_SERVINGS, out=servings)
+    # |r - s m|^2 = |r|^2 - s (2 m.r - s |m|^2)
+    errors = servings * norms[:, None]
+    errors -= 2 * dots
+    errors *= servings
+    errors += np.einsum('ij,ij->i', residuals, residuals)
+    return servings, errors
+
+
+def _refine(weighted, budget, servings):
+    """
+    Servings for one plan's meals (`weighted` rows) fitted jointly: the
+    greedy search fixes each meal's servings when it adds the meal, so the
+    least-squares solution and single steps up or down from the best so far
+    are tried too. Returns `(error, servings)`.
+    """
+    step, most = settings.MEAL_PLAN_SERVING_STEP, settings.MEAL_PLAN_MAX_SERVINGS
+
+    def error(candidate):
+        residual = budget - candidate @ weighted
+        return float(residual @ residual)
+
+    solved = np.linalg.lstsq(weighted.T, budget, rcond=None)[0]
+    starts = [np.asarray(servings), np.clip(np.round(solved / step) * step, step, most)]
+    best_error, best = min((error(start), tuple(start.tolist())) for start in starts)
+    improved = True
+    while improved:
+        improved = False
+        for index in range(len(best)):
+            for delta in (-step, step):
+                candidate = np.array(best)
+                candidate[index] = min(max(candidate[index] + delta, step), most)
+                candidate_error = error(candidate)
+                if candidate_error < best_error - 1e-12:
+                    best_error, best, improved = candidate_error, tuple(candidate.tolist()), True
+    return max(best_error, 0.0), best
+
+
+def plan_meals(macros, budget, scale, count=3, max_meals=2, beam=None):
+    """
+    Up to `count` plans of at most `max_meals` catalog rows (`macros`, one row
+    per meal) whose total comes closest to `budget`, deviations divided by
+    `scale` (a macro with scale 0 is ignored). Returns `[(error, rows,
+    servings)]`, best first, where `rows` index `macros`.
+    """
+    if not len(macros) or not count:
+        return []
+    scale = np.asarray(scale, dtype=float)
+    weights = np.divide(1.0, scale, out=np.zeros(len(scale)), where=scale > 0)
+    budget = np.asarray(budget, dtype=float) * weights
+    # The search ranks candidates in single precision, which halves the
+    # memory traffic over the catalog; the final fit is in double precision.
+    weighted = (macros * weights).astype(np.float32)
+    norms = np.einsum('ij,ij->i', weighted, weighted)
+    inverse_norms = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    beam = beam or max(2 * count, 8)
+
+    plans = {}
+    states = [((), ())]
+    residuals = budget.astype(np.float32)[None, :]
+    for _ in range(max_meals):
+        # All partial plans are extended at once: meals x plans matrices.
+        servings, errors = _best_servings(weighted, norms, inverse_norms, residuals)
+        for column, (rows, _) in enumerate(states):
+            errors[list(rows), column] = np.inf
+        # A few spare candidates, as permutations of one plan are dropped below.
+        size = 4 * beam
+        if size < errors.size:
+            top = np.argpartition(errors, size, axis=None)[:size]
+            top = top[np.argsort(errors.flat[top], kind='stable')]
+        else:
+            top = np.argsort(errors, axis=None, kind='stable')
+
+        next_states, next_residuals = [], []
+        for row, column in zip(*np.unravel_index(top, errors.shape)):
+            error = errors[row, column]
+            if not np.isfinite(error):
+                break
+            rows, plan_servings = states[column]
+            rows, plan_servings = rows + (int(row),), plan_servings + (float(servings[row, column]),)
+            key = frozenset(rows)
+            if key in plans:
+                continue
+            plans[key] = (max(float(error), 0.0), rows, plan_servings)
+            # A plan that already fits is not padded with a few calories more.
+            if len(next_states) < beam and error > GOOD_FIT:
+                next_states.append((rows, plan_servings))
+                next_residuals.append(residuals[column] - servings[row, column] * weighted[row])
+        if not next_states:
+            break
+        states, residuals = next_states, np.array(next_residuals)
+    # Refit the servings of the most promising plans.
+    refined = []
+    for _, rows, servings in sorted(plans.values(), key=lambda plan: plan[0])[:beam]:
+        error, servings = _refine(macros[list(rows)] * weights, budget, servings)
+        refined.append((error, rows, servings))
+    return sorted(refined, key=lambda plan: plan[0])[:count]
+
+
+def meal_plan(user, day, count=3, max_meals=2):
+    """
+    Suggestions for filling what is left of `user`'s macro targets on `day`,
+    or None when the user has no profile (and so no targets).
+    """
+    targets = profile_targets(user)
+    if targets is None:
+        return None
+    eaten = macro_totals(daily_nutrient_vector(user, day))
+    budget = {macro: max(targets[macro] - eaten[macro], 0.0) for macro in MACROS}
+
+    if not any(budget.values()):
+        return {'date': day, 'targets': targets, 'eaten': eaten, 'budget': budget, 'suggestions': []}
+
+    meal_ids, macros = meal_catalog.sync()
+    plans = plan_meals(
+        macros, [budget[macro] for macro in MACROS], [targets[macro] for macro in MACROS], count, max_meals
+    )
+    chosen = {int(meal_ids[row]) for _, rows, _ in plans for row in rows}
+    names = dict(Meal.objects.filter(pk__in=chosen).values_list('pk', 'name'))
+
+    suggestions = []
+    for error, rows, servings in plans:
+        portions = [(int(meal_ids[row]), serving, macros[row] * serving) for row, serving in zip(rows, servings)]
+        total = sum(amounts for _, _, amounts in portions)
+        suggestions.append({
+            'meals': [
+                {'meal_id': meal_id, 'name': names.get(meal_id, ''), 'servings': serving,
+                 'macros': dict(zip(MACROS, amounts.tolist()))}
+                for meal_id, serving, amounts in portions
+            ],
+            'macros': dict(zip(MACROS, total.tolist())),
+            'remaining': {macro: budget[macro] - amount for macro, amount in zip(MACROS, total.tolist())},
+            'error': error,
+        })
+    return {'date': day, 'targets': targets, 'eaten': eaten, 'budget': budget, 'suggestions': suggestions}
@@ -0,0 +1,196 @@
+"""
+Goal progress: daily macros against the profile targets.
+
+`DailyGoalProgress` holds one row per user and logged day, derived from the
+daily rollups. Whatever refreshes rollups refreshes the matching progress rows
+(see meals.rollups), and a change of profile targets recomputes the user's
+rows, so `goal_progress` reads O(days requested) rows and never touches the
+food log itself.
+"""
+from datetime import date, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+
+from nutrients.models import Nutrient
+from .models import DailyGoalProgress, DailyNutrientRollup
+from .summary import MACRO_CODES
+
+
+GOAL_MACROS = tuple(MACRO_CODES)
+ROLLING_WINDOWS = (7, 30)
+MACRO_BY_CODE = {code: macro for macro, code in MACRO_CODES.items()}
+
+
+def is_on_target(calories, target_calories):
+    return bool(target_calories) and abs(calories - target_calories) <= target_calories * settings.GOAL_CALORIE_TOLERANCE
+
+
+def _progress_objects(rollups):
+    target_fields = [f'user__profile__target_{macro}' for macro in GOAL_MACROS]
+    rows = (
+        rollups
+        .filter(nutrient__code__in=MACRO_BY_CODE)
+        .order_by('user_id', 'date', 'nutrient_id')
+        .values_list('user_id', 'date', 'nutrient__code', 'amount', *target_fields)
+    )
+    for (user_id, day), group in groupby(rows.iterator(chunk_size=2000), key=itemgetter(0, 1)):
+        macros = dict.fromkeys(GOAL_MACROS, 0)
+        for row in group:
+            macros[MACRO_BY_CODE[row[2]]] += row[3]
+        targets = dict(zip(GOAL_MACROS, row[4:]))
+        yield DailyGoalProgress(
+            user_id=user_id, date=day, **macros,
+            **{f'target_{macro}': target for macro, target in targets.items()},
+            on_target=is_on_target(macros['calories'], targets['calories']),
+        )
+
+
+def _store(rollups):
+    DailyGoalProgress.objects.bulk_create(_progress_objects(rollups), batch_size=1000)
+
+
+def refresh_goal_progress(days_by_user, nutrient_ids=None):
+    """
+    Recompute the progress rows of `{user_id: dates}`; dates None means all of
+    the user's days. Skipped when `nutrient_ids` are given and none of them is
+    a macro.
+    """
+    if nutrient_ids is not None and not Nutrient.objects.filter(pk__in=nutrient_ids, code__in=MACRO_BY_CODE).exists():
+        return
+    with transaction.atomic():
+        for user_id, days in days_by_user.items():
+            stale = DailyGoalProgress.objects.filter(user_id=user_id)
+            rollups = DailyNutrientRollup.objects.filter(user_id=user_id)
+            if days is not None:
+                stale = stale.filter(date__in=days)
+                rollups = rollups.filter(date__in=days)
+            stale.delete()
+            _store(rollups)
+
+
+def rebuild_goal_progress(user_ids=None):
+    with transaction.atomic():
+        if user_ids is None:
+            DailyGoalProgress.objects.all().delete()
+            _store(DailyNutrientRollup.objects.all())
+        else:
+            DailyGoalProgress.objects.filter(user_id__in=user_ids).delete()
+            _store(DailyNutrientRollup.objects.filter(user_id__in=user_ids))
+
+
+def _macros(row, prefix=''):
+    return {macro: getattr(row, prefix + macro) for macro in GOAL_MACROS}
+
+
+def _adherence(eaten, targets):
+    return {
+        macro: round(eaten[macro] / targets[macro] * 100, 1) if targets[macro] else None
+        for macro in GOAL_MACROS
+    }
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def _earlier_streak(user, before):
+    """On-target days in a row ending the day before `before`."""
+    streak = 0
+    expected = before - timedelta(days=1)
+    rows = (
+        DailyGoalProgress.objects.filter(user=user, date__lt=before)
+        .order_by('-date').values_list('date', 'on_target')
+    )
+    for day, on_target in rows.iterator(chunk_size=100):
+        if day != expected or not on_target:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak
+
+
+def goal_progress(user, date_from, date_to):
+    """
+    Per-day adherence, streaks and rolling averages for `user` between two
+    dates (inclusive). Averages are taken over the days something was logged;
+    a day without a log breaks a streak.
+    """
+    window_start = date_from - timedelta(days=max(ROLLING_WINDOWS) - 1)
+    rows = {
+        row.date: row
+        for row in DailyGoalProgress.objects.filter(user=user, date__gte=window_start, date__lte=date_to)
+    }
+
+    # Prefix sums over calendar days, for the rolling windows.
+    totals = {macro: [0.0] for macro in GOAL_MACROS}
+    logged = [0]
+    day = window_start
+    while day <= date_to:
+        row = rows.get(day)
+        for macro in GOAL_MACROS:
+            totals[macro].append(totals[macro][-1] + (getattr(row, macro) if row else 0))
+        logged.append(logged[-1] + (1 if row else 0))
+        day += timedelta(days=1)
+
+    def rolling(index, size):
+        count = logged[index + 1] - logged[max(0, index + 1 - size)]
+        if not count:
+            return None
+        return {
+            macro: round((totals[macro][index + 1] - totals[macro][max(0, index + 1 - size)]) / count, 1)
+            for macro in GOAL_MACROS
+        }
+
+    days = []
+    streak = longest = 0
+    day = date_from
+    while day <= date_to:
+        index = (day - window_start).days
+        row = rows.get(day)
+        eaten = _macros(row) if row else None
+        targets = _macros(row, 'target_') if row else None
+        on_target = bool(row and row.on_target)
+        streak = streak + 1 if on_target else 0
+        longest = max(longest, streak)
+        days.append({
+            'date': day,
+            'logged': row is not None,
+            'eaten': eaten,
+            'targets': targets,
+            'adherence': _adherence(eaten, targets) if row else None,
+            'on_target': on_target,
+            **{f'rolling_{size}': rolling(index, size) for size in ROLLING_WINDOWS},
+        })
+        day += timedelta(days=1)
+
+    # Today may simply not be logged yet; the streak then runs up to yesterday.
+    ending = days[:-1] if date_to == date.today() and not days[-1]['logged'] else days
+    current = 0
+    for entry in reversed(ending):
+        if not entry['on_target']:
+            break
+        current += 1
+    else:
+        current += _earlier_streak(user, date_from)
+
+    logged_days = [entry for entry in days if entry['logged']]
+    return {
+        'start': date_from,
+        'end': date_to,
+        'tolerance': settings.GOAL_CALORIE_TOLERANCE,
+        'summary': {
+            'days_logged': len(logged_days),
+            'days_on_target': sum(entry['on_target'] for entry in logged_days),
+            'current_streak': current,
+            'longest_streak': max(longest, current),
+            'average': {macro: _mean(entry['eaten'][macro] for entry in logged_days) for macro in GOAL_MACROS}
+            if logged_days else None,
+            'adherence': {macro: _mean(entry['adherence'][macro] for entry in logged_days) for macro in GOAL_MACROS}
+            if logged_days else None,
+        },
+        'days': days,
+    }
@@ -0,0 +1,88 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from users.models import CustomUser
+from .models import DailyEntry, DailyNutrientRollup
+from .progress import rebuild_goal_progress, refresh_goal_progress
+
+
+def _rollup_rows(entries, nutrient_ids=None):
+    filters = {'meal__totals__isnull': False}
+    if nutrient_ids is not None:
+        filters['meal__totals__nutrient_id__in'] = nutrient_ids
+    return (
+        entries
+        .filter(**filters)
+        .values('user_id', 'date', 'meal__totals__nutrient_id')
+        .annotate(amount=Sum(F('meal__totals__amount') * F('servings')))
+        .order_by()
+        .values_list('user_id', 'date', 'meal__totals__nutrient_id', 'amount')
+    )
+
+
+def _store(rows):
+    DailyNutrientRollup.objects.bulk_create(
+        (DailyNutrientRollup(user_id=user_id, date=day, nutrient_id=nutrient_id, amount=amount)
+         for user_id, day, nutrient_id, amount in rows.iterator(chunk_size=2000)),
+        batch_size=1000,
+    )
+
+
+def _group_days(user_days):
+    days_by_user = defaultdict(set)
+    for user_id, day in user_days:
+        days_by_user[user_id].add(day)
+    return days_by_user
+
+
+def _refresh(days_by_user, nutrient_ids=None):
+    for user_id, days in days_by_user.items():
+        stale = DailyNutrientRollup.objects.filter(user_id=user_id, date__in=days)
+        if nutrient_ids is not None:
+            stale = stale.filter(nutrient_id__in=nutrient_ids)
+        stale.delete()
+        _store(_rollup_rows(DailyEntry.objects.filter(user_id=user_id, date__in=days), nutrient_ids))
+
+
+def refresh_daily_rollups(user_days):
+    """Recompute the rollup rows of the given (user_id, date) pairs from their DailyEntry rows."""
+    days_by_user = _group_days(user_days)
+    with transaction.atomic():
+        _refresh(days_by_user)
+        refresh_goal_progress(days_by_user)
+
+
+def refresh_rollups_for_meals(meal_ids, nutrient_ids=None):
+    """
+    Recompute the rollups of every (user, date) that logged one of `meal_ids`,
+    after those meals' nutrient totals changed. The affected pairs are read
+    through the DailyEntry meal index first, so the cost follows how often the
+    meals were logged, not the size of the rollup table.
+    """
+    with transaction.atomic():
+        days_by_user = _group_days(
+            DailyEntry.objects.filter(meal_id__in=meal_ids).order_by().values_list('user_id', 'date').distinct()
+        )
+        _refresh(days_by_user, nutrient_ids)
+        refresh_goal_progress(days_by_user, nutrient_ids)
+
+
+def rebuild_daily_rollups(batch_size=500):
+    """Rebuild the whole DailyNutrientRollup table (and the goal progress), one batch of users at a time."""
+    rebuilt = 0
+    last_pk = 0
+    with transaction.atomic():
+        DailyNutrientRollup.objects.all().delete()
+        while True:
+            batch = list(
+                CustomUser.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            _store(_rollup_rows(DailyEntry.objects.filter(user_id__in=batch)))
+            rebuilt += len(batch)
+            last_pk = batch[-1]
+        rebuild_goal_progress()
+    return rebuilt
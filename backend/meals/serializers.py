@@ -1,10 +1,18 @@
+from django.db import models, transaction
 from rest_framework import serializers
-from .models import Meal, MealIngredient, DailyEntry
+from core.metrics import TimedDataMixin, TimedListSerializer
+from core.serializers import SparseFieldsMixin
+from core.versioning import bump_table_versions, request_table_versions
+from .models import Meal, MealIngredient, DailyEntry, ingredient_vectors
+from .summary import macro_totals
+from .totals import deferred_totals_refresh, refresh_meal_totals
+from nutrients.matrix import MATRIX_TABLES
 from nutrients.models import Ingredient
 from nutrients.serializers import IngredientSerializer
+from nutrients.vectors import nutrient_registry
 
 
-class MealIngredientSerializer(serializers.ModelSerializer):
+class MealIngredientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     ingredient = IngredientSerializer(read_only=True)
     ingredient_id = serializers.PrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
@@ -15,42 +23,140 @@ class MealIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = MealIngredient
         fields = ['ingredient', 'ingredient_id', 'amount_in_grams']
+        compact_fields = ['ingredient', 'amount_in_grams']
+        list_serializer_class = TimedListSerializer
 
 
-class MealSerializer(serializers.ModelSerializer):
+def prime_meal_vectors(context, meals):
+    """
+    Compute the nutrient vectors of all given meals from their ingredients
+    with the in-memory nutrient matrix (one product for all of them) and cache
+    them in the (shared) serializer context, so nested MealSerializers don't
+    query per meal. Prefetched `meal_ingredients` are read from memory, the
+    rest in one query.
+    """
+    vectors = context.setdefault('meal_vectors', {})
+    pending = {meal.pk: meal for meal in meals if meal.pk not in vectors}
+    if not pending:
+        return vectors
+    rows, missing = [], []
+    for meal in pending.values():
+        if 'meal_ingredients' in getattr(meal, '_prefetched_objects_cache', {}):
+            rows.extend((meal.pk, row.ingredient_id, row.amount_in_grams) for row in meal.meal_ingredients.all())
+        else:
+            missing.append(meal.pk)
+    if missing:
+        rows.extend(
+            MealIngredient.objects.filter(meal_id__in=missing).order_by()
+            .values_list('meal_id', 'ingredient_id', 'amount_in_grams')
+        )
+    request = context.get('request')
+    versions = request_table_versions(request, MATRIX_TABLES) if request is not None else None
+    computed = ingredient_vectors(rows, versions)
+    for pk in pending:
+        vectors[pk] = computed.get(pk, nutrient_registry.zeros())
+    return vectors
+
+
+class MealListSerializer(TimedDataMixin, serializers.ListSerializer):
+    def to_representation(self, data):
+        meals = list(data.all() if isinstance(data, models.Manager) else data)
+        if self.child.needs_totals():
+            prime_meal_vectors(self.context, meals)
+        return super().to_representation(meals)
+
+
+class MealSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     meal_ingredients = MealIngredientSerializer(many=True)
     total_nutrients = serializers.SerializerMethodField()
+    calories = serializers.SerializerMethodField()
 
     class Meta:
         model = Meal
-        fields = ['id', 'name', 'description', 'meal_ingredients', 'total_nutrients']
+        fields = ['id', 'name', 'description', 'meal_ingredients', 'total_nutrients', 'calories']
+        compact_fields = ['id', 'name', 'calories']
+        list_serializer_class = MealListSerializer
+
+    def needs_totals(self):
+        return 'total_nutrients' in self.fields or 'calories' in self.fields
+
+    def related_prefetches(self, prefix):
+        return [f'{prefix}meal_ingredients'] if self.needs_totals() else []
 
     def get_total_nutrients(self, obj):
-        return obj.total_nutrients()
+        return nutrient_registry.as_dict(prime_meal_vectors(self.context, [obj])[obj.pk])
+
+    def get_calories(self, obj):
+        return macro_totals(prime_meal_vectors(self.context, [obj])[obj.pk])['calories']
+
+    def validate_meal_ingredients(self, value):
+        ingredient_ids = [item['ingredient'].pk for item in value]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError('Each ingredient can only be listed once per meal.')
+        return value
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('meal_ingredients')
-        meal = Meal.objects.create(**validated_data)
-        for ingredient_data in ingredients_data:
-            MealIngredient.objects.create(meal=meal, **ingredient_data)
+        with transaction.atomic():
+            meal = Meal.objects.create(**validated_data)
+            MealIngredient.objects.bulk_create(
+                MealIngredient(meal=meal, **ingredient_data) for ingredient_data in ingredients_data
+            )
+            refresh_meal_totals([meal.pk])
+            bump_table_versions(MealIngredient)
         return meal
 
     def update(self, instance, validated_data):
+        """
+        Apply the submitted ingredient list as a diff keyed by ingredient:
+        changed amounts are bulk-updated in place, new ingredients bulk-created
+        and dropped ones removed with a single filtered delete, so untouched
+        rows keep their primary keys.
+        """
         ingredients_data = validated_data.pop('meal_ingredients')
         instance.name = validated_data.get('name', instance.name)
         instance.description = validated_data.get('description', instance.description)
-        instance.save()
+        wanted = {item['ingredient'].pk: item for item in ingredients_data}
 
-        instance.meal_ingredients.all().delete()
+        with transaction.atomic(), deferred_totals_refresh():
+            instance.save()
+            existing = {row.ingredient_id: row for row in instance.meal_ingredients.all()}
 
-        for ingredient_data in ingredients_data:
-            MealIngredient.objects.create(meal=instance, **ingredient_data)
+            changed = []
+            for ingredient_id, row in existing.items():
+                if ingredient_id in wanted and row.amount_in_grams != wanted[ingredient_id]['amount_in_grams']:
+                    row.amount_in_grams = wanted[ingredient_id]['amount_in_grams']
+                    changed.append(row)
+            added = [
+                MealIngredient(meal=instance, **item)
+                for ingredient_id, item in wanted.items() if ingredient_id not in existing
+            ]
+            removed = existing.keys() - wanted.keys()
+
+            if removed:
+                instance.meal_ingredients.filter(ingredient_id__in=removed).delete()
+            if changed:
+                MealIngredient.objects.bulk_update(changed, ['amount_in_grams'])
+            if added:
+                MealIngredient.objects.bulk_create(added)
+            if changed or added:
+                refresh_meal_totals([instance.pk])
+                bump_table_versions(MealIngredient)
 
         return instance
 
 
-class DailyEntrySerializer(serializers.ModelSerializer):
+class DailyEntryListSerializer(TimedDataMixin, serializers.ListSerializer):
+    def to_representation(self, data):
+        entries = list(data.all() if isinstance(data, models.Manager) else data)
+        if self.child.needs_totals():
+            prime_meal_vectors(self.context, [entry.meal for entry in entries])
+        return super().to_representation(entries)
+
+
+class DailyEntrySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     meal = MealSerializer(read_only=True)
+    scaled_nutrients = serializers.SerializerMethodField()
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     meal_id = serializers.PrimaryKeyRelatedField(
@@ -61,5 +167,108 @@ class DailyEntrySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = DailyEntry
-        fields = ['id', 'user', 'meal', 'meal_id', 'date', 'servings']
+        fields = ['id', 'user', 'meal', 'meal_id', 'date', 'servings', 'scaled_nutrients']
         read_only_fields = ['user', 'meal']
+        compact_fields = ['id', 'meal', 'date', 'servings']
+        list_serializer_class = DailyEntryListSerializer
+
+    def needs_totals(self):
+        meal = self.fields.get('meal')
+        return 'scaled_nutrients' in self.fields or (meal is not None and meal.needs_totals())
+
+    def related_prefetches(self, prefix):
+        return [f'{prefix}meal__meal_ingredients'] if self.needs_totals() else []
+
+    def get_scaled_nutrients(self, obj):
+        return obj.scaled_nutrients(prime_meal_vectors(self.context, [obj.meal])[obj.meal_id])
+
+
+class NutrientAmountSerializer(serializers.Serializer):
+    amount = serializers.FloatField()
+    unit = serializers.CharField()
+    code = serializers.CharField(allow_blank=True, help_text="Canonical nutrient code, '' when the nutrient has none")
+
+
+class MacroSerializer(serializers.Serializer):
+    calories = serializers.FloatField()
+    protein = serializers.FloatField()
+    carbs = serializers.FloatField()
+    fat = serializers.FloatField()
+
+
+class DailySummarySerializer(TimedDataMixin, serializers.Serializer):
+    date = serializers.DateField()
+    nutrients = serializers.DictField(child=NutrientAmountSerializer())
+    macros = MacroSerializer()
+    targets = MacroSerializer(allow_null=True)
+
+
+class NutrientPeriodSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    nutrients = serializers.DictField(child=NutrientAmountSerializer())
+    macros = MacroSerializer()
+
+
+class NutrientHistorySerializer(TimedDataMixin, serializers.Serializer):
+    granularity = serializers.ChoiceField(choices=['day', 'week', 'month'])
+    start = serializers.DateField()
+    end = serializers.DateField()
+    periods = NutrientPeriodSerializer(many=True)
+
+
+class NullableMacroSerializer(serializers.Serializer):
+    calories = serializers.FloatField(allow_null=True)
+    protein = serializers.FloatField(allow_null=True)
+    carbs = serializers.FloatField(allow_null=True)
+    fat = serializers.FloatField(allow_null=True)
+
+
+class GoalDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    logged = serializers.BooleanField()
+    eaten = MacroSerializer(allow_null=True)
+    targets = NullableMacroSerializer(allow_null=True)
+    adherence = NullableMacroSerializer(allow_null=True, help_text='Eaten as a percentage of the target')
+    on_target = serializers.BooleanField()
+    rolling_7 = MacroSerializer(allow_null=True, help_text='Average over the logged days of the last 7 days')
+    rolling_30 = MacroSerializer(allow_null=True, help_text='Average over the logged days of the last 30 days')
+
+
+class GoalSummarySerializer(serializers.Serializer):
+    days_logged = serializers.IntegerField()
+    days_on_target = serializers.IntegerField()
+    current_streak = serializers.IntegerField()
+    longest_streak = serializers.IntegerField()
+    average = NullableMacroSerializer(allow_null=True)
+    adherence = NullableMacroSerializer(allow_null=True)
+
+
+class GoalProgressSerializer(TimedDataMixin, serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    tolerance = serializers.FloatField()
+    summary = GoalSummarySerializer()
+    days = GoalDaySerializer(many=True)
+
+
+class PlannedMealSerializer(serializers.Serializer):
+    meal_id = serializers.IntegerField()
+    name = serializers.CharField()
+    servings = serializers.FloatField()
+    macros = MacroSerializer()
+
+
+class MealPlanSuggestionSerializer(serializers.Serializer):
+    meals = PlannedMealSerializer(many=True)
+    macros = MacroSerializer()
+    remaining = MacroSerializer(help_text='Budget left after the suggestion; negative when it is exceeded')
+    error = serializers.FloatField(help_text='Sum of the squared deviations from the budget, each relative to '
+                                             'its daily target; 0 is a perfect fit')
+
+
+class MealPlanSerializer(TimedDataMixin, serializers.Serializer):
+    date = serializers.DateField()
+    targets = MacroSerializer()
+    eaten = MacroSerializer()
+    budget = MacroSerializer()
+    suggestions = MealPlanSuggestionSerializer(many=True)
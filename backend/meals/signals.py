@@ -0,0 +1,93 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from nutrients.models import IngredientNutrient
+from nutrients.signals import ingredient_nutrients_bulk_changed
+from users.models import UserProfile
+from users.signals import profile_targets_changed
+from .jobs import refresh_ingredient_totals
+from .models import DailyEntry, MealIngredient
+from .progress import refresh_goal_progress
+from .rollups import refresh_daily_rollups
+from .totals import refresh_meal_totals
+
+
+def _remember_previous(sender, instance, fields):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(pre_save, sender=MealIngredient)
+def remember_meal_ingredient(sender, instance, **kwargs):
+    _remember_previous(sender, instance, ['meal_id'])
+
+
+@receiver(post_save, sender=MealIngredient)
+def refresh_totals_on_meal_ingredient_save(sender, instance, **kwargs):
+    meal_ids = {instance.meal_id}
+    if getattr(instance, '_previous', None):
+        meal_ids.add(instance._previous['meal_id'])
+    refresh_meal_totals(meal_ids)
+
+
+@receiver(post_delete, sender=MealIngredient)
+def refresh_totals_on_meal_ingredient_delete(sender, instance, **kwargs):
+    refresh_meal_totals([instance.meal_id])
+
+
+@receiver(pre_save, sender=IngredientNutrient)
+def remember_ingredient_nutrient(sender, instance, **kwargs):
+    _remember_previous(sender, instance, ['ingredient_id', 'nutrient_id'])
+
+
+@receiver(post_save, sender=IngredientNutrient)
+def refresh_totals_on_ingredient_nutrient_save(sender, instance, **kwargs):
+    ingredient_ids = {instance.ingredient_id}
+    nutrient_ids = {instance.nutrient_id}
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        ingredient_ids.add(previous['ingredient_id'])
+        nutrient_ids.add(previous['nutrient_id'])
+    refresh_ingredient_totals.enqueue(ingredient_ids=sorted(ingredient_ids), nutrient_ids=sorted(nutrient_ids))
+
+
+@receiver(post_delete, sender=IngredientNutrient)
+def refresh_totals_on_ingredient_nutrient_delete(sender, instance, **kwargs):
+    refresh_ingredient_totals.enqueue(ingredient_ids=[instance.ingredient_id], nutrient_ids=[instance.nutrient_id])
+
+
+@receiver(ingredient_nutrients_bulk_changed)
+def refresh_totals_on_ingredient_nutrient_bulk_change(sender, ingredient_ids, **kwargs):
+    if ingredient_ids:
+        refresh_ingredient_totals.enqueue(ingredient_ids=sorted(ingredient_ids))
+
+
+@receiver(pre_save, sender=DailyEntry)
+def remember_daily_entry(sender, instance, **kwargs):
+    _remember_previous(sender, instance, ['user_id', 'date'])
+
+
+@receiver(post_save, sender=DailyEntry)
+def refresh_rollups_on_daily_entry_save(sender, instance, **kwargs):
+    user_days = {(instance.user_id, instance.date)}
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        user_days.add((previous['user_id'], previous['date']))
+    refresh_daily_rollups(user_days)
+
+
+@receiver(post_delete, sender=DailyEntry)
+def refresh_rollups_on_daily_entry_delete(sender, instance, **kwargs):
+    refresh_daily_rollups([(instance.user_id, instance.date)])
+
+
+@receiver(profile_targets_changed)
+def refresh_goal_progress_on_target_change(sender, profile, **kwargs):
+    refresh_goal_progress({profile.user_id: None})
+
+
+@receiver(post_save, sender=UserProfile)
+def refresh_goal_progress_on_profile_create(sender, instance, created, **kwargs):
+    if created:
+        refresh_goal_progress({instance.user_id: None})
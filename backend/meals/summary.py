@@ -0,0 +1,70 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from nutrients.vectors import nutrient_registry
+from .models import DailyNutrientRollup
+
+
+GRANULARITY_TRUNC = {
+    'day': F,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+# Canonical nutrient codes (nutrients.codes) of the dashboard macros.
+MACRO_CODES = {
+    'calories': 'energy',
+    'protein': 'protein',
+    'carbs': 'carbohydrate',
+    'fat': 'fat',
+}
+
+
+def daily_nutrient_vector(user, day):
+    """Nutrient vector (meal totals x servings) of everything `user` logged on `day`."""
+    rows = (
+        DailyNutrientRollup.objects
+        .filter(user=user, date=day)
+        .values_list('nutrient__name', 'nutrient__unit', 'nutrient__code', 'amount')
+    )
+    return nutrient_registry.vector(rows)
+
+
+def nutrient_history(user, date_from, date_to, granularity='day'):
+    """
+    Per-period nutrient vectors for `user` between two dates (inclusive), summed
+    from the daily rollups. Returns [(period_start, vector), ...].
+    """
+    rows = (
+        DailyNutrientRollup.objects
+        .filter(user=user, date__gte=date_from, date__lte=date_to)
+        .annotate(period=GRANULARITY_TRUNC[granularity]('date'))
+        .values('period', 'nutrient_id', 'nutrient__name', 'nutrient__unit', 'nutrient__code')
+        .annotate(total=Sum('amount'))
+        .order_by('period', 'nutrient_id')
+        .values_list('period', 'nutrient__name', 'nutrient__unit', 'nutrient__code', 'total')
+    )
+    return [
+        (period_start, nutrient_registry.vector(row[1:] for row in group))
+        for period_start, group in groupby(rows, key=itemgetter(0))
+    ]
+
+
+def macro_totals(vector):
+    return {macro: nutrient_registry.amount(vector, code) for macro, code in MACRO_CODES.items()}
+
+
+def profile_targets(user):
+    profile = getattr(user, 'profile', None)
+    if profile is None:
+        return None
+    return {
+        'calories': profile.target_calories,
+        'protein': profile.target_protein,
+        'carbs': profile.target_carbs,
+        'fat': profile.target_fat,
+    }
@@ -1,11 +1,29 @@
+import csv
 import datetime
-from django.test import TestCase
+import json
+import tempfile
+import numpy as np
+from io import StringIO
+from pathlib import Path
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import connection
+from unittest import skipUnless
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Meal, MealIngredient, DailyEntry
+from core.jobs import Worker
+from core.models import Job
+from .export import parquet_available
+from .models import Meal, MealIngredient, MealNutrientTotal, DailyEntry, DailyNutrientRollup, DailyGoalProgress
+from nutrients.matrix import nutrient_matrix
 from nutrients.models import Nutrient, Ingredient, IngredientNutrient
+from nutrients.signals import ingredient_nutrients_bulk_changed
+from users.models import UserProfile
 
 User = get_user_model()
 
@@ -57,6 +75,8 @@ class MealsAppTests(TestCase):
 
         self.client = APIClient()
 
+    def run_jobs(self):
+        return Worker().run_pending()
     
     def test_meal_str_method(self):
         self.assertEqual(str(self.meal), 'Basic Chicken')
@@ -77,7 +97,82 @@ class MealsAppTests(TestCase):
         self.assertAlmostEqual(nutrients['Fat']['amount'], 10.0)
         self.assertEqual(nutrients['Fat']['unit'], 'g')
         
-        self.assertNotIn('Carbs', nutrients)
+        self.assertNotIn('Carbohydrates', nutrients)
+
+    def test_meal_queryset_nutrient_totals_batch(self):
+        empty_meal = Meal.objects.create(name='Empty')
+        totals = Meal.objects.all().nutrient_totals()
+
+        self.assertAlmostEqual(totals[self.meal.pk]['Protein']['amount'], 45.0)
+        self.assertAlmostEqual(totals[self.meal.pk]['Fat']['amount'], 10.0)
+        self.assertNotIn(empty_meal.pk, totals)
+
+    def test_meal_totals_follow_ingredient_nutrient_changes(self):
+        link = IngredientNutrient.objects.get(ingredient=self.chicken, nutrient=self.protein)
+        link.amount_per_100g = 20.0
+        link.save()
+        self.run_jobs()
+        self.assertAlmostEqual(self.meal.total_nutrients()['Protein']['amount'], 30.0)
+
+        IngredientNutrient.objects.create(ingredient=self.chicken, nutrient=self.carbs, amount_per_100g=2.0)
+        self.run_jobs()
+        self.assertAlmostEqual(self.meal.total_nutrients()['Carbohydrates']['amount'], 3.0)
+
+        link.delete()
+        self.run_jobs()
+        self.assertNotIn('Protein', self.meal.total_nutrients())
+
+    def test_meal_totals_follow_meal_ingredient_changes(self):
+        meal_ingredient = MealIngredient.objects.get(meal=self.meal, ingredient=self.oil)
+        meal_ingredient.amount_in_grams = 20.0
+        meal_ingredient.save()
+        self.assertAlmostEqual(self.meal.total_nutrients()['Fat']['amount'], 20.0)
+
+        meal_ingredient.delete()
+        self.assertNotIn('Fat', self.meal.total_nutrients())
+
+    def test_meal_totals_follow_bulk_ingredient_nutrient_changes(self):
+        IngredientNutrient.objects.filter(ingredient=self.chicken).update(amount_per_100g=10.0)
+        ingredient_nutrients_bulk_changed.send(sender=IngredientNutrient, ingredient_ids={self.chicken.pk})
+        self.assertAlmostEqual(self.meal.total_nutrients()['Protein']['amount'], 45.0)
+        self.run_jobs()
+        self.assertAlmostEqual(self.meal.total_nutrients()['Protein']['amount'], 15.0)
+
+    def test_ingredient_nutrient_changes_queue_one_refresh(self):
+        self.run_jobs()
+        for amount in (10.0, 20.0):
+            IngredientNutrient.objects.filter(ingredient=self.chicken).update(amount_per_100g=amount)
+            ingredient_nutrients_bulk_changed.send(sender=IngredientNutrient, ingredient_ids={self.chicken.pk})
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+        call_command('run_worker', once=True, stdout=StringIO())
+        self.assertFalse(Job.objects.exists())
+        self.assertAlmostEqual(self.meal.total_nutrients()['Protein']['amount'], 30.0)
+        self.assertAlmostEqual(DailyNutrientRollup.objects.get(user=self.user, nutrient=self.protein).amount, 30.0)
+
+    def test_rebuild_meal_totals_command(self):
+        MealNutrientTotal.objects.all().delete()
+        self.assertEqual(self.meal.total_nutrients(), {})
+
+        call_command('rebuild_meal_totals', stdout=StringIO())
+
+        self.assertAlmostEqual(self.meal.total_nutrients()['Protein']['amount'], 45.0)
+        self.assertEqual(MealNutrientTotal.objects.filter(meal=self.meal).count(), 2)
+
+    def test_meal_list_query_count_is_constant(self):
+        for i in range(5):
+            meal = Meal.objects.create(name=f'Meal {i}')
+            MealIngredient.objects.create(meal=meal, ingredient=self.chicken, amount_in_grams=100.0)
+            MealIngredient.objects.create(meal=meal, ingredient=self.oil, amount_in_grams=5.0)
+
+        # Table versions, meals, their ingredient rows and ingredients; totals
+        # come from the loaded nutrient matrix.
+        nutrient_matrix.sync()
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/meals/')
+
+        self.assertEqual(len(response.data), 6)
+        self.assertAlmostEqual(response.data[-1]['total_nutrients']['Protein']['amount'], 30.0)
 
 
     def test_get_meal_list_unauthenticated(self):
@@ -140,6 +235,44 @@ class MealsAppTests(TestCase):
         self.assertEqual(self.meal.name, 'Updated Meal Name')
         self.assertAlmostEqual(self.meal.total_nutrients()['Protein']['amount'], 60.0)
 
+    def test_update_meal_applies_ingredient_diff(self):
+        self.client.force_authenticate(user=self.user)
+        chicken_row = MealIngredient.objects.get(meal=self.meal, ingredient=self.chicken)
+        rice = Ingredient.objects.create(name='Rice')
+        IngredientNutrient.objects.create(ingredient=rice, nutrient=self.carbs, amount_per_100g=80.0)
+
+        updated_data = {
+            "name": self.meal.name,
+            "meal_ingredients": [
+                {"ingredient_id": self.chicken.pk, "amount_in_grams": 100},
+                {"ingredient_id": rice.pk, "amount_in_grams": 50},
+            ]
+        }
+        response = self.client.put(f'/api/meals/{self.meal.pk}/', updated_data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row.ingredient_id: row for row in MealIngredient.objects.filter(meal=self.meal)}
+        self.assertEqual(set(rows), {self.chicken.pk, rice.pk})
+        self.assertEqual(rows[self.chicken.pk].pk, chicken_row.pk)
+        self.assertEqual(rows[self.chicken.pk].amount_in_grams, 100)
+        totals = self.meal.total_nutrients()
+        self.assertAlmostEqual(totals['Protein']['amount'], 30.0)
+        self.assertAlmostEqual(totals['Carbohydrates']['amount'], 40.0)
+        self.assertNotIn('Fat', totals)
+
+    def test_meal_rejects_duplicate_ingredients(self):
+        self.client.force_authenticate(user=self.user)
+        data = {
+            "name": "Double chicken",
+            "meal_ingredients": [
+                {"ingredient_id": self.chicken.pk, "amount_in_grams": 100},
+                {"ingredient_id": self.chicken.pk, "amount_in_grams": 50},
+            ]
+        }
+        response = self.client.post('/api/meals/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('meal_ingredients', response.data)
+
     def test_delete_meal(self):
         self.client.force_authenticate(user=self.user)
         
@@ -197,4 +330,427 @@ class MealsAppTests(TestCase):
         response = self.client.delete(f'/api/daily-entries/{self.entry.pk}/')
         
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(DailyEntry.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(DailyEntry.objects.count(), 0)
+
+    def test_daily_summary_unauthenticated(self):
+        response = self.client.get('/api/daily-entries/summary/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_daily_summary_scales_by_servings(self):
+        DailyEntry.objects.create(user=self.user, meal=self.meal, date=self.today, servings=0.5)
+        DailyEntry.objects.create(user=self.other_user, meal=self.meal, date=self.today, servings=3.0)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/daily-entries/summary/?date={self.today}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAlmostEqual(response.data['nutrients']['Protein']['amount'], 67.5)
+        self.assertEqual(response.data['nutrients']['Protein']['unit'], 'g')
+        self.assertAlmostEqual(response.data['macros']['fat'], 15.0)
+        self.assertEqual(response.data['macros']['carbs'], 0)
+        self.assertIsNone(response.data['targets'])
+
+    def test_nutrients_with_the_same_code_are_one_total(self):
+        carbohydrates = Nutrient.objects.create(name='Carbohydrate, by difference', unit='g')
+        IngredientNutrient.objects.create(ingredient=self.chicken, nutrient=self.carbs, amount_per_100g=2.0)
+        IngredientNutrient.objects.create(ingredient=self.oil, nutrient=carbohydrates, amount_per_100g=10.0)
+        self.run_jobs()
+
+        totals = self.meal.total_nutrients()
+        self.assertEqual(totals['Carbohydrates'], {'amount': 4.0, 'unit': 'g', 'code': 'carbohydrate'})
+        self.assertEqual(set(totals), {'Protein', 'Carbohydrates', 'Fat'})
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/daily-entries/summary/?date={self.today}')
+        self.assertAlmostEqual(response.data['macros']['carbs'], 4.0)
+        self.assertEqual(response.data['nutrients']['Fat']['code'], 'fat')
+
+    def test_daily_summary_invalid_date(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/daily-entries/summary/?date=not-a-date')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_history_by_day_and_month(self):
+        day = datetime.date(2024, 1, 31)
+        DailyEntry.objects.create(user=self.user, meal=self.meal, date=day, servings=2.0)
+        DailyEntry.objects.create(user=self.user, meal=self.meal, date=day + datetime.timedelta(days=1))
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/daily-entries/history/?from=2024-01-01&to=2024-02-29')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['start'] for p in response.data['periods']], ['2024-01-31', '2024-02-01'])
+        self.assertAlmostEqual(response.data['periods'][0]['nutrients']['Protein']['amount'], 90.0)
+
+        response = self.client.get('/api/daily-entries/history/?from=2024-01-01&to=2024-02-29&granularity=month')
+        self.assertEqual([p['start'] for p in response.data['periods']], ['2024-01-01', '2024-02-01'])
+        self.assertAlmostEqual(response.data['periods'][1]['macros']['protein'], 45.0)
+
+    def test_history_rejects_invalid_parameters(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/daily-entries/history/?granularity=year')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('granularity', response.data)
+        response = self.client.get('/api/daily-entries/history/?from=2024-02-01&to=2024-01-01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('from', response.data)
+        response = self.client.get('/api/daily-entries/history/?to=2024-13-01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'to': ['Enter a valid date (YYYY-MM-DD).']})
+
+    def test_rollups_follow_entry_and_meal_changes(self):
+        protein = DailyNutrientRollup.objects.filter(user=self.user, date=self.today, nutrient=self.protein)
+        self.assertAlmostEqual(protein.get().amount, 45.0)
+
+        self.entry.servings = 2.0
+        self.entry.save()
+        self.assertAlmostEqual(protein.get().amount, 90.0)
+
+        # Days that never logged the changed meal are left alone.
+        shot = Meal.objects.create(name='Oil Shot')
+        MealIngredient.objects.create(meal=shot, ingredient=self.oil, amount_in_grams=5.0)
+        DailyEntry.objects.create(user=self.other_user, meal=shot, date=self.today)
+        untouched = DailyNutrientRollup.objects.get(user=self.other_user).pk
+
+        MealIngredient.objects.filter(meal=self.meal, ingredient=self.chicken).get().delete()
+        self.assertFalse(DailyNutrientRollup.objects.filter(user=self.user, nutrient=self.protein).exists())
+        self.assertEqual(DailyNutrientRollup.objects.get(user=self.other_user).pk, untouched)
+
+        self.entry.delete()
+        self.assertFalse(DailyNutrientRollup.objects.filter(user=self.user).exists())
+
+    def test_rebuild_daily_rollups_command(self):
+        DailyNutrientRollup.objects.all().delete()
+        call_command('rebuild_daily_rollups', stdout=StringIO())
+        rollup = DailyNutrientRollup.objects.get(user=self.user, date=self.today, nutrient=self.fat)
+        self.assertAlmostEqual(rollup.amount, 10.0)
+
+    def test_seed_and_run_benchmark_commands(self):
+        call_command('seed_benchmark', users=2, ingredients=30, nutrients=8, meals=10, days=3, stdout=StringIO())
+        bench_user = User.objects.filter(username__startswith='bench_').first()
+        self.assertTrue(DailyEntry.objects.filter(user=bench_user).exists())
+        self.assertTrue(DailyNutrientRollup.objects.filter(user=bench_user).exists())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'result.json'
+            call_command('run_benchmark', repeat=2, warmup=0, output=str(output), stdout=StringIO(), stderr=StringIO())
+            results = json.loads(output.read_text())['results']
+        self.assertEqual(results['GET meal_list']['status'], 200)
+        self.assertLessEqual(results['GET meal_list']['queries'], 10)
+
+    def test_daily_entries_sparse_fields(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/daily-entries/?fields=id,meal.name,meal.calories')
+        self.assertEqual(response.data[0], {'id': self.entry.pk, 'meal': {'name': 'Basic Chicken', 'calories': 0}})
+
+    def test_daily_entries_compact_view_and_expand(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/daily-entries/?view=compact')
+        self.assertEqual(set(response.data[0]), {'id', 'meal', 'date', 'servings'})
+        self.assertEqual(set(response.data[0]['meal']), {'id', 'name', 'calories'})
+
+        response = self.client.get('/api/daily-entries/?view=compact&expand=meal.meal_ingredients')
+        ingredients = response.data[0]['meal']['meal_ingredients']
+        self.assertEqual(ingredients[0]['ingredient'], {'id': self.chicken.pk, 'name': 'Chicken Breast', 'category': ''})
+        self.assertNotIn('total_nutrients', response.data[0]['meal'])
+
+    def test_omitted_relations_are_not_queried(self):
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/daily-entries/?fields=id,servings')
+        self.assertEqual(response.data, [{'id': self.entry.pk, 'servings': 1.0}])
+
+        # Table versions, meals and their ingredient rows; no ingredient or totals queries.
+        with self.assertNumQueries(3):
+            self.client.get('/api/meals/?fields=id,name,meal_ingredients.amount_in_grams')
+
+    def test_daily_entry_list_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.user)
+        # Entries (with meal), meal ingredients, ingredients and the matrix table versions.
+        nutrient_matrix.sync()
+        with self.assertNumQueries(4):
+            self.client.get('/api/daily-entries/')
+
+        for i in range(10):
+            meal = Meal.objects.create(name=f'Meal {i}')
+            MealIngredient.objects.create(meal=meal, ingredient=self.chicken, amount_in_grams=50.0 + i)
+            DailyEntry.objects.create(user=self.user, meal=meal, date=self.today, servings=2.0)
+
+        nutrient_matrix.sync()
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/daily-entries/')
+        self.assertEqual(len(response.data), 11)
+
+    def test_daily_entry_scaled_nutrients(self):
+        self.entry.servings = 2.0
+        self.entry.save()
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(f'/api/daily-entries/{self.entry.pk}/')
+        self.assertAlmostEqual(response.data['scaled_nutrients']['Protein']['amount'], 90.0)
+        self.assertAlmostEqual(response.data['meal']['total_nutrients']['Protein']['amount'], 45.0)
+
+        # Entries, their meals, the meals' ingredient rows and the matrix table
+        # versions; no ingredient or totals queries.
+        nutrient_matrix.sync()
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/daily-entries/?fields=id,scaled_nutrients')
+        self.assertAlmostEqual(response.data[0]['scaled_nutrients']['Fat']['amount'], 20.0)
+
+    def test_bulk_log_entries(self):
+        self.client.force_authenticate(user=self.user)
+        items = [
+            {'meal_id': self.meal.id, 'date': '2024-03-01', 'servings': 2},
+            {'meal_id': self.meal.id, 'date': '2024-03-02'},
+        ]
+        response = self.client.post('/api/daily-entries/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['status'] for r in response.data['results']], [201, 201])
+        self.assertEqual(DailyEntry.objects.filter(user=self.user, date__month=3).count(), 2)
+        rollup = DailyNutrientRollup.objects.get(user=self.user, date='2024-03-01', nutrient=self.protein)
+        self.assertAlmostEqual(rollup.amount, 90.0)
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/daily-entries/bulk/', items, format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/api/daily-entries/bulk/', items * 20, format='json')
+        self.assertEqual(len(large), len(small))
+
+    def test_bulk_atomic_batch_saves_nothing_on_error(self):
+        self.client.force_authenticate(user=self.user)
+        items = [{'meal_id': self.meal.id}, {'meal_id': 9999}, {'servings': 'x'}]
+        response = self.client.post('/api/daily-entries/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r['status'] for r in response.data['results']], [424, 400, 400])
+        self.assertIn('meal_id', response.data['results'][1]['errors'])
+        self.assertEqual(DailyEntry.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_partial_mode_saves_valid_items(self):
+        self.client.force_authenticate(user=self.user)
+        items = [{'meal_id': self.meal.id, 'ingredient_id': self.chicken.id, 'amount_in_grams': 10},
+                 {'meal_id': self.meal.id, 'ingredient_id': 9999, 'amount_in_grams': 10}]
+        new_meal = Meal.objects.create(name='Oil shot')
+        items.append({'meal_id': new_meal.id, 'ingredient_id': self.oil.id, 'amount_in_grams': 5})
+        items.append({'meal_id': new_meal.id, 'ingredient_id': self.oil.id, 'amount_in_grams': 6})
+
+        response = self.client.post('/api/meal_ingredients/bulk?mode=partial', items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in response.data['results']], [400, 400, 201, 400])
+        self.assertEqual(response.data['created'], 1)
+        self.assertAlmostEqual(new_meal.total_nutrients()['Fat']['amount'], 5.0)
+
+    def test_bulk_rejects_non_list_bodies(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/daily-entries/bulk/', {'meal_id': self.meal.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def export(self, query=''):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        response = await self.async_client.get(f'/api/daily-entries/export/{query}', headers={'Authorization': f'Bearer {token}'})
+        content = b''.join([block async for block in response.streaming_content]) if response.streaming else response.content
+        return response, content
+
+    async def test_export_streams_csv_with_scaled_nutrients(self):
+        await DailyEntry.objects.acreate(user=self.user, meal=self.meal, date=self.today, servings=2)
+        await DailyEntry.objects.acreate(user=self.other_user, meal=self.meal, date=self.today, servings=1)
+
+        response, content = await self.export()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.DictReader(content.decode().splitlines()))
+        self.assertEqual([row['servings'] for row in rows], ['1.0', '2.0'])
+        self.assertEqual({row['username'] for row in rows}, {'testuser'})
+        self.assertAlmostEqual(float(rows[1]['Protein (g)']), 90.0)
+        self.assertEqual(rows[0]['Carbohydrates (g)'], '0.0')
+
+    async def test_export_ndjson_date_range(self):
+        await DailyEntry.objects.acreate(user=self.user, meal=self.meal, date=self.today - datetime.timedelta(days=3))
+
+        response, content = await self.export(f'?output=ndjson&to={self.today - datetime.timedelta(days=1)}')
+        lines = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]['date'], str(self.today - datetime.timedelta(days=3)))
+        self.assertAlmostEqual(lines[0]['Fat (g)'], 10.0)
+
+    async def test_export_rejects_unknown_output(self):
+        response, _ = await self.export('?output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('output', response.json())
+
+    def test_export_command_chunks_all_users(self):
+        for servings in (1, 2, 3):
+            DailyEntry.objects.create(user=self.other_user, meal=self.meal, date=self.today, servings=servings)
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'log.csv'
+            # Nutrients, matrix table versions, entries and ingredient rows per chunk.
+            nutrient_matrix.sync()
+            with self.assertNumQueries(5):
+                call_command('export_food_log', output=str(output), chunk_size=2, stdout=StringIO())
+            rows = list(csv.DictReader(output.read_text().splitlines()))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual([row['username'] for row in rows], ['testuser'] + ['otheruser'] * 3)
+
+    @skipUnless(parquet_available(), 'pyarrow is not installed')
+    def test_export_command_writes_parquet(self):
+        import pyarrow.parquet as pq
+
+        DailyEntry.objects.create(user=self.user, meal=self.meal, date=self.today, servings=0.5)
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'log.parquet'
+            call_command('export_food_log', user='testuser', output_format='parquet', output=str(output),
+                         chunk_size=1, stdout=StringIO())
+            table = pq.read_table(output)
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.column('servings').to_pylist(), [1.0, 0.5])
+        self.assertAlmostEqual(table.column('Protein (g)').to_pylist()[1], 22.5)
+
+    def log_calories(self):
+        """300 kcal per serving of the test meal, a 300 kcal target, and entries for the last three days."""
+        calories = Nutrient.objects.create(name='Calories', unit='kcal')
+        IngredientNutrient.objects.create(ingredient=self.chicken, nutrient=calories, amount_per_100g=200.0)
+        self.run_jobs()
+        UserProfile.objects.create(
+            user=self.user, height=180, weight=80, gender='M', target_weight=80,
+            target_calories=300, target_protein=45, target_carbs=100, target_fat=10,
+        )
+        DailyEntry.objects.create(user=self.user, meal=self.meal, date=self.today - datetime.timedelta(days=1), servings=1)
+        DailyEntry.objects.create(user=self.user, meal=self.meal, date=self.today - datetime.timedelta(days=2), servings=2)
+        return calories
+
+    def goal_progress(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/goals/progress/?from={self.today - datetime.timedelta(days=6)}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_goal_progress_follows_the_food_log(self):
+        calories = self.log_calories()
+        progress = DailyGoalProgress.objects.get(user=self.user, date=self.today - datetime.timedelta(days=2))
+        self.assertAlmostEqual(progress.calories, 600.0)
+        self.assertFalse(progress.on_target)
+
+        data = self.goal_progress()
+        self.assertEqual(len(data['days']), 7)
+        today = data['days'][-1]
+        self.assertEqual(today['adherence']['calories'], 100.0)
+        self.assertEqual(today['adherence']['protein'], 100.0)
+        self.assertEqual(today['rolling_7']['calories'], 400.0)
+        self.assertFalse(data['days'][0]['logged'])
+        self.assertEqual(data['summary']['days_logged'], 3)
+        self.assertEqual(data['summary']['days_on_target'], 2)
+        self.assertEqual(data['summary']['current_streak'], 2)
+
+        IngredientNutrient.objects.filter(nutrient=calories).update(amount_per_100g=100.0)
+        ingredient_nutrients_bulk_changed.send(sender=IngredientNutrient, ingredient_ids=[self.chicken.id])
+        self.run_jobs()
+        self.assertEqual(self.goal_progress()['days'][-1]['eaten']['calories'], 150.0)
+
+    def test_goal_progress_is_recomputed_when_targets_change(self):
+        self.log_calories()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch('/api/auth/profile/update/', {'target_calories': 600}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = self.goal_progress()
+        self.assertEqual(data['days'][-3]['targets']['calories'], 600)
+        self.assertTrue(data['days'][-3]['on_target'])
+        self.assertEqual(data['summary']['current_streak'], 0)
+
+    def test_goal_progress_reads_one_row_per_day(self):
+        self.log_calories()
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/goals/progress/?from={self.today - datetime.timedelta(days=90)}')
+        self.assertEqual(len(response.data['days']), 91)
+
+    @override_settings(GOAL_PROGRESS_MAX_DAYS=7)
+    def test_goal_progress_rejects_invalid_ranges(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/goals/progress/?from={self.today - datetime.timedelta(days=7)}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('from', response.data)
+        response = self.client.get('/api/goals/progress/?to=soon')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('to', response.data)
+
+    def test_meal_plan_fills_the_remaining_budget(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            calories = Nutrient.objects.create(name='Calories', unit='kcal')
+            rice = Ingredient.objects.create(name='Rice')
+            IngredientNutrient.objects.create(ingredient=rice, nutrient=self.carbs, amount_per_100g=80.0)
+            IngredientNutrient.objects.create(ingredient=rice, nutrient=calories, amount_per_100g=350.0)
+            IngredientNutrient.objects.create(ingredient=self.chicken, nutrient=calories, amount_per_100g=150.0)
+            bowl = Meal.objects.create(name='Rice Bowl')
+            MealIngredient.objects.create(meal=bowl, ingredient=rice, amount_in_grams=100.0)
+            MealIngredient.objects.create(meal=bowl, ingredient=self.chicken, amount_in_grams=50.0)
+        UserProfile.objects.create(
+            user=self.user, height=180, weight=80, gender='M', target_weight=80,
+            target_calories=1500, target_protein=90, target_carbs=160, target_fat=30,
+        )
+        self.run_jobs()
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get('/api/meals/plan/?suggestions=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The logged chicken meal: 45 g protein, 10 g fat and 225 kcal.
+        self.assertEqual(response.data['budget'], {'calories': 1275.0, 'protein': 45.0, 'carbs': 160.0, 'fat': 20.0})
+        best = response.data['suggestions'][0]
+        # 2 rice bowls and 1 chicken meal: 160 g carbs, 75 g protein, 10 g fat, 1075 kcal.
+        self.assertEqual({(meal['name'], meal['servings']) for meal in best['meals']},
+                         {('Rice Bowl', 2.0), ('Basic Chicken', 1.0)})
+        self.assertAlmostEqual(best['remaining']['carbs'], 0.0)
+        self.assertAlmostEqual(best['macros']['calories'], 1075.0)
+        self.assertEqual(len(response.data['suggestions']), 2)
+        self.assertLessEqual(best['error'], response.data['suggestions'][1]['error'])
+
+        self.assertEqual(self.client.get('/api/meals/plan/?meals=9').status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.client.get('/api/meals/plan/').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_plan_meals_finds_exact_combinations(self):
+        from .planner import plan_meals
+        macros = np.array([[100.0, 10, 0, 0], [0, 0, 20, 5], [300, 0, 0, 0], [50, 5, 5, 5]])
+        budget = 2 * macros[0] + 0.5 * macros[1]
+        plans = plan_meals(macros, budget, [2000, 100, 200, 60], count=3, max_meals=2)
+        error, rows, servings = plans[0]
+        self.assertAlmostEqual(error, 0.0)
+        self.assertEqual(dict(zip(rows, servings)), {0: 2.0, 1: 0.5})
+        self.assertEqual(len(plans), 3)
+
+    def test_plan_meals_with_tiny_catalogs(self):
+        from .planner import plan_meals
+        scale = [2000, 100, 200, 60]
+        plans = plan_meals(np.array([[500.0, 20, 60, 10]]), [1000, 40, 120, 20], scale, count=3)
+        self.assertEqual([(rows, servings) for _, rows, servings in plans], [((0,), (2.0,))])
+
+        plans = plan_meals(np.array([[500.0, 20, 60, 10], [200, 30, 0, 5]]), [700, 50, 60, 15], scale, count=3)
+        self.assertEqual(len(plans), 3)
+        self.assertEqual({frozenset(rows) for _, rows, _ in plans}, {frozenset({0}), frozenset({1}), frozenset({0, 1})})
+        self.assertEqual(plans[0][1:], ((0, 1), (1.0, 1.0)))
+
+    def test_goal_progress_past_range_ending_unlogged_has_no_streak(self):
+        self.log_calories()
+        for days_ago in (4, 5):
+            DailyEntry.objects.create(
+                user=self.user, meal=self.meal, date=self.today - datetime.timedelta(days=days_ago), servings=1
+            )
+        self.client.force_authenticate(user=self.user)
+        url = '/api/goals/progress/?from={}&to={}'
+        data = self.client.get(url.format(self.today - datetime.timedelta(days=6), self.today - datetime.timedelta(days=3))).data
+        self.assertEqual(data['summary']['current_streak'], 0)
+        self.assertEqual(data['summary']['longest_streak'], 2)
+        data = self.client.get(url.format(self.today - datetime.timedelta(days=6), self.today - datetime.timedelta(days=4))).data
+        self.assertEqual(data['summary']['current_streak'], 2)
+
+    def test_goal_progress_streak_continues_before_the_range(self):
+        self.log_calories()
+        DailyEntry.objects.filter(user=self.user, servings=2).update(servings=1)
+        from .rollups import refresh_daily_rollups
+        refresh_daily_rollups({(self.user.id, self.today - datetime.timedelta(days=2))})
+
+        self.client.force_authenticate(user=self.user)
+        data = self.client.get(f'/api/goals/progress/?from={self.today}').data
+        self.assertEqual(data['summary']['current_streak'], 3)
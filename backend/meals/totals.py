@@ -0,0 +1,82 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .models import Meal, MealIngredient, MealNutrientTotal
+from .rollups import refresh_rollups_for_meals
+
+
+_deferred = threading.local()
+
+
+def refresh_meal_totals(meal_ids, nutrient_ids=None):
+    """
+    Recompute the MealNutrientTotal rows of the given meals (optionally only for
+    the given nutrients) from MealIngredient x IngredientNutrient.
+
+    `meal_ids` may be any iterable of pks or a `values('pk')` style queryset, so
+    callers touching thousands of meals never have to pull the ids into Python.
+    """
+    if not hasattr(meal_ids, 'query'):
+        meal_ids = list(meal_ids)
+        pending = getattr(_deferred, 'meal_ids', None)
+        if pending is not None and nutrient_ids is None:
+            pending.update(meal_ids)
+            return
+
+    with transaction.atomic():
+        stale = MealNutrientTotal.objects.filter(meal_id__in=meal_ids)
+        if nutrient_ids is not None:
+            stale = stale.filter(nutrient_id__in=nutrient_ids)
+        stale.delete()
+        rows = Meal.objects.filter(pk__in=meal_ids).computed_nutrient_totals(nutrient_ids)
+        MealNutrientTotal.objects.bulk_create(
+            (MealNutrientTotal(meal_id=meal_id, nutrient_id=nutrient_id, amount=amount)
+             for meal_id, nutrient_id, amount in rows.iterator(chunk_size=2000)),
+            batch_size=1000,
+        )
+        refresh_rollups_for_meals(meal_ids, nutrient_ids)
+
+
+def refresh_ingredient_totals(ingredient_ids, nutrient_ids=None):
+    meal_ids = MealIngredient.objects.filter(ingredient_id__in=ingredient_ids).values('meal_id')
+    refresh_meal_totals(meal_ids, nutrient_ids)
+
+
+@contextmanager
+def deferred_totals_refresh():
+    """
+    Collect per-meal refreshes triggered inside the block (e.g. by signals while
+    a meal's ingredients are replaced) and run them once on exit.
+    """
+    if getattr(_deferred, 'meal_ids', None) is not None:
+        yield
+        return
+
+    _deferred.meal_ids = set()
+    try:
+        yield
+        meal_ids = _deferred.meal_ids
+    finally:
+        _deferred.meal_ids = None
+    if meal_ids:
+        refresh_meal_totals(meal_ids)
+
+
+def rebuild_meal_totals(batch_size=1000):
+    """Rebuild the whole MealNutrientTotal table from scratch, one batch of meals at a time."""
+    rebuilt = 0
+    last_pk = 0
+    with transaction.atomic():
+        MealNutrientTotal.objects.all().delete()
+        while True:
+            batch = list(
+                Meal.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            refresh_meal_totals(batch)
+            rebuilt += len(batch)
+            last_pk = batch[-1]
+    return rebuilt
@@ -1,12 +1,19 @@
 from django.urls import path
-from .views import MealListView, MealDetailView, MealIngredientListView, MealIngredientDetailView, DailyEntryListView, DailyEntryDetailView
+from .views import AsyncMealListView, AsyncDailyEntryListView, MealDetailView, MealIngredientListView, MealIngredientBulkView, MealIngredientDetailView, DailyEntryBulkView, DailyEntryDetailView, DailySummaryView, NutrientHistoryView, AsyncDailyEntryExportView, GoalProgressView, MealPlanView
 
 
 urlpatterns = [
-    path('meals/', MealListView.as_view(), name='meal_list'),
+    path('meals/', AsyncMealListView.as_view(), name='meal_list'),
+    path('meals/plan/', MealPlanView.as_view(), name='meal_plan'),
     path('meals/<int:pk>/', MealDetailView.as_view(), name='meal_detail'),
     path('meal_ingredients', MealIngredientListView.as_view(), name='meal_ingredient_list'),
+    path('meal_ingredients/bulk', MealIngredientBulkView.as_view(), name='meal_ingredient_bulk'),
     path('meal_ingredients/<int:pk>', MealIngredientDetailView.as_view(), name='meal_ingredient_detail'),
-    path('daily-entries/', DailyEntryListView.as_view(), name='daily_entry_list'),
+    path('daily-entries/', AsyncDailyEntryListView.as_view(), name='daily_entry_list'),
+    path('daily-entries/bulk/', DailyEntryBulkView.as_view(), name='daily_entry_bulk'),
+    path('daily-entries/summary/', DailySummaryView.as_view(), name='daily_entry_summary'),
+    path('daily-entries/export/', AsyncDailyEntryExportView.as_view(), name='daily_entry_export'),
+    path('daily-entries/history/', NutrientHistoryView.as_view(), name='daily_entry_history'),
+    path('goals/progress/', GoalProgressView.as_view(), name='goal_progress'),
     path('daily-entries/<int:pk>/', DailyEntryDetailView.as_view(), name='daily_entry_detail'),
 ]
\ No newline at end of file
@@ -5,24 +5,92 @@ from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnl
 from rest_framework.generics import get_object_or_404
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from core.async_views import AsyncReadView, aiterate, json_response
+from core.pagination import KeysetPagination, PAGINATION_PARAMETERS
+from core.serializers import SPARSE_FIELDS_PARAMETERS, optimize_queryset
+from core.cache import cached_response
+from core.versioning import aconditional_response, conditional_on
+from nutrients.models import Ingredient, IngredientNutrient, Nutrient
+from nutrients.vectors import nutrient_registry
+from .bulk import (
+    BULK_MODES, DailyEntryBulkCreate, DailyEntryBulkItemSerializer,
+    MealIngredientBulkCreate, MealIngredientBulkItemSerializer,
+)
+from .export import EXPORT_FORMATS, FoodLogExport, export_queryset, parquet_available
 from .models import Meal, MealIngredient, DailyEntry
-from .serializers import MealIngredientSerializer, MealSerializer, DailyEntrySerializer
-from datetime import date
+from .planner import meal_plan
+from .progress import goal_progress
+from .serializers import (
+    MealIngredientSerializer, MealSerializer, DailyEntrySerializer,
+    DailySummarySerializer, GoalProgressSerializer, MealPlanSerializer, NutrientHistorySerializer,
+)
+from .summary import GRANULARITY_TRUNC, daily_nutrient_vector, macro_totals, nutrient_history, profile_targets
+from datetime import date, timedelta
+
+
+BULK_PARAMETERS = [
+    OpenApiParameter(name='mode', description='atomic (default): save nothing unless every item is valid; '
+                                              'partial: save the valid items', required=False, type=OpenApiTypes.STR, enum=list(BULK_MODES)),
+]
+
+
+def bulk_create_response(request, make_bulk):
+    """Validate and save a JSON array with `make_bulk(items, mode)`, returning per-item results."""
+    mode = request.query_params.get('mode', 'atomic')
+    if mode not in BULK_MODES:
+        return Response({'mode': [f'Expected one of: {", ".join(BULK_MODES)}.']}, status=status.HTTP_400_BAD_REQUEST)
+    items = request.data
+    if not isinstance(items, list):
+        return Response({'non_field_errors': ['Expected a list of items.']}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.BULK_MAX_ITEMS:
+        return Response({'non_field_errors': [f'At most {settings.BULK_MAX_ITEMS} items per request.']},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    bulk = make_bulk(items, mode)
+    try:
+        saved = bulk.save()
+    except IntegrityError:
+        return Response({'non_field_errors': ['The batch conflicts with concurrent changes; retry it.']},
+                        status=status.HTTP_409_CONFLICT)
+    if not saved:
+        response_status = status.HTTP_400_BAD_REQUEST
+    elif bulk.errors:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_201_CREATED
+    return Response({'created': len(bulk.created), 'failed': len(bulk.errors), 'results': bulk.results()},
+                    status=response_status)
+
+
+# Meal responses embed ingredient names and nutrient totals, so they change
+# whenever any of these tables do.
+MEAL_TABLES = (Meal, MealIngredient, Ingredient, IngredientNutrient, Nutrient)
 
 
 class MealListView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @method_decorator(conditional_on(*MEAL_TABLES))
     @extend_schema(
         summary="List all meals",
         description="Returns a list of all available meals with calculated total nutrients.",
+        parameters=PAGINATION_PARAMETERS + SPARSE_FIELDS_PARAMETERS,
         responses={200: MealSerializer(many=True)},
         tags=['Meals']
     )
     def get(self, request):
-        meals = Meal.objects.all()
-        serializer = MealSerializer(meals, many=True)
-        return Response(serializer.data)
+        context = {'request': request}
+        paginator = KeysetPagination()
+        meals = paginator.paginate_queryset(
+            optimize_queryset(Meal.objects.all(), MealSerializer(context=context)), request, view=self
+        )
+        serializer = MealSerializer(meals, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
 
     @extend_schema(
         summary="Create a new meal",
@@ -38,17 +106,32 @@ class MealListView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AsyncMealListView(AsyncReadView):
+    sync_view_class = MealListView
+
+    async def get(self, request):
+        async def get_response():
+            context = {'request': request}
+            queryset = optimize_queryset(Meal.objects.all(), MealSerializer(context=context))
+            return await self.paginated_response(request, queryset, MealSerializer, context)
+        return await aconditional_response(request, MEAL_TABLES, get_response)
+
+
 class MealDetailView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @method_decorator(conditional_on(*MEAL_TABLES))
+    @method_decorator(cached_response(*MEAL_TABLES))
     @extend_schema(
         summary="Retrieve a meal",
+        parameters=SPARSE_FIELDS_PARAMETERS,
         responses={200: MealSerializer},
         tags=['Meals']
     )
     def get(self, request, pk):
-        meal = get_object_or_404(Meal, pk=pk)
-        serializer = MealSerializer(meal)
+        context = {'request': request}
+        meal = get_object_or_404(optimize_queryset(Meal.objects.all(), MealSerializer(context=context)), pk=pk)
+        serializer = MealSerializer(meal, context=context)
         return Response(serializer.data)
 
     @extend_schema(
@@ -79,11 +162,15 @@ class MealDetailView(APIView):
 class MealIngredientListView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-    @extend_schema(summary="List meal ingredients", tags=['Meal Ingredients'])
+    @extend_schema(summary="List meal ingredients", parameters=PAGINATION_PARAMETERS + SPARSE_FIELDS_PARAMETERS, tags=['Meal Ingredients'])
     def get(self, request):
-        meal_ingredients = MealIngredient.objects.all()
-        serializer = MealIngredientSerializer(meal_ingredients, many=True)
-        return Response(serializer.data)
+        context = {'request': request}
+        paginator = KeysetPagination()
+        meal_ingredients = paginator.paginate_queryset(
+            optimize_queryset(MealIngredient.objects.all(), MealIngredientSerializer(context=context)), request, view=self
+        )
+        serializer = MealIngredientSerializer(meal_ingredients, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
 
     @extend_schema(summary="Add ingredient to meal", tags=['Meal Ingredients'])
     def post(self, request):
@@ -94,6 +181,22 @@ class MealIngredientListView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class MealIngredientBulkView(APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    @extend_schema(
+        summary="Add ingredients to meals in bulk",
+        description="Accepts a JSON array of meal ingredients and inserts the valid ones in one transaction. "
+                    "Responds 201 when all were created, 207 with per-item results in partial mode, "
+                    "and 400 when an atomic batch had invalid items.",
+        parameters=BULK_PARAMETERS,
+        request=MealIngredientBulkItemSerializer(many=True),
+        tags=['Meal Ingredients']
+    )
+    def post(self, request):
+        return bulk_create_response(request, MealIngredientBulkCreate)
+
+
 class MealIngredientDetailView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
@@ -125,6 +228,8 @@ class MealIngredientDetailView(APIView):
     tags=['Food Log'],
     parameters=[
         OpenApiParameter(name='date', description='Filter by date (YYYY-MM-DD)', required=False, type=OpenApiTypes.DATE),
+        *PAGINATION_PARAMETERS,
+        *SPARSE_FIELDS_PARAMETERS,
     ]
 )
 class DailyEntryListView(generics.ListCreateAPIView):
@@ -138,13 +243,39 @@ class DailyEntryListView(generics.ListCreateAPIView):
             queryset = queryset.filter(date=date_param)
         else:
             queryset = queryset.filter(date=date.today())
-        return queryset.select_related('meal')
+        return optimize_queryset(queryset, self.get_serializer())
 
     @extend_schema(summary="Log a meal", tags=['Food Log'])
     def perform_create(self, serializer):
         serializer.save()
 
 
+class AsyncDailyEntryListView(AsyncReadView):
+    sync_view_class = DailyEntryListView
+
+    async def get(self, request):
+        view = self.sync_view
+        return await self.paginated_response(
+            request, view.get_queryset(), view.get_serializer_class(), view.get_serializer_context()
+        )
+
+
+class DailyEntryBulkView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Log meals in bulk",
+        description="Accepts a JSON array of food log entries for the current user and inserts the valid ones "
+                    "in one transaction. Responds 201 when all were created, 207 with per-item results in "
+                    "partial mode, and 400 when an atomic batch had invalid items.",
+        parameters=BULK_PARAMETERS,
+        request=DailyEntryBulkItemSerializer(many=True),
+        tags=['Food Log']
+    )
+    def post(self, request):
+        return bulk_create_response(request, lambda items, mode: DailyEntryBulkCreate(request.user, items, mode))
+
+
 @extend_schema(tags=['Food Log'])
 class DailyEntryDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = DailyEntrySerializer
@@ -163,4 +294,223 @@ class DailyEntryDetailView(generics.RetrieveUpdateDestroyAPIView):
         return super().delete(request, *args, **kwargs)
 
     def get_queryset(self):
-        return DailyEntry.objects.filter(user=self.request.user)
\ No newline at end of file
+        return optimize_queryset(DailyEntry.objects.filter(user=self.request.user), self.get_serializer())
+
+
+class DailySummaryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Daily nutrition summary",
+        description="Per-nutrient totals (meal totals x servings) for the current user on a date, "
+                    "together with the profile targets. Defaults to today.",
+        parameters=[
+            OpenApiParameter(name='date', description='Summary date (YYYY-MM-DD)', required=False, type=OpenApiTypes.DATE),
+        ],
+        responses={200: DailySummarySerializer},
+        tags=['Food Log']
+    )
+    def get(self, request):
+        try:
+            day = date.fromisoformat(request.query_params.get('date', date.today().isoformat()))
+        except ValueError:
+            return Response({'date': ['Enter a valid date (YYYY-MM-DD).']}, status=status.HTTP_400_BAD_REQUEST)
+
+        vector = daily_nutrient_vector(request.user, day)
+        serializer = DailySummarySerializer({
+            'date': day,
+            'nutrients': nutrient_registry.as_dict(vector),
+            'macros': macro_totals(vector),
+            'targets': profile_targets(request.user),
+        })
+        return Response(serializer.data)
+
+
+def parse_date_range(request, default_days=30, max_days=None):
+    """
+    Return `(date_from, date_to, None)` from the `from`/`to` query parameters,
+    or `(None, None, error response)`. With `default_days`, `to` defaults to
+    today and `from` to the start of that many days up to `to`; without, a
+    missing parameter is None.
+    """
+    dates = {}
+    for name in ('to', 'from'):
+        value = request.query_params.get(name)
+        if value is None:
+            if default_days is None:
+                dates[name] = None
+            elif name == 'to':
+                dates[name] = date.today()
+            else:
+                dates[name] = dates['to'] - timedelta(days=default_days - 1)
+            continue
+        try:
+            dates[name] = date.fromisoformat(value)
+        except ValueError:
+            return None, None, Response({name: ['Enter a valid date (YYYY-MM-DD).']}, status=status.HTTP_400_BAD_REQUEST)
+    date_from, date_to = dates['from'], dates['to']
+    if date_from is not None and date_to is not None:
+        if date_from > date_to:
+            return None, None, Response({'from': ["Must not be after 'to'."]}, status=status.HTTP_400_BAD_REQUEST)
+        if max_days is not None and (date_to - date_from).days >= max_days:
+            return None, None, Response({'from': [f'At most {max_days} days per request.']},
+                                        status=status.HTTP_400_BAD_REQUEST)
+    return date_from, date_to, None
+
+
+EXPORT_PARAMETERS = [
+    OpenApiParameter(name='output', description='File format, defaults to csv', required=False, type=OpenApiTypes.STR, enum=list(EXPORT_FORMATS)),
+    OpenApiParameter(name='from', description='First date (YYYY-MM-DD)', required=False, type=OpenApiTypes.DATE),
+    OpenApiParameter(name='to', description='Last date (YYYY-MM-DD)', required=False, type=OpenApiTypes.DATE),
+]
+
+
+def food_log_export(request):
+    """Return `(export, None)` for the current user's export request, or `(None, error response)`."""
+    # `format` is taken by DRF's renderer override, hence `output`.
+    output = request.query_params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        return None, Response({'output': [f'Choose one of: {", ".join(EXPORT_FORMATS)}.']}, status=status.HTTP_400_BAD_REQUEST)
+    if output == 'parquet' and not parquet_available():
+        return None, Response({'output': ['Parquet export is not available on this server.']}, status=status.HTTP_400_BAD_REQUEST)
+    date_from, date_to, error = parse_date_range(request, default_days=None)
+    if error:
+        return None, error
+    return FoodLogExport(output, export_queryset(request.user, date_from, date_to)), None
+
+
+def export_response(export, content):
+    response = StreamingHttpResponse(content, content_type=export.content_type)
+    response['Content-Disposition'] = f'attachment; filename="food-log-{date.today()}.{export.output}"'
+    return response
+
+
+class DailyEntryExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Export food log",
+        description="Streams the current user's whole food log, optionally limited to a date range, with each "
+                    "entry's nutrients scaled by its servings. Formats: csv, ndjson (one JSON object per line) "
+                    "and parquet.",
+        parameters=EXPORT_PARAMETERS,
+        responses={(200, 'text/csv'): OpenApiTypes.BINARY},
+        tags=['Food Log']
+    )
+    def get(self, request):
+        export, error = food_log_export(request)
+        return error or export_response(export, export.stream())
+
+
+class AsyncDailyEntryExportView(AsyncReadView):
+    sync_view_class = DailyEntryExportView
+
+    async def get(self, request):
+        export, error = await sync_to_async(food_log_export)(request)
+        if error:
+            return json_response(error.data, status=error.status_code)
+        return export_response(export, aiterate(export.stream()))
+
+
+class NutrientHistoryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Nutrition history",
+        description="Per-period nutrient totals for the current user between two dates (inclusive), "
+                    "served from precomputed daily rollups. Defaults to the last 30 days by day.",
+        parameters=[
+            OpenApiParameter(name='from', description='First date (YYYY-MM-DD)', required=False, type=OpenApiTypes.DATE),
+            OpenApiParameter(name='to', description='Last date (YYYY-MM-DD), defaults to today', required=False, type=OpenApiTypes.DATE),
+            OpenApiParameter(name='granularity', description='Period size', required=False, type=OpenApiTypes.STR,
+                             enum=list(GRANULARITY_TRUNC)),
+        ],
+        responses={200: NutrientHistorySerializer},
+        tags=['Food Log']
+    )
+    def get(self, request):
+        date_from, date_to, error = parse_date_range(request)
+        if error:
+            return error
+
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in GRANULARITY_TRUNC:
+            return Response({'granularity': [f'Choose one of: {", ".join(GRANULARITY_TRUNC)}.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        periods = [
+            {'start': start, 'nutrients': nutrient_registry.as_dict(vector), 'macros': macro_totals(vector)}
+            for start, vector in nutrient_history(request.user, date_from, date_to, granularity)
+        ]
+        serializer = NutrientHistorySerializer({
+            'granularity': granularity,
+            'start': date_from,
+            'end': date_to,
+            'periods': periods,
+        })
+        return Response(serializer.data)
+
+
+class GoalProgressView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Goal progress",
+        description="Daily macros of the current user against their profile targets between two dates "
+                    "(inclusive): adherence percentages, on-target streaks and rolling 7/30-day averages. "
+                    "Defaults to the last 30 days.",
+        parameters=[
+            OpenApiParameter(name='from', description='First date (YYYY-MM-DD)', required=False, type=OpenApiTypes.DATE),
+            OpenApiParameter(name='to', description='Last date (YYYY-MM-DD), defaults to today', required=False, type=OpenApiTypes.DATE),
+        ],
+        responses={200: GoalProgressSerializer},
+        tags=['Food Log']
+    )
+    def get(self, request):
+        date_from, date_to, error = parse_date_range(request, max_days=settings.GOAL_PROGRESS_MAX_DAYS)
+        if error:
+            return error
+
+        return Response(GoalProgressSerializer(goal_progress(request.user, date_from, date_to)).data)
+
+
+class MealPlanView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Suggest meals for the remaining macros",
+        description="What is left of the current user's macro targets on a date (profile targets minus the "
+                    "day's food log) and the meal/serving combinations from the catalog that come closest to "
+                    "it, best fit first. Defaults to today.",
+        parameters=[
+            OpenApiParameter(name='date', description='Plan date (YYYY-MM-DD)', required=False, type=OpenApiTypes.DATE),
+            OpenApiParameter(name='suggestions', description='Number of suggestions, defaults to 3', required=False,
+                             type=OpenApiTypes.INT),
+            OpenApiParameter(name='meals', description='Most meals per suggestion, defaults to 2', required=False,
+                             type=OpenApiTypes.INT),
+        ],
+        responses={200: MealPlanSerializer},
+        tags=['Meals']
+    )
+    def get(self, request):
+        try:
+            day = date.fromisoformat(request.query_params.get('date', date.today().isoformat()))
+        except ValueError:
+            return Response({'date': ['Enter a valid date (YYYY-MM-DD).']}, status=status.HTTP_400_BAD_REQUEST)
+
+        limits = {}
+        for name, default, maximum in (('suggestions', 3, settings.MEAL_PLAN_MAX_SUGGESTIONS),
+                                       ('meals', 2, settings.MEAL_PLAN_MAX_MEALS)):
+            try:
+                limits[name] = int(request.query_params.get(name, default))
+            except ValueError:
+                limits[name] = 0
+            if not 1 <= limits[name] <= maximum:
+                return Response({name: [f'Enter a whole number from 1 to {maximum}.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        plan = meal_plan(request.user, day, limits['suggestions'], limits['meals'])
+        if plan is None:
+            return Response({'detail': 'Create a profile with daily targets first.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(MealPlanSerializer(plan).data)
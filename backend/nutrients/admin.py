@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Ingredient, IngredientNutrient, Nutrient
+from .models import Ingredient, IngredientNutrient, Nutrient, NutrientAlias
 
 
 admin.site.register(Ingredient)
 admin.site.register(Nutrient)
 admin.site.register(IngredientNutrient)
+admin.site.register(NutrientAlias)
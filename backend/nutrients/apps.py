@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class NutrientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'nutrients'
+
+    def ready(self):
+        from core.versioning import track_table_versions
+        from .signals import (
+            create_search_indexes, note_ingredient_nutrient_change, recode_nutrients_on_alias_save,
+            seed_nutrient_aliases,
+        )
+        post_migrate.connect(create_search_indexes, sender=self)
+        post_migrate.connect(seed_nutrient_aliases, sender=self)
+        post_save.connect(recode_nutrients_on_alias_save, sender=self.get_model('NutrientAlias'))
+        post_save.connect(note_ingredient_nutrient_change, sender=self.get_model('IngredientNutrient'))
+        post_delete.connect(note_ingredient_nutrient_change, sender=self.get_model('IngredientNutrient'))
+        track_table_versions(
+            self.get_model('Ingredient'), self.get_model('Nutrient'), self.get_model('IngredientNutrient')
+        )
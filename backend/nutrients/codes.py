@@ -0,0 +1,40 @@
+"""
+Canonical nutrient codes.
+
+`Nutrient.name` is free text ('Carbs', 'Carbohydrate, by difference', ...);
+`Nutrient.code` says which quantity it is. A code is assigned when a nutrient
+is saved or imported, from its FoodData Central id or from the NutrientAlias
+table, which is seeded with the aliases below and can be extended in the
+admin. It only applies when the nutrient has the code's unit, so e.g. Energy
+in kJ stays uncoded.
+
+Amounts of nutrients sharing a code are summed, so each code lists a single
+FDC id: FDC reports some quantities twice (carbohydrate by difference and by
+summation) and those must not add up.
+
+The order of CANONICAL_NUTRIENTS fixes the codes' vector positions
+(nutrients.vectors); only ever append to it.
+"""
+from collections import namedtuple
+
+
+CanonicalNutrient = namedtuple('CanonicalNutrient', ['code', 'name', 'unit', 'fdc_id', 'aliases'])
+
+CANONICAL_NUTRIENTS = (
+    CanonicalNutrient('energy', 'Energy', 'kcal', 1008, ('energy', 'calories', 'calorie', 'kcal')),
+    CanonicalNutrient('protein', 'Protein', 'g', 1003, ('protein', 'proteins')),
+    CanonicalNutrient('carbohydrate', 'Carbohydrates', 'g', 1005, (
+        'carbohydrates', 'carbohydrate', 'carbs', 'carb', 'total carbohydrate', 'carbohydrate, by difference',
+    )),
+    CanonicalNutrient('fat', 'Fat', 'g', 1004, ('fat', 'fats', 'total fat', 'total lipid (fat)')),
+    CanonicalNutrient('fiber', 'Fiber', 'g', 1079, ('fiber', 'fibre', 'dietary fiber', 'fiber, total dietary')),
+    CanonicalNutrient('sugars', 'Sugars', 'g', 2000, ('sugars', 'sugar', 'total sugars', 'sugars, total including nlea')),
+    CanonicalNutrient('saturated_fat', 'Saturated fat', 'g', 1258, (
+        'saturated fat', 'saturates', 'fatty acids, total saturated',
+    )),
+    CanonicalNutrient('sodium', 'Sodium', 'mg', 1093, ('sodium', 'sodium, na')),
+)
+
+CODES = {nutrient.code: nutrient for nutrient in CANONICAL_NUTRIENTS}
+CODE_CHOICES = [(nutrient.code, nutrient.name) for nutrient in CANONICAL_NUTRIENTS]
+CODE_BY_FDC_ID = {nutrient.fdc_id: nutrient.code for nutrient in CANONICAL_NUTRIENTS}
@@ -0,0 +1,242 @@
+"""
+Streaming importer for USDA FoodData Central (FDC) downloads.
+
+Supported inputs:
+  * a directory with the FDC CSV export (nutrient.csv, food.csv,
+    food_nutrient.csv and optionally food_category.csv);
+  * a JSON Lines file with one FDC food object per line;
+  * an FDC JSON document ({"FoundationFoods": [...]}), streamed with `ijson`.
+
+Rows are read lazily and written in batches with upserting bulk_create calls,
+one transaction per batch, so memory stays flat and re-running an import is
+harmless. Progress is checkpointed after every batch and a later run resumes
+from the checkpoint.
+"""
+import csv
+import json
+import os
+import time
+from itertools import islice
+from pathlib import Path
+
+import ijson
+from django.db import transaction
+
+from core.versioning import bump_table_versions
+
+from .models import Ingredient, IngredientNutrient, Nutrient, NutrientAlias, normalize_search_text, resolve_nutrient_code
+from .signals import ingredient_nutrients_bulk_changed
+
+
+class FdcImportError(Exception):
+    pass
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8') as handle:
+        yield from csv.DictReader(handle)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class FdcImporter:
+    def __init__(self, source, batch_size=5000, checkpoint=None, restart=False, progress=None):
+        self.source = Path(source)
+        self.batch_size = batch_size
+        self.checkpoint = Path(checkpoint) if checkpoint else self.source.with_name(self.source.name + '.import-state.json')
+        self.progress = progress or (lambda stage, done, rate: None)
+        self.state = {'source': str(self.source.resolve()), 'stages': {}}
+        if self.checkpoint.exists() and not restart:
+            saved = json.loads(self.checkpoint.read_text())
+            if saved.get('source') == self.state['source']:
+                self.state = saved
+        self.nutrient_ids = {}
+        self.unit_by_name = {}
+        self.aliases = {}
+        self.totals = {}
+
+    def run(self):
+        self._load_nutrient_ids()
+        self.aliases = dict(NutrientAlias.objects.values_list('name', 'code'))
+        if self.source.is_dir():
+            self._import_csv_directory()
+        elif self.source.suffix in ('.jsonl', '.ndjson'):
+            self._run_stage('foods', self._read_json_lines(), self._upsert_json_foods)
+        elif self.source.suffix == '.json':
+            self._run_stage('foods', self._read_json_document(), self._upsert_json_foods)
+        else:
+            raise FdcImportError(f'Unsupported source {self.source}: expected a CSV directory, .json or .jsonl file')
+        self.checkpoint.unlink(missing_ok=True)
+        return self.totals
+
+    # -- stages ---------------------------------------------------------------
+
+    def _run_stage(self, stage, rows, handler):
+        done = self.state['stages'].get(stage, 0)
+        if done:
+            rows = islice(rows, done, None)
+        started = time.monotonic()
+        processed = 0
+        for batch in _batches(rows, self.batch_size):
+            with transaction.atomic():
+                handler(batch)
+                # bulk_create skips the signals that normally bump these.
+                bump_table_versions(Nutrient, Ingredient, IngredientNutrient)
+            done += len(batch)
+            processed += len(batch)
+            self.state['stages'][stage] = done
+            self._save_state()
+            self.progress(stage, done, processed / max(time.monotonic() - started, 1e-6))
+        self.totals[stage] = done
+
+    def _save_state(self):
+        tmp = self.checkpoint.with_name(self.checkpoint.name + '.tmp')
+        tmp.write_text(json.dumps(self.state))
+        os.replace(tmp, self.checkpoint)
+
+    def _import_csv_directory(self):
+        categories = {}
+        category_file = self.source / 'food_category.csv'
+        if category_file.exists():
+            categories = {row['id']: row['description'] for row in _read_csv(category_file)}
+        for required in ('nutrient.csv', 'food.csv', 'food_nutrient.csv'):
+            if not (self.source / required).exists():
+                raise FdcImportError(f'{self.source} is missing {required}')
+
+        self._run_stage('nutrients', _read_csv(self.source / 'nutrient.csv'), self._upsert_csv_nutrients)
+        self._load_nutrient_ids()
+        self._run_stage(
+            'foods', _read_csv(self.source / 'food.csv'),
+            lambda batch: self._upsert_ingredients(
+                (row['fdc_id'], row['description'], categories.get(row.get('food_category_id'), row.get('data_type', '')))
+                for row in batch
+            ),
+        )
+        self._run_stage(
+            'food_nutrients', _read_csv(self.source / 'food_nutrient.csv'),
+            lambda batch: self._upsert_ingredient_nutrients(
+                (row['fdc_id'], row['nutrient_id'], row['amount']) for row in batch
+            ),
+        )
+
+    # -- readers --------------------------------------------------------------
+
+    def _read_json_lines(self):
+        with open(self.source, encoding='utf-8') as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _read_json_document(self):
+        with open(self.source, 'rb') as handle:
+            root_key = next((value for prefix, event, value in ijson.parse(handle) if event == 'map_key'), None)
+        if root_key is None:
+            return
+        with open(self.source, 'rb') as handle:
+            yield from ijson.items(handle, f'{root_key}.item', use_float=True)
+
+    # -- writers --------------------------------------------------------------
+
+    def _unique_nutrient_name(self, name, unit):
+        # FDC reuses names across units (Energy in kcal and kJ); keep them apart
+        # because meal totals are keyed by nutrient name.
+        seen_unit = self.unit_by_name.setdefault(name, unit)
+        return name if seen_unit == unit else f'{name} ({unit})'
+
+    def _upsert_nutrients(self, nutrients):
+        objects = {}
+        for fdc_id, name, unit in nutrients:
+            unit = (unit or '').lower()
+            objects[int(fdc_id)] = Nutrient(
+                fdc_id=int(fdc_id), name=self._unique_nutrient_name(name, unit)[:255], unit=unit[:50],
+                code=resolve_nutrient_code(name, unit, int(fdc_id), self.aliases),
+            )
+        Nutrient.objects.bulk_create(
+            objects.values(), update_conflicts=True, unique_fields=['fdc_id'], update_fields=['name', 'unit', 'code']
+        )
+
+    def _upsert_csv_nutrients(self, batch):
+        self._upsert_nutrients((row['id'], row['name'], row['unit_name']) for row in batch)
+
+    def _load_nutrient_ids(self):
+        self.nutrient_ids = {}
+        for pk, fdc_id, name, unit in Nutrient.objects.values_list('pk', 'fdc_id', 'name', 'unit'):
+            self.unit_by_name.setdefault(name, unit)
+            if fdc_id is not None:
+                self.nutrient_ids[fdc_id] = pk
+
+    def _upsert_ingredients(self, foods):
+        objects = {}
+        for fdc_id, name, category in foods:
+            name, category = (name or '')[:255], (category or '')[:255]
+            objects[int(fdc_id)] = Ingredient(
+                fdc_id=int(fdc_id), name=name, category=category,
+                search_name=normalize_search_text(name), search_category=normalize_search_text(category),
+            )
+        Ingredient.objects.bulk_create(
+            objects.values(), update_conflicts=True, unique_fields=['fdc_id'],
+            update_fields=['name', 'category', 'search_name', 'search_category'],
+        )
+
+    def _upsert_ingredient_nutrients(self, amounts):
+        amounts = list(amounts)
+        ingredient_ids = dict(
+            Ingredient.objects.filter(fdc_id__in={int(fdc_id) for fdc_id, _, _ in amounts})
+            .values_list('fdc_id', 'pk')
+        )
+        objects = {}
+        for fdc_id, nutrient_fdc_id, amount in amounts:
+            ingredient_id = ingredient_ids.get(int(fdc_id))
+            nutrient_id = self.nutrient_ids.get(int(nutrient_fdc_id))
+            amount = _to_float(amount)
+            if ingredient_id is None or nutrient_id is None or amount is None:
+                continue
+            objects[ingredient_id, nutrient_id] = IngredientNutrient(
+                ingredient_id=ingredient_id, nutrient_id=nutrient_id, amount_per_100g=amount
+            )
+        IngredientNutrient.objects.bulk_create(
+            objects.values(), update_conflicts=True, unique_fields=['ingredient', 'nutrient'],
+            update_fields=['amount_per_100g'],
+        )
+        ingredient_nutrients_bulk_changed.send(
+            sender=IngredientNutrient, ingredient_ids={ingredient_id for ingredient_id, _ in objects}
+        )
+
+    def _upsert_json_foods(self, foods):
+        nutrients = {}
+        for food in foods:
+            for food_nutrient in food.get('foodNutrients', []):
+                nutrient = food_nutrient.get('nutrient') or {}
+                if 'id' in nutrient and int(nutrient['id']) not in self.nutrient_ids:
+                    nutrients[int(nutrient['id'])] = (nutrient['id'], nutrient.get('name', ''), nutrient.get('unitName', ''))
+        if nutrients:
+            self._upsert_nutrients(nutrients.values())
+            self._load_nutrient_ids()
+
+        self._upsert_ingredients(
+            (food['fdcId'], food.get('description', ''), self._json_category(food)) for food in foods
+        )
+        self._upsert_ingredient_nutrients(
+            (food['fdcId'], food_nutrient['nutrient']['id'], food_nutrient.get('amount'))
+            for food in foods
+            for food_nutrient in food.get('foodNutrients', [])
+            if 'id' in (food_nutrient.get('nutrient') or {})
+        )
+
+    @staticmethod
+    def _json_category(food):
+        category = food.get('foodCategory')
+        if isinstance(category, dict):
+            return category.get('description', '')
+        return food.get('brandedFoodCategory') or category or food.get('dataType', '')
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nutrients.fdc import FdcImporter, FdcImportError
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a USDA FoodData Central download (CSV directory, JSON Lines or JSON file) into '
+        'Ingredient, Nutrient and IngredientNutrient. Idempotent and resumable.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='FDC CSV directory, .jsonl/.ndjson file or .json file')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows upserted per transaction')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <source>.import-state.json)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over')
+        parser.add_argument('--report-every', type=float, default=5.0, help='Seconds between progress lines')
+
+    def handle(self, *args, **options):
+        last_report = [0.0]
+
+        def progress(stage, done, rate):
+            now = time.monotonic()
+            if now - last_report[0] >= options['report_every']:
+                last_report[0] = now
+                self.stdout.write(f'{stage}: {done} rows ({rate:,.0f} rows/s)')
+
+        importer = FdcImporter(
+            options['source'],
+            batch_size=options['batch_size'],
+            checkpoint=options['checkpoint'],
+            restart=options['restart'],
+            progress=progress,
+        )
+        started = time.monotonic()
+        try:
+            totals = importer.run()
+        except (FdcImportError, OSError) as exc:
+            raise CommandError(str(exc)) from exc
+
+        elapsed = time.monotonic() - started
+        rows = sum(totals.values())
+        summary = ', '.join(f'{stage}={count}' for stage, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {rows} rows ({summary}) in {elapsed:.1f}s, {rows / max(elapsed, 1e-6):,.0f} rows/s'
+        ))
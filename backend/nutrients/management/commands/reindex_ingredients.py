@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from nutrients.models import Ingredient, normalize_search_text
+
+
+class Command(BaseCommand):
+    help = 'Recompute the normalized search columns of all ingredients (e.g. after a bulk import).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = list(Ingredient.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            for ingredient in batch:
+                ingredient.search_name = normalize_search_text(ingredient.name)
+                ingredient.search_category = normalize_search_text(ingredient.category)
+            Ingredient.objects.bulk_update(batch, ['search_name', 'search_category'])
+            updated += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Reindexed {updated} ingredients'))
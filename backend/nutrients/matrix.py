@@ -0,0 +1,185 @@
+"""
+In-memory ingredient x nutrient matrix.
+
+`nutrient_matrix` holds every IngredientNutrient row as a sparse CSR matrix
+in NumPy arrays: one row per ingredient, one column per nutrient vector
+position (nutrients.vectors), values in amount per gram. Totals for any set of
+meals or food log entries are then a single sparse product of their
+(ingredient, grams) pairs with the matrix, see `vectors`.
+
+The matrix is loaded lazily and tagged with the IngredientNutrient and
+Nutrient table versions (core.versioning). `sync` compares those with the
+current versions: when the only changes since the last sync are committed
+IngredientNutrient writes made by this process, which the model signals
+report through `note_changes`, just the affected ingredients are re-read;
+anything else (another process wrote, a nutrient changed, a transaction was
+rolled back) reloads the whole matrix.
+
+A full reload reads every IngredientNutrient row once; the arrays take about
+20 bytes per row, and rows are converted LOAD_CHUNK_SIZE at a time rather
+than held as Python tuples all at once. Every worker process
+pays it on its next sync after a write made elsewhere; writes in between
+are coalesced into that one reload, which is fine for a catalog that is
+edited far less often than it is read, but bulk imports are best run while
+traffic is low.
+"""
+import threading
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+
+from core.versioning import table_label, table_versions
+from .models import IngredientNutrient, Nutrient
+from .vectors import nutrient_registry
+
+
+MATRIX_TABLES = (IngredientNutrient, Nutrient)
+
+# Rows fetched and converted to arrays at a time while loading.
+LOAD_CHUNK_SIZE = 10000
+
+# CSR arrays; `ingredient_ids` is sorted and `indptr` has one more entry.
+_Csr = namedtuple('_Csr', ['ingredient_ids', 'indptr', 'indices', 'data'])
+
+
+def _fingerprint(versions):
+    return tuple(versions[table_label(model)] for model in MATRIX_TABLES)
+
+
+def _csr(ingredient_ids, positions, amounts):
+    order = np.argsort(ingredient_ids, kind='stable')
+    ingredient_ids, positions, amounts = ingredient_ids[order], positions[order], amounts[order]
+    unique_ids, starts = np.unique(ingredient_ids, return_index=True)
+    indptr = np.append(starts, len(ingredient_ids)).astype(np.int64)
+    return _Csr(unique_ids, indptr, positions, amounts)
+
+
+class NutrientMatrix:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.csr = None
+        self.fingerprint = None
+        self.nutrient_positions = {}
+        self.loads = 0
+        self._pending_ids = set()
+        self._pending_bumps = 0
+
+    # -- loading ---------------------------------------------------------------
+
+    def _rows(self, ingredient_ids=None):
+        rows = IngredientNutrient.objects.order_by()
+        if ingredient_ids is not None:
+            rows = rows.filter(ingredient_id__in=ingredient_ids)
+        rows = rows.values_list('ingredient_id', 'nutrient_id', 'amount_per_100g').iterator(chunk_size=LOAD_CHUNK_SIZE)
+        # Converted chunk by chunk, so only one chunk of row tuples is alive at a time.
+        chunks = []
+        while chunk := list(islice(rows, LOAD_CHUNK_SIZE)):
+            chunks.append((
+                np.fromiter((row[0] for row in chunk), np.int64, len(chunk)),
+                np.fromiter((self.nutrient_positions[row[1]] for row in chunk), np.int32, len(chunk)),
+                np.fromiter((row[2] for row in chunk), np.float64, len(chunk)),
+            ))
+        if not chunks:
+            return np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0)
+        ingredients, positions, amounts = (np.concatenate(column) for column in zip(*chunks))
+        amounts /= 100.0
+        return ingredients, positions, amounts
+
+    def _load(self):
+        self.nutrient_positions = {
+            pk: nutrient_registry.position(name, unit, code)
+            for pk, name, unit, code in Nutrient.objects.order_by('pk').values_list('pk', 'name', 'unit', 'code')
+        }
+        self.csr = _csr(*self._rows())
+        self.loads += 1
+
+    def _refresh(self, ingredient_ids):
+        csr = self.csr
+        lengths = np.diff(csr.indptr)
+        kept = ~np.isin(np.repeat(csr.ingredient_ids, lengths), list(ingredient_ids))
+        fresh = self._rows(ingredient_ids)
+        self.csr = _csr(
+            np.concatenate([np.repeat(csr.ingredient_ids, lengths)[kept], fresh[0]]),
+            np.concatenate([csr.indices[kept], fresh[1]]),
+            np.concatenate([csr.data[kept], fresh[2]]),
+        )
+
+    def note_changes(self, ingredient_ids, bumps=1):
+        """Record a committed transaction of this process that wrote IngredientNutrient rows, bumping its version `bumps` times."""
+        with self._lock:
+            self._pending_ids.update(ingredient_ids)
+            self._pending_bumps += bumps
+
+    def sync(self, versions=None):
+        """Bring the matrix up to date with the database; `versions` may come from `request_table_versions`."""
+        fingerprint = _fingerprint(versions or table_versions(*MATRIX_TABLES))
+        if fingerprint == self.fingerprint:
+            return self.csr
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                explained = (
+                    self.csr is not None and self._pending_ids
+                    and fingerprint[1] == self.fingerprint[1]
+                    and fingerprint[0][0] - self.fingerprint[0][0] == self._pending_bumps
+                )
+                if explained:
+                    self._refresh(self._pending_ids)
+                else:
+                    self._load()
+                self._pending_ids = set()
+                self._pending_bumps = 0
+                self.fingerprint = fingerprint
+            return self.csr
+
+    def clear(self):
+        with self._lock:
+            self.csr = self.fingerprint = None
+            self._pending_ids = set()
+            self._pending_bumps = 0
+
+    # -- products --------------------------------------------------------------
+
+    def vectors(self, keys, ingredient_ids, grams, versions=None, positions=None):
+        """
+        Sum `grams` of each ingredient into one nutrient vector per key, e.g.
+        keys = meal ids and (ingredient_id, amount_in_grams) of their
+        MealIngredient rows. Returns `(unique_keys, matrix)` with one row per
+        unique key; ingredients without nutrient data contribute nothing.
+        With `positions`, the matrix only has those vector positions as columns.
+        """
+        csr = self.sync(versions)
+        unique_keys, key_rows = np.unique(np.asarray(keys, dtype=np.int64), return_inverse=True)
+        # Column of each vector position in the result, -1 when left out.
+        columns = np.arange(nutrient_registry.size)
+        if positions is not None:
+            columns = np.full(nutrient_registry.size, -1)
+            columns[list(positions)] = np.arange(len(positions))
+        totals = np.zeros((len(unique_keys), columns.max() + 1))
+        if not len(key_rows) or not len(csr.ingredient_ids):
+            return unique_keys, totals
+
+        ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+        grams = np.asarray(grams, dtype=np.float64)
+        rows = np.minimum(np.searchsorted(csr.ingredient_ids, ingredient_ids), len(csr.ingredient_ids) - 1)
+        found = csr.ingredient_ids[rows] == ingredient_ids
+        starts = csr.indptr[rows]
+        lengths = np.where(found, csr.indptr[rows + 1] - starts, 0)
+
+        # Expand every (key, ingredient) pair into its stored nutrient entries.
+        owners = np.repeat(np.arange(len(ingredient_ids)), lengths)
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        if positions is not None:
+            wanted = columns[csr.indices[entries]] >= 0
+            owners, entries = owners[wanted], entries[wanted]
+        np.add.at(totals, (key_rows[owners], columns[csr.indices[entries]]), csr.data[entries] * grams[owners])
+        return unique_keys, totals
+
+    def vector_map(self, keys, ingredient_ids, grams, versions=None):
+        """`vectors` as `{key: vector}`."""
+        unique_keys, totals = self.vectors(keys, ingredient_ids, grams, versions)
+        return dict(zip(unique_keys.tolist(), totals))
+
+
+nutrient_matrix = NutrientMatrix()
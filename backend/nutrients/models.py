@@ -1,21 +1,90 @@
+import unicodedata
+
 from django.db import models
 
+from .codes import CODE_BY_FDC_ID, CODE_CHOICES, CODES
+
+
+def normalize_search_text(value):
+    """Lower-case, strip accents and collapse whitespace, e.g. 'Crème  Fraîche' -> 'creme fraiche'."""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.lower().split())
+
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=255)
     category = models.CharField(max_length=255)
+    search_name = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    search_category = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    fdc_id = models.PositiveIntegerField(unique=True, null=True, blank=True, help_text='USDA FoodData Central food id')
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_search_text(self.name)
+        self.search_category = normalize_search_text(self.category)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_name', 'search_category'}
+        super().save(*args, **kwargs)
+
+
+def resolve_nutrient_code(name, unit, fdc_id=None, aliases=None):
+    """
+    The canonical code of a nutrient, or '' when it has none (see
+    nutrients.codes). `aliases` is a preloaded `{alias: code}` dict for bulk
+    callers; without it the alias table is queried.
+    """
+    code = CODE_BY_FDC_ID.get(fdc_id)
+    if code is None:
+        alias = normalize_search_text(name)
+        if aliases is not None:
+            code = aliases.get(alias)
+        else:
+            code = NutrientAlias.objects.filter(name=alias).values_list('code', flat=True).first()
+    if code is None or CODES[code].unit != (unit or '').lower():
+        return ''
+    return code
+
 
 class Nutrient(models.Model):
     name = models.CharField(max_length=255)
     unit = models.CharField(max_length=50, help_text='e.g. g, mg, kcal')
+    code = models.CharField(
+        max_length=50, choices=CODE_CHOICES, blank=True, db_index=True,
+        help_text='Canonical nutrient; assigned from the FDC id or a NutrientAlias when left blank',
+    )
+    fdc_id = models.PositiveIntegerField(unique=True, null=True, blank=True, help_text='USDA FoodData Central nutrient id')
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self.code:
+            self.code = resolve_nutrient_code(self.name, self.unit, self.fdc_id)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'code'}
+        super().save(*args, **kwargs)
+
+
+class NutrientAlias(models.Model):
+    """A nutrient name that means the canonical nutrient `code`, stored normalized."""
+    name = models.CharField(max_length=255, unique=True)
+    code = models.CharField(max_length=50, choices=CODE_CHOICES)
+
+    class Meta:
+        verbose_name_plural = 'Nutrient aliases'
+
+    def __str__(self):
+        return f'{self.name} -> {self.code}'
+
+    def save(self, *args, **kwargs):
+        self.name = normalize_search_text(self.name)
+        super().save(*args, **kwargs)
+
 
 class IngredientNutrient(models.Model):
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='nutrients')
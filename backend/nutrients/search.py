@@ -0,0 +1,99 @@
+from difflib import SequenceMatcher
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Ingredient, normalize_search_text
+
+
+# Terms shorter than this are served by the prefix index only.
+FUZZY_MIN_LENGTH = 3
+# Upper bound of rows the non-PostgreSQL fallback re-ranks in Python.
+FALLBACK_CANDIDATES = 2000
+# Sorts after every other code point, turning a prefix into an index range.
+PREFIX_UPPER_BOUND = '\U0010ffff'
+
+POSTGRES_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS nutrients_ingredient_search_name_trgm '
+    'ON nutrients_ingredient USING gin (search_name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS nutrients_ingredient_search_name_prefix '
+    'ON nutrients_ingredient (search_name varchar_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS nutrients_ingredient_search_category_prefix '
+    'ON nutrients_ingredient (search_category varchar_pattern_ops)',
+]
+
+
+def search_ingredients(query, limit=10):
+    """
+    Rank ingredients for an autocomplete query: name prefix matches first, then
+    category prefix matches, then (for longer terms) typo-tolerant name matches.
+    """
+    term = normalize_search_text(query)
+    if not term:
+        return []
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(term, limit)
+    return _search_fallback(term, limit)
+
+
+def _prefix_rank(term):
+    return Case(
+        When(search_name__startswith=term, then=Value(2)),
+        When(search_category__startswith=term, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _search_postgresql(term, limit):
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    matches = Q(search_name__startswith=term) | Q(search_category__startswith=term)
+    if len(term) < FUZZY_MIN_LENGTH:
+        return list(
+            Ingredient.objects.filter(matches)
+            .annotate(rank=_prefix_rank(term))
+            .order_by('-rank', 'search_name')[:limit]
+        )
+    return list(
+        Ingredient.objects.filter(matches | Q(search_name__trigram_similar=term))
+        .annotate(rank=_prefix_rank(term), similarity=TrigramSimilarity('search_name', term))
+        .order_by('-rank', '-similarity', 'search_name')[:limit]
+    )
+
+
+def _prefix_range(field, prefix):
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + PREFIX_UPPER_BOUND})
+
+
+def _search_fallback(term, limit):
+    # Index range scans for the exact prefixes; typo candidates share the first
+    # two characters of the term and are re-ranked in Python.
+    results = list(
+        Ingredient.objects.filter(_prefix_range('search_name', term)).order_by('search_name')[:limit]
+    )
+    if len(results) < limit:
+        seen = {ingredient.pk for ingredient in results}
+        results += [
+            ingredient for ingredient in
+            Ingredient.objects.filter(_prefix_range('search_category', term))
+            .exclude(pk__in=seen).order_by('search_category', 'search_name')[:limit - len(results)]
+        ]
+    if len(results) >= limit or len(term) < FUZZY_MIN_LENGTH:
+        return results
+
+    seen = {ingredient.pk for ingredient in results}
+    candidates = (
+        Ingredient.objects.filter(_prefix_range('search_name', term[:2]))
+        .exclude(pk__in=seen)[:FALLBACK_CANDIDATES]
+    )
+    scored = []
+    for ingredient in candidates:
+        words = ingredient.search_name.split() or ['']
+        score = max(SequenceMatcher(None, term, word[:len(term) + 1]).ratio() for word in words)
+        score = max(score, SequenceMatcher(None, term, ingredient.search_name).ratio())
+        if score >= 0.6:
+            scored.append((-score, ingredient.search_name, ingredient))
+    scored.sort(key=lambda item: item[:2])
+    return results + [ingredient for _, _, ingredient in scored[:limit - len(results)]]
@@ -1,21 +1,26 @@
 from rest_framework import serializers
+from core.metrics import TimedListSerializer
+from core.serializers import SparseFieldsMixin
 from .models import Ingredient, IngredientNutrient, Nutrient
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ['id', 'name', 'category']
+        compact_fields = ['id', 'name']
+        list_serializer_class = TimedListSerializer
 
 
 
-class NutrientSerializer(serializers.ModelSerializer):
+class NutrientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Nutrient
-        fields = ['id', 'name', 'unit']
+        fields = ['id', 'name', 'unit', 'code']
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientNutrientSerializer(serializers.ModelSerializer):
+class IngredientNutrientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     ingredient = IngredientSerializer(read_only=True)
     nutrient = NutrientSerializer(read_only=True)
 
@@ -32,3 +37,5 @@ class IngredientNutrientSerializer(serializers.ModelSerializer):
             'ingredient', 'nutrient', 'amount_per_100g',
             'ingredient_id', 'nutrient_id',
         ]
+        compact_fields = ['ingredient', 'nutrient', 'amount_per_100g']
+        list_serializer_class = TimedListSerializer
@@ -0,0 +1,63 @@
+from django.db import connections
+from django.dispatch import Signal
+
+from core.versioning import TransactionBatch, bump_table_versions
+
+from .codes import CANONICAL_NUTRIENTS
+from .matrix import nutrient_matrix
+from .models import Nutrient, NutrientAlias, resolve_nutrient_code
+from .search import POSTGRES_INDEXES
+
+
+# Sent after bulk writes that bypass model signals (e.g. the FDC importer),
+# with `ingredient_ids` whose IngredientNutrient rows changed.
+ingredient_nutrients_bulk_changed = Signal()
+
+
+def create_search_indexes(sender, using='default', **kwargs):
+    # Trigram / pattern indexes are PostgreSQL-only, so they live outside the
+    # model's Meta.indexes and are (re)created after every migrate.
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRES_INDEXES:
+            cursor.execute(statement)
+
+
+def assign_nutrient_codes(using='default'):
+    """Give uncoded nutrients the code their FDC id or name now resolves to; returns how many changed."""
+    aliases = dict(NutrientAlias.objects.using(using).values_list('name', 'code'))
+    changed = []
+    for nutrient in Nutrient.objects.using(using).filter(code=''):
+        nutrient.code = resolve_nutrient_code(nutrient.name, nutrient.unit, nutrient.fdc_id, aliases)
+        if nutrient.code:
+            changed.append(nutrient)
+    if changed:
+        Nutrient.objects.using(using).bulk_update(changed, ['code'], batch_size=500)
+        bump_table_versions(Nutrient)
+    return len(changed)
+
+
+def seed_nutrient_aliases(sender, using='default', **kwargs):
+    NutrientAlias.objects.using(using).bulk_create(
+        [NutrientAlias(name=alias, code=nutrient.code) for nutrient in CANONICAL_NUTRIENTS for alias in nutrient.aliases],
+        ignore_conflicts=True,
+    )
+    assign_nutrient_codes(using)
+
+
+def recode_nutrients_on_alias_save(sender, instance, using='default', **kwargs):
+    assign_nutrient_codes(using)
+
+
+# A transaction's saves and deletes bump the IngredientNutrient version once
+# on commit, so their ingredients are noted once as well.
+_changed_ingredients = TransactionBatch(nutrient_matrix.note_changes)
+
+
+def note_ingredient_nutrient_change(sender, instance, using='default', **kwargs):
+    # Lets the matrix re-read just the changed ingredients after the commit.
+    # Bulk writes bump without this (and change Nutrient too), which makes
+    # the matrix reload.
+    _changed_ingredients.add({instance.ingredient_id}, using)
@@ -1,10 +1,18 @@
+import json
+import re
+import tempfile
+from io import StringIO
+from pathlib import Path
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from .models import Ingredient, Nutrient, IngredientNutrient
+from .matrix import nutrient_matrix
+from .models import Ingredient, Nutrient, IngredientNutrient, NutrientAlias
+from .vectors import NutrientRegistry, nutrient_registry
 
 User = get_user_model()
 
@@ -14,13 +22,15 @@ class NutrientsAppTests(TestCase):
         self.user = User.objects.create_user(username='testuser', password='password123')
         self.client = APIClient()
 
-        self.ingredient = Ingredient.objects.create(name='Apple', category='Fruit')
-        self.nutrient = Nutrient.objects.create(name='Sugar', unit='g')
-        self.link = IngredientNutrient.objects.create(
-            ingredient=self.ingredient,
-            nutrient=self.nutrient,
-            amount_per_100g=10.0
-        )
+        # Committed, so the table versions move past the previous test's.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient = Ingredient.objects.create(name='Apple', category='Fruit')
+            self.nutrient = Nutrient.objects.create(name='Sugar', unit='g')
+            self.link = IngredientNutrient.objects.create(
+                ingredient=self.ingredient,
+                nutrient=self.nutrient,
+                amount_per_100g=10.0
+            )
 
     def test_ingredient_str_method(self):
         self.assertEqual(str(self.ingredient), 'Apple')
@@ -46,6 +56,52 @@ class NutrientsAppTests(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['name'], 'Apple')
 
+    def test_ingredient_list_cursor_pagination(self):
+        Ingredient.objects.create(name='Banana', category='Fruit')
+        Ingredient.objects.create(name='Cherry', category='Fruit')
+
+        names = []
+        url = '/api/ingredients/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data), 2)
+            names.extend(item['name'] for item in response.data)
+            next_link = re.search(r'<([^>]+)>; rel="next"', response.headers.get('Link', ''))
+            url = next_link.group(1) if next_link else None
+
+        self.assertEqual(names, ['Apple', 'Banana', 'Cherry'])
+
+    def test_ingredient_search_prefix_and_category(self):
+        Ingredient.objects.create(name='Apricot', category='Fruit')
+        Ingredient.objects.create(name='Crème Fraîche', category='Dairy')
+        Ingredient.objects.create(name='Almond', category='Nuts')
+
+        response = self.client.get('/api/ingredients/search/?q=ap')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in response.data], ['Apple', 'Apricot'])
+
+        response = self.client.get('/api/ingredients/search/?q=CREME')
+        self.assertEqual([item['name'] for item in response.data], ['Crème Fraîche'])
+
+        response = self.client.get('/api/ingredients/search/?q=dai')
+        self.assertEqual([item['name'] for item in response.data], ['Crème Fraîche'])
+
+    def test_ingredient_search_typo_tolerant(self):
+        Ingredient.objects.create(name='Banana', category='Fruit')
+
+        response = self.client.get('/api/ingredients/search/?q=bananna')
+        self.assertEqual([item['name'] for item in response.data], ['Banana'])
+
+        response = self.client.get('/api/ingredients/search/?q=')
+        self.assertEqual(response.data, [])
+
+    def test_ingredient_search_limit(self):
+        for i in range(5):
+            Ingredient.objects.create(name=f'Apple {i}', category='Fruit')
+        response = self.client.get('/api/ingredients/search/?q=apple&limit=3')
+        self.assertEqual(len(response.data), 3)
+
     def test_create_ingredient_unauthenticated(self):
         data = {'name': 'Banana', 'category': 'Fruit'}
         response = self.client.post('/api/ingredients/', data, format='json')
@@ -89,6 +145,75 @@ class NutrientsAppTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Nutrient.objects.count(), 2)
 
+    def test_nutrient_codes_come_from_aliases_and_units(self):
+        self.assertEqual(self.nutrient.code, 'sugars')
+        self.assertEqual(Nutrient.objects.create(name='Carbohydrate, by difference', unit='G').code, 'carbohydrate')
+        self.assertEqual(Nutrient.objects.create(name='Calories', unit='kJ').code, '')
+
+        vitamin = Nutrient.objects.create(name='Ascorbic acid', unit='mg')
+        self.assertEqual(vitamin.code, '')
+        Nutrient.objects.create(name='Salt sodium', unit='mg')
+        NutrientAlias.objects.create(name='Salt Sodium', code='sodium')
+        self.assertEqual(
+            dict(Nutrient.objects.filter(unit='mg').values_list('name', 'code')),
+            {'Ascorbic acid': '', 'Salt sodium': 'sodium'},
+        )
+
+        response = self.client.get(f'/api/nutrients/{self.nutrient.pk}/')
+        self.assertEqual(response.data['code'], 'sugars')
+
+    def test_nutrient_matrix_products_and_incremental_refresh(self):
+        banana = Ingredient.objects.create(name='Banana')
+        IngredientNutrient.objects.create(ingredient=banana, nutrient=self.nutrient, amount_per_100g=12.0)
+        unknown = Ingredient.objects.create(name='Water')
+
+        keys, totals = nutrient_matrix.vectors(
+            [7, 7, 3, 3], [self.ingredient.pk, banana.pk, self.ingredient.pk, unknown.pk], [100, 50, 200, 500]
+        )
+        self.assertEqual(keys.tolist(), [3, 7])
+        self.assertAlmostEqual(nutrient_registry.amount(totals[0], 'sugars'), 20.0)
+        self.assertAlmostEqual(nutrient_registry.amount(totals[1], 'sugars'), 16.0)
+
+        # A committed edit of this process only re-reads the changed ingredient.
+        loads = nutrient_matrix.loads
+        with self.captureOnCommitCallbacks(execute=True):
+            self.link.amount_per_100g = 30.0
+            self.link.save()
+        vector = nutrient_matrix.vector_map([1], [self.ingredient.pk], [100])[1]
+        self.assertAlmostEqual(nutrient_registry.amount(vector, 'sugars'), 30.0)
+        self.assertEqual(nutrient_matrix.loads, loads)
+
+        # Several writes in one transaction bump the version once.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.link.amount_per_100g = 40.0
+            self.link.save()
+            IngredientNutrient.objects.create(ingredient=unknown, nutrient=self.nutrient, amount_per_100g=5.0)
+        vector = nutrient_matrix.vector_map([1, 2], [self.ingredient.pk, unknown.pk], [100, 100])[1]
+        self.assertAlmostEqual(nutrient_registry.amount(vector, 'sugars'), 40.0)
+        self.assertEqual(nutrient_matrix.loads, loads)
+
+        # Anything the matrix wasn't told about reloads it.
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientNutrient.objects.filter(ingredient=banana).update(amount_per_100g=1.0)
+            Nutrient.objects.create(name='Potassium', unit='mg')
+        vector = nutrient_matrix.vector_map([1], [banana.pk], [100])[1]
+        self.assertAlmostEqual(nutrient_registry.amount(vector, 'sugars'), 1.0)
+        self.assertEqual(nutrient_matrix.loads, loads + 1)
+
+    def test_registry_labels_do_not_depend_on_the_order_seen(self):
+        nutrients = [('Iron', 'mg', ''), ('Iron', 'g', ''), ('Iron', 'µg', ''), ('Zinc', 'mg', ''), ('Protein', 'mg', '')]
+        labels = []
+        for order in (nutrients, nutrients[::-1]):
+            registry = NutrientRegistry()
+            positions = {nutrient: registry.position(*nutrient) for nutrient in order}
+            labels.append({nutrient: registry.labels[position][0] for nutrient, position in positions.items()})
+        self.assertEqual(labels[0], labels[1])
+        self.assertEqual(labels[0][('Iron', 'g', '')], 'Iron (g)')
+        self.assertEqual(labels[0][('Iron', 'mg', '')], 'Iron (mg)')
+        self.assertEqual(labels[0][('Zinc', 'mg', '')], 'Zinc')
+        self.assertEqual(labels[0][('Protein', 'mg', '')], 'Protein (mg)')
+        self.assertEqual(registry.labels[registry.code_position('protein')][0], 'Protein')
+
     def test_get_ingredient_nutrient_list(self):
         response = self.client.get('/api/ingredient_nutrients/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -117,4 +242,102 @@ class NutrientsAppTests(TestCase):
         self.client.force_authenticate(user=self.user)
         response = self.client.delete(f'/api/ingredient_nutrients/{self.link.pk}/')
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(IngredientNutrient.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(IngredientNutrient.objects.count(), 0)
+
+
+FDC_FILES = {
+    'food_category.csv': 'id,code,description\n9,0900,Fruits and Fruit Juices\n',
+    'nutrient.csv': (
+        'id,name,unit_name,nutrient_nbr,rank\n'
+        '1003,Protein,G,203,600\n'
+        '1008,Energy,KCAL,208,300\n'
+        '1062,Energy,kJ,268,400\n'
+    ),
+    'food.csv': (
+        'fdc_id,data_type,description,food_category_id,publication_date\n'
+        '100,foundation_food,"Apples, raw",9,2020-01-01\n'
+        '101,foundation_food,"Bananas, raw",9,2020-01-01\n'
+    ),
+    'food_nutrient.csv': (
+        'id,fdc_id,nutrient_id,amount\n'
+        '1,100,1003,0.3\n'
+        '2,100,1008,52\n'
+        '3,101,1003,1.1\n'
+        '4,101,1062,371\n'
+        '5,999,1003,5\n'
+    ),
+}
+
+
+class ImportNutrientsCommandTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp.name) / 'fdc'
+        self.source.mkdir()
+        for name, content in FDC_FILES.items():
+            (self.source / name).write_text(content)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_import_csv_directory_is_idempotent(self):
+        for _ in range(2):
+            call_command('import_nutrients', str(self.source), '--batch-size', '2', stdout=StringIO())
+
+        self.assertEqual(Ingredient.objects.count(), 2)
+        self.assertEqual(Nutrient.objects.count(), 3)
+        self.assertEqual(IngredientNutrient.objects.count(), 4)
+
+        apple = Ingredient.objects.get(fdc_id=100)
+        self.assertEqual(apple.category, 'Fruits and Fruit Juices')
+        self.assertEqual(apple.search_name, 'apples, raw')
+        self.assertEqual(
+            set(Nutrient.objects.values_list('name', 'unit', 'code')),
+            {('Protein', 'g', 'protein'), ('Energy', 'kcal', 'energy'), ('Energy (kj)', 'kj', '')},
+        )
+        self.assertAlmostEqual(apple.nutrients.get(nutrient__fdc_id=1008).amount_per_100g, 52.0)
+        self.assertFalse(Path(str(self.source) + '.import-state.json').exists())
+
+    def test_import_resumes_from_checkpoint(self):
+        checkpoint = Path(self.tmp.name) / 'state.json'
+        checkpoint.write_text(json.dumps({
+            'source': str(self.source.resolve()),
+            'stages': {'nutrients': 3, 'foods': 1},
+        }))
+        Nutrient.objects.create(name='Protein', unit='g', fdc_id=1003)
+
+        call_command('import_nutrients', str(self.source), '--checkpoint', str(checkpoint), stdout=StringIO())
+
+        self.assertEqual(list(Ingredient.objects.values_list('fdc_id', flat=True)), [101])
+        self.assertEqual(IngredientNutrient.objects.count(), 1)
+        self.assertFalse(checkpoint.exists())
+
+    def test_import_json_lines(self):
+        source = Path(self.tmp.name) / 'foods.jsonl'
+        source.write_text(json.dumps({
+            'fdcId': 200,
+            'description': 'Oats',
+            'foodCategory': {'description': 'Cereal Grains'},
+            'foodNutrients': [{'nutrient': {'id': 1003, 'name': 'Protein', 'unitName': 'g'}, 'amount': 13.2}],
+        }) + '\n')
+
+        call_command('import_nutrients', str(source), stdout=StringIO())
+
+        oats = Ingredient.objects.get(fdc_id=200)
+        self.assertEqual(oats.category, 'Cereal Grains')
+        self.assertAlmostEqual(oats.nutrients.get().amount_per_100g, 13.2)
+
+    def test_import_json_document(self):
+        source = Path(self.tmp.name) / 'foods.json'
+        source.write_text(json.dumps({'FoundationFoods': [{
+            'fdcId': 300,
+            'description': 'Lentils',
+            'foodNutrients': [{'nutrient': {'id': 1003, 'name': 'Protein', 'unitName': 'g'}, 'amount': 24.6}],
+        }]}))
+
+        call_command('import_nutrients', str(source), stdout=StringIO())
+
+        lentils = Ingredient.objects.get(fdc_id=300)
+        self.assertEqual(lentils.name, 'Lentils')
+        self.assertAlmostEqual(lentils.nutrients.get().amount_per_100g, 24.6)
@@ -0,0 +1,96 @@
+"""
+Nutrient vectors.
+
+Meal, entry and daily totals are held as float64 NumPy arrays with one
+position per nutrient instead of `{name: {'amount', 'unit'}}` dicts, so
+adding up or scaling totals is array arithmetic. `nutrient_registry` assigns
+the positions: the canonical codes come first, in CANONICAL_NUTRIENTS order
+(energy is always position 0), and every uncoded nutrient name/unit pair gets
+the next free position the first time this process sees it (the nutrient
+matrix registers all of them on load, in primary key order). Positions never
+change while the process runs, so vectors built at different times line up;
+a vector built before the registry grew is padded with zeros by `resize`.
+
+Vectors are turned back into dicts only for responses, keyed by the canonical
+name for coded nutrients and by the nutrient's own name otherwise.
+"""
+import threading
+
+import numpy as np
+
+from .codes import CANONICAL_NUTRIENTS
+
+
+class NutrientRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.positions = {nutrient.code: index for index, nutrient in enumerate(CANONICAL_NUTRIENTS)}
+        # (name, unit, code) per position.
+        self.labels = [(nutrient.name, nutrient.unit, nutrient.code) for nutrient in CANONICAL_NUTRIENTS]
+        # Positions by nutrient name, as given (labels may carry a unit).
+        self._names = {nutrient.name: [index] for index, nutrient in enumerate(CANONICAL_NUTRIENTS)}
+
+    @property
+    def size(self):
+        return len(self.labels)
+
+    def position(self, name, unit, code=''):
+        key = code or (name, unit)
+        position = self.positions.get(key)
+        if position is None:
+            with self._lock:
+                position = self.positions.get(key)
+                if position is None:
+                    # Same name in another unit (or a canonical name): every
+                    # such nutrient is labelled with its unit, the one seen
+                    # first included, so labels don't depend on the order.
+                    clashes = self._names.setdefault(name, [])
+                    for index in clashes:
+                        if not self.labels[index][2]:
+                            self.labels[index] = (f'{name} ({self.labels[index][1]})', self.labels[index][1], '')
+                    # Label before position, so readers never see a position without one.
+                    self.labels.append((f'{name} ({unit})' if clashes else name, unit, ''))
+                    position = self.positions[key] = len(self.labels) - 1
+                    clashes.append(position)
+        return position
+
+    def code_position(self, code):
+        return self.positions[code]
+
+    def zeros(self):
+        return np.zeros(self.size)
+
+    def resize(self, vector):
+        return vector if len(vector) >= self.size else np.pad(vector, (0, self.size - len(vector)))
+
+    def vector(self, rows):
+        """Build a vector from `(name, unit, code, amount)` rows; amounts of one position are summed."""
+        rows = list(rows)
+        positions = [self.position(name, unit, code) for name, unit, code, _ in rows]
+        vector = self.zeros()
+        np.add.at(vector, positions, [amount for *_, amount in rows])
+        return vector
+
+    def add(self, *vectors):
+        total = self.zeros()
+        for vector in vectors:
+            total[:len(vector)] += vector
+        return total
+
+    def amount(self, vector, code):
+        position = self.code_position(code)
+        return float(vector[position]) if position < len(vector) else 0.0
+
+    def as_dict(self, vector):
+        """`{name: {'amount', 'unit', 'code'}}` for every non-zero position, in position order."""
+        labels = self.labels
+        return {
+            labels[position][0]: {
+                'amount': float(vector[position]), 'unit': labels[position][1], 'code': labels[position][2],
+            }
+            for position in np.flatnonzero(vector)
+        }
+
+
+nutrient_registry = NutrientRegistry()
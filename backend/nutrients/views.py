@@ -3,19 +3,29 @@ from rest_framework.response import Response
 from rest_framework.generics import get_object_or_404
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
+from django.utils.decorators import method_decorator
+from core.pagination import KeysetPagination, PAGINATION_PARAMETERS
+from core.serializers import SPARSE_FIELDS_PARAMETERS, optimize_queryset
+from core.cache import cached_response
+from core.versioning import conditional_on
 from .models import Ingredient, Nutrient, IngredientNutrient
 from .serializers import IngredientSerializer, NutrientSerializer, IngredientNutrientSerializer
+from .search import search_ingredients
 
 
 class IngredientListView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-    @extend_schema(summary="List ingredients", tags=['Ingredients'])
+    @method_decorator(conditional_on(Ingredient))
+    @method_decorator(cached_response(Ingredient))
+    @extend_schema(summary="List ingredients", parameters=PAGINATION_PARAMETERS + SPARSE_FIELDS_PARAMETERS, tags=['Ingredients'])
     def get(self, request):
-        ingredients = Ingredient.objects.all()
-        serializer = IngredientSerializer(ingredients, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        ingredients = paginator.paginate_queryset(Ingredient.objects.all(), request, view=self)
+        serializer = IngredientSerializer(ingredients, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     @extend_schema(summary="Create ingredient", request=IngredientSerializer, tags=['Ingredients'])
     def post(self, request):
@@ -26,6 +36,32 @@ class IngredientListView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class IngredientSearchView(APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    max_limit = 50
+
+    @extend_schema(
+        summary="Search ingredients",
+        description="Autocomplete over ingredient name and category: prefix matches first, "
+                    "then typo-tolerant name matches for terms of three or more characters.",
+        parameters=[
+            OpenApiParameter(name='q', description='Search term', required=True, type=OpenApiTypes.STR),
+            OpenApiParameter(name='limit', description='Maximum number of results (default 10, max 50)', required=False, type=OpenApiTypes.INT),
+            *SPARSE_FIELDS_PARAMETERS,
+        ],
+        responses={200: IngredientSerializer(many=True)},
+        tags=['Ingredients']
+    )
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            return Response({'limit': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        ingredients = search_ingredients(request.query_params.get('q', ''), limit=max(limit, 1))
+        serializer = IngredientSerializer(ingredients, many=True, context={'request': request})
+        return Response(serializer.data)
+
+
 class IngredientDetailView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
@@ -48,11 +84,14 @@ class IngredientDetailView(APIView):
 class NutrientListView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-    @extend_schema(summary="List nutrients", tags=['Nutrients'])
+    @method_decorator(conditional_on(Nutrient))
+    @method_decorator(cached_response(Nutrient))
+    @extend_schema(summary="List nutrients", parameters=PAGINATION_PARAMETERS + SPARSE_FIELDS_PARAMETERS, tags=['Nutrients'])
     def get(self, request):
-        nutrients = Nutrient.objects.all()
-        serializer = NutrientSerializer(nutrients, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        nutrients = paginator.paginate_queryset(Nutrient.objects.all(), request, view=self)
+        serializer = NutrientSerializer(nutrients, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     @extend_schema(summary="Create nutrient", tags=['Nutrients'])
     def post(self, request):
@@ -90,11 +129,18 @@ class NutrientDetailView(APIView):
 class IngredientNutrientListView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-    @extend_schema(summary="List ingredient-nutrient links", tags=['Ingredients'])
+    @method_decorator(conditional_on(IngredientNutrient, Ingredient, Nutrient))
+    @method_decorator(cached_response(IngredientNutrient, Ingredient, Nutrient))
+    @extend_schema(summary="List ingredient-nutrient links", parameters=PAGINATION_PARAMETERS + SPARSE_FIELDS_PARAMETERS, tags=['Ingredients'])
     def get(self, request):
-        ingredient_nutrients = IngredientNutrient.objects.all()
-        serializer = IngredientNutrientSerializer(ingredient_nutrients, many=True)
-        return Response(serializer.data)
+        context = {'request': request}
+        paginator = KeysetPagination()
+        ingredient_nutrients = paginator.paginate_queryset(
+            optimize_queryset(IngredientNutrient.objects.all(), IngredientNutrientSerializer(context=context)),
+            request, view=self
+        )
+        serializer = IngredientNutrientSerializer(ingredient_nutrients, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
 
     @extend_schema(summary="Link nutrient to ingredient", tags=['Ingredients'])
     def post(self, request):
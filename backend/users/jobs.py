@@ -0,0 +1,7 @@
+from core.jobs import job
+from . import pictures
+
+
+@job
+def process_profile_picture(profile_id, name):
+    pictures.process_profile_picture(profile_id, name)
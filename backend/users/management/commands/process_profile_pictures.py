@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from users.models import UserProfile
+from users.pictures import needs_processing, process_profile_picture
+
+
+class Command(BaseCommand):
+    help = 'Render the thumbnails of every profile picture that has not been processed yet, without the job queue.'
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        for profile in UserProfile.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True).iterator():
+            if not needs_processing(profile):
+                continue
+            try:
+                process_profile_picture(profile.pk, profile.profile_picture.name)
+                processed += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'Profile {profile.pk}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} profile pictures, {failed} failed'))
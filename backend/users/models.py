@@ -38,6 +38,8 @@ class UserProfile(models.Model):
     date_of_birth = models.DateField(null=True, blank=True)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    # Written by users.pictures: {'source': picture name, 'sizes': {size: {extension: file name}}}
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     activity_level = models.IntegerField(choices=ACTIVITY_CHOICES, default=2)
     target_weight = models.DecimalField(max_digits=5, decimal_places=2, help_text="Target weight in kg")
@@ -0,0 +1,123 @@
+"""
+Profile picture processing.
+
+Uploads are only sanity-checked during the request (size, format and pixel
+count read from the header). The picture is then decoded by a background job
+(users.jobs): EXIF orientation is applied, all metadata is dropped by
+re-encoding, and square thumbnails are rendered for every size in
+PROFILE_PICTURE_SIZES as WebP and JPEG.
+
+Every file is named after a hash of its content, so its URL never changes
+meaning and can be cached forever. The processed files are recorded in
+`UserProfile.profile_picture_variants`, and the original upload is replaced
+by a metadata-free copy capped at PROFILE_PICTURE_MAX_DIMENSION.
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from core.authentication import invalidate_cached_user
+from .models import UserProfile
+
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+VARIANT_FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+                   'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})}
+
+
+def inspect_upload(upload):
+    """Return a list of problems with an uploaded picture, reading only its header."""
+    if upload.size > settings.PROFILE_PICTURE_MAX_UPLOAD_BYTES:
+        return [f'The picture may be at most {settings.PROFILE_PICTURE_MAX_UPLOAD_BYTES // (1024 * 1024)} MB.']
+    try:
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, OSError):
+        return ['Upload a valid image.']
+    finally:
+        upload.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        return [f'Upload a {", ".join(sorted(ALLOWED_FORMATS))} image.']
+    if width * height > settings.PROFILE_PICTURE_MAX_PIXELS:
+        return ['The picture has too many pixels.']
+    return []
+
+
+def _encode(image, extension):
+    image_format, options = VARIANT_FORMATS[extension]
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    output = BytesIO()
+    # No exif/icc_profile arguments: the re-encoded file carries no metadata.
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def render_variants(source):
+    """Decode `source` and return `{label: {extension: bytes}}`, including the capped 'original'."""
+    with Image.open(source) as image:
+        image.seek(0)  # first frame of animations
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+
+    original = image.copy()
+    original.thumbnail((settings.PROFILE_PICTURE_MAX_DIMENSION,) * 2, Image.Resampling.LANCZOS)
+    variants = {'original': {'jpeg': _encode(original, 'jpeg')}}
+    for label, size in settings.PROFILE_PICTURE_SIZES.items():
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        variants[label] = {extension: _encode(thumbnail, extension) for extension in VARIANT_FORMATS}
+    return variants
+
+
+def _store(user_id, label, extension, data):
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    name = f'profiles/{user_id}/{label}-{digest}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def process_profile_picture(profile_id, name):
+    """
+    Render and store the variants of picture `name` for the profile, unless it
+    has been replaced in the meantime. Returns True when the profile was updated.
+    """
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if profile is None or profile.profile_picture.name != name:
+        return False
+    with default_storage.open(name) as source:
+        rendered = render_variants(source)
+
+    stored = {
+        label: {extension: _store(profile.user_id, label, extension, data) for extension, data in files.items()}
+        for label, files in rendered.items()
+    }
+    original = stored.pop('original')['jpeg']
+    variants = {'source': original, 'sizes': stored}
+    updated = UserProfile.objects.filter(pk=profile_id, profile_picture=name).update(
+        profile_picture=original, profile_picture_variants=variants
+    )
+    if not updated:
+        return False
+    # update() skips the profile signals. This runs in the job worker, so it
+    # reaches the web processes only through the shared auth cache.
+    invalidate_cached_user(profile.user_id)
+
+    previous = {name, profile.profile_picture_variants.get('source')} | _variant_names(profile.profile_picture_variants)
+    for stale in previous - _variant_names(variants) - {original, None}:
+        default_storage.delete(stale)
+    return True
+
+
+def _variant_names(variants):
+    return {name for files in variants.get('sizes', {}).values() for name in files.values()}
+
+
+def needs_processing(profile):
+    return bool(profile.profile_picture) and profile.profile_picture.name != profile.profile_picture_variants.get('source')
@@ -1,9 +1,14 @@
 from rest_framework import serializers
+from django.core.files.storage import default_storage
+from core.metrics import TimedDataMixin
+from core.serializers import SparseFieldsMixin
 from .models import CustomUser, UserProfile
+from .pictures import inspect_upload, needs_processing
+from .signals import profile_targets_changed
 from datetime import date
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(TimedDataMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password_repeat = serializers.CharField(write_only=True)
 
@@ -44,27 +49,29 @@ class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
             model = CustomUser
             fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone_number', 'address']
             read_only_fields = ['id', 'username', 'email']
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['first_name', 'last_name', 'phone_number', 'address']
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     age = serializers.SerializerMethodField()
     bmi = serializers.SerializerMethodField()
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
         fields = '__all__'
         read_only_fields = ['user', 'created_at', 'updated_at']
+        compact_fields = ['weight', 'target_weight', 'target_calories', 'target_protein', 'target_carbs', 'target_fat']
 
     def get_age(self, obj):
          if obj.date_of_birth:
@@ -76,13 +83,35 @@ class UserProfileSerializer(serializers.ModelSerializer):
             height_m = obj.height / 100
             return round(float(obj.weight) / (height_m ** 2), 2)
         return None
+
+    def get_profile_picture_variants(self, obj) -> dict:
+        """{size: {'webp': url, 'jpeg': url}}; empty until the current picture has been processed."""
+        if not obj.profile_picture or needs_processing(obj):
+            return {}
+        request = self.context.get('request')
+        variants = {}
+        for size, files in obj.profile_picture_variants.get('sizes', {}).items():
+            urls = {extension: default_storage.url(name) for extension, name in files.items()}
+            if request is not None:
+                urls = {extension: request.build_absolute_uri(url) for extension, url in urls.items()}
+            variants[size] = urls
+        return variants
     
 
-class UserProfileUpdateSerializer(serializers.ModelSerializer):
+class UserProfileUpdateSerializer(TimedDataMixin, serializers.ModelSerializer):
+    TARGET_FIELDS = ('target_calories', 'target_protein', 'target_carbs', 'target_fat')
+
     class Meta:
         model = UserProfile
         exclude = ['user', 'created_at', 'updated_at']
-        
+
+    def validate_profile_picture(self, value):
+        if value:
+            errors = inspect_upload(value)
+            if errors:
+                raise serializers.ValidationError(errors)
+        return value
+
     def validate(self, attrs):
         if 'target_weight' in attrs and 'weight' in attrs:
             if attrs['fitness_goal'] == 'lose' and attrs['target_weight'] >= attrs['weight']:
@@ -91,14 +120,24 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Target weight should be greater than current weight for weight gain")
         return attrs
 
+    def update(self, instance, validated_data):
+        targets_changed = any(
+            field in validated_data and validated_data[field] != getattr(instance, field) for field in self.TARGET_FIELDS
+        )
+        profile = super().update(instance, validated_data)
+        if targets_changed:
+            profile_targets_changed.send(sender=UserProfile, profile=profile)
+        return profile
+
 
-class UserWithProfileSerializer(serializers.ModelSerializer):
+class UserWithProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
     
     class Meta:
         model = CustomUser
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone_number', 'address', 'profile']
         read_only_fields = ['id', 'username', 'email']
+        compact_fields = ['id', 'username', 'profile']
 
 
 class CheckAuthResponseSerializer(serializers.Serializer):
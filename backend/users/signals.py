@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from core.authentication import invalidate_cached_user
+from .models import CustomUser, UserProfile
+from .jobs import process_profile_picture
+from .pictures import needs_processing
+
+
+# Sent with `profile` after UserProfileUpdateSerializer changed any target_* field.
+profile_targets_changed = Signal()
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def process_new_profile_picture(sender, instance, **kwargs):
+    if needs_processing(instance):
+        process_profile_picture.enqueue(profile_id=instance.pk, name=instance.profile_picture.name)
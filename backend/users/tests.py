@@ -1,15 +1,31 @@
 import datetime
-from django.test import TestCase
+import tempfile
+from io import BytesIO
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.test import TestCase, override_settings
+from PIL import Image
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from core.authentication import user_cache, user_cache_key
+from core.jobs import Worker
+from core.models import Job
 from .models import UserProfile
+from .pictures import process_profile_picture
 from .serializers import RegisterSerializer, UserProfileSerializer, UserProfileUpdateSerializer
 
 User = get_user_model()
 
+# A cache every process would share, as AUTH_CACHE_BACKEND is in production.
+SHARED_AUTH_CACHE = {
+    **settings.CACHES, 'auth': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-tests'},
+}
+
 class UsersAppTests(TestCase):
 
     def setUp(self):
@@ -157,6 +173,67 @@ class UsersAppTests(TestCase):
         self.assertEqual(response.data['username'], 'testuser')
         self.assertEqual(response.data['profile']['height'], 180)
 
+    def test_profile_view_loads_user_and_profile_in_one_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/profile/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['profile']['target_calories'], 2000)
+
+        response = self.client.post('/api/profile/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @override_settings(CACHES=SHARED_AUTH_CACHE)
+    def test_authenticated_reads_are_served_from_the_user_cache(self):
+        user_cache().clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.client.get('/api/auth/check/')
+        with self.assertNumQueries(0):
+            check = self.client.get('/api/auth/check/')
+            profile = self.client.get('/api/profile/')
+        self.assertEqual(check.data['user']['profile']['height'], 180)
+        self.assertEqual(profile.data['username'], 'testuser')
+
+    @override_settings(CACHES=SHARED_AUTH_CACHE)
+    def test_user_cache_holds_no_password_hash(self):
+        user_cache().clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.client.get('/api/profile/')
+        entry = user_cache().get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', entry['fields'])
+        self.assertNotIn(self.user.password, str(entry))
+
+        # Saving the cached user leaves the deferred password alone.
+        response = self.client.patch('/api/auth/user/update/', {'first_name': 'Test'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Test')
+        self.assertTrue(self.user.check_password('password123'))
+
+    @override_settings(CACHES=SHARED_AUTH_CACHE)
+    def test_user_cache_is_invalidated_on_save(self):
+        user_cache().clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.client.get('/api/profile/')
+
+        response = self.client.patch('/api/auth/profile/update/', {'target_calories': 2400}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/profile/').data['profile']['target_calories'], 2400)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_view_compact_and_sparse(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/profile/?view=compact')
+        self.assertEqual(set(response.data), {'id', 'username', 'profile'})
+        self.assertNotIn('height', response.data['profile'])
+        self.assertEqual(response.data['profile']['target_calories'], 2000)
+
+        response = self.client.get('/api/profile/?fields=username,profile.bmi')
+        self.assertEqual(response.data, {'username': 'testuser', 'profile': {'bmi': 24.69}})
+
     def test_profile_view_unauthenticated(self):
         response = self.client.get('/api/profile/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -190,4 +267,84 @@ class UsersAppTests(TestCase):
         self.client.force_authenticate(user=self.user)
         response = self.client.post('/api/auth/logout/', {}, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn('Goodbye testuser', response.data['message'])
\ No newline at end of file
+        self.assertIn('Goodbye testuser', response.data['message'])
+
+
+class ProfilePictureTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='pictured', password='password123')
+        self.profile = UserProfile.objects.create(
+            user=self.user, height=170, weight=70, gender='F', target_weight=65,
+            target_calories=1800, target_protein=120, target_carbs=200, target_fat=60,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, width=800, height=600):
+        image = Image.new('RGB', (width, height), 'red')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90 degrees
+        exif[0x010F] = 'Camera Maker'
+        output = BytesIO()
+        image.save(output, 'JPEG', exif=exif)
+        picture = SimpleUploadedFile('me.jpg', output.getvalue(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch('/api/auth/profile/update/', {'profile_picture': picture}, format='multipart')
+        return response, callbacks
+
+    def test_upload_is_processed_off_the_request(self):
+        response, callbacks = self.upload()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.client.get('/api/auth/profile/update/').data['profile_picture_variants'], {})
+        job = Job.objects.get()
+        self.assertEqual(job.kwargs, {'profile_id': self.profile.pk, 'name': self.profile.profile_picture.name})
+
+        self.assertEqual(Worker().run_pending(), 1)
+        self.profile.refresh_from_db()
+        with default_storage.open(self.profile.profile_picture.name) as original:
+            stripped = Image.open(original)
+            self.assertEqual(stripped.size, (600, 800))
+            self.assertEqual(dict(stripped.getexif()), {})
+
+        variants = self.client.get('/api/auth/profile/update/').data['profile_picture_variants']
+        self.assertEqual(set(variants), {'small', 'medium', 'large'})
+        self.assertRegex(variants['small']['webp'], r'/media/profiles/\d+/small-[0-9a-f]{16}\.webp$')
+        with default_storage.open(self.profile.profile_picture_variants['sizes']['medium']['jpeg']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (160, 160))
+
+    @override_settings(CACHES=SHARED_AUTH_CACHE)
+    def test_processed_picture_reaches_cached_token_users(self):
+        user_cache().clear()
+        token = APIClient()
+        token.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.upload()
+        self.assertEqual(token.get('/api/profile/').data['profile']['profile_picture_variants'], {})
+
+        self.assertEqual(Worker().run_pending(), 1)
+        self.profile.refresh_from_db()
+        for url in ('/api/profile/', '/api/auth/check/'):
+            response = token.get(url)
+            profile = response.data['user']['profile'] if 'user' in response.data else response.data['profile']
+            self.assertEqual(set(profile['profile_picture_variants']), {'small', 'medium', 'large'})
+            self.assertTrue(profile['profile_picture'].endswith(self.profile.profile_picture.name))
+
+    def test_replaced_picture_is_not_applied(self):
+        self.upload()
+        self.profile.refresh_from_db()
+        first = self.profile.profile_picture.name
+        self.upload()
+        self.assertFalse(process_profile_picture(self.profile.pk, first))
+
+    def test_invalid_upload_is_rejected(self):
+        picture = SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.patch('/api/auth/profile/update/', {'profile_picture': picture}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('profile_picture', response.data)
@@ -3,9 +3,9 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     RegisterView,
     LoginView,
-    ProfileView,
+    AsyncProfileView,
     LogoutView,
-    CheckAuthView,
+    AsyncCheckAuthView,
     UserUpdateView,
     UserProfileView,
 )
@@ -17,8 +17,8 @@ urlpatterns = [
     path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
-    path('auth/check/', CheckAuthView.as_view(), name='check_auth'),
-    path('profile/', ProfileView.as_view(), name='profile'),
+    path('auth/check/', AsyncCheckAuthView.as_view(), name='check_auth'),
+    path('profile/', AsyncProfileView.as_view(), name='profile'),
     path('auth/user/update/', UserUpdateView.as_view(), name='user_update'),
     path('auth/profile/update/', UserProfileView.as_view(), name='profile_update'),
 ]
\ No newline at end of file
@@ -5,6 +5,8 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
 from drf_spectacular.utils import extend_schema
+from core.async_views import AsyncReadView, json_response
+from core.serializers import SPARSE_FIELDS_PARAMETERS
 from .models import UserProfile
 from .serializers import (
     RegisterSerializer, UserSerializer, UserWithProfileSerializer,
@@ -51,7 +53,7 @@ class ProfileView(generics.RetrieveAPIView):
     serializer_class = UserWithProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    @extend_schema(summary="Get current user data", tags=['User Profile'])
+    @extend_schema(summary="Get current user data", parameters=SPARSE_FIELDS_PARAMETERS, tags=['User Profile'])
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -59,6 +61,14 @@ class ProfileView(generics.RetrieveAPIView):
         return self.request.user
 
 
+class AsyncProfileView(AsyncReadView):
+    sync_view_class = ProfileView
+    user_select_related = ('profile',)
+
+    async def get(self, request):
+        return json_response(UserWithProfileSerializer(request.user, context={'request': request}).data)
+
+
 class UserUpdateView(generics.UpdateAPIView):
     serializer_class = UserUpdateSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -87,7 +97,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
             return UserProfileUpdateSerializer
         return UserProfileSerializer
 
-    @extend_schema(summary="Get fitness profile", tags=['User Profile'])
+    @extend_schema(summary="Get fitness profile", parameters=SPARSE_FIELDS_PARAMETERS, tags=['User Profile'])
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -114,9 +124,20 @@ class LogoutView(APIView):
 class CheckAuthView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    @extend_schema(summary="Check authentication status", tags=['Authentication'])
+    @extend_schema(summary="Check authentication status", parameters=SPARSE_FIELDS_PARAMETERS, tags=['Authentication'])
     def get(self, request):
         return Response({
             'authenticated': True,
-            'user': UserWithProfileSerializer(request.user).data
+            'user': UserWithProfileSerializer(request.user, context={'request': request}).data
+        })
+
+
+class AsyncCheckAuthView(AsyncReadView):
+    sync_view_class = CheckAuthView
+    user_select_related = ('profile',)
+
+    async def get(self, request):
+        return json_response({
+            'authenticated': True,
+            'user': UserWithProfileSerializer(request.user, context={'request': request}).data
         })
@@ -2,6 +2,9 @@ import axios from "axios";
 
 const api = axios.create({
   baseURL: "http://localhost:8000", //TODO later swap with env var
+  // Send the API's cookies cross-origin too, e.g. the short-lived one that
+  // keeps reads after a write on the primary database.
+  withCredentials: true,
 });
 
 api.interceptors.request.use((config) => {
@@ -12,4 +15,20 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+const NEXT_LINK = /<([^>]+)>;\s*rel="next"/;
+
+// List endpoints are cursor paginated; follow the `Link: rel="next"` header
+// until the last page and return all results.
+export async function getAllPages(url) {
+  const results = [];
+  let nextUrl = url;
+  while (nextUrl) {
+    const response = await api.get(nextUrl);
+    results.push(...response.data);
+    const match = NEXT_LINK.exec(response.headers.link || '');
+    nextUrl = match ? match[1] : null;
+  }
+  return results;
+}
+
 export default api;